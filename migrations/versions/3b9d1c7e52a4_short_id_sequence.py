@@ -0,0 +1,30 @@
+"""Short id sequence
+
+Revision ID: 3b9d1c7e52a4
+Revises: f346cdf236c0
+Create Date: 2026-10-18 10:12:41.118203
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3b9d1c7e52a4"
+down_revision = "f346cdf236c0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    short_id_sequence = op.create_table(
+        "short_id_sequence",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("next_value", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.bulk_insert(short_id_sequence, [{"id": 1, "next_value": 0}])
+
+
+def downgrade():
+    op.drop_table("short_id_sequence")
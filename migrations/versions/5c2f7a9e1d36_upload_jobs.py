@@ -0,0 +1,54 @@
+"""Upload jobs
+
+Revision ID: 5c2f7a9e1d36
+Revises: 8e41a0f9c2d7
+Create Date: 2026-10-18 14:05:19.402871
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5c2f7a9e1d36"
+down_revision = "8e41a0f9c2d7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "upload_job",
+        sa.Column("id", sa.String(length=32), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=True),
+        sa.Column("updated", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("upload_job", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_upload_job_created"), ["created"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_upload_job_status"), ["status"], unique=False
+        )
+    op.create_table(
+        "upload_job_file",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("job_id", sa.String(length=32), nullable=False),
+        sa.Column("filename", sa.String(length=255), nullable=False),
+        sa.Column("spool_path", sa.String(length=1024), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("short", sa.String(length=16), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(["job_id"], ["upload_job.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("upload_job_file")
+    with op.batch_alter_table("upload_job", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_upload_job_status"))
+        batch_op.drop_index(batch_op.f("ix_upload_job_created"))
+    op.drop_table("upload_job")
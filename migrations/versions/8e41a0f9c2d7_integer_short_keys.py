@@ -0,0 +1,134 @@
+"""Integer short keys
+
+Revision ID: 8e41a0f9c2d7
+Revises: 3b9d1c7e52a4
+Create Date: 2026-10-18 14:37:05.602918
+
+"""
+
+import string
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8e41a0f9c2d7"
+down_revision = "3b9d1c7e52a4"
+branch_labels = None
+depends_on = None
+
+ALLOWED_CHARS = string.ascii_letters + string.digits
+SHORT_LENGTH = 6
+SHORT_SPACE = len(ALLOWED_CHARS) ** SHORT_LENGTH
+CUSTOM_KEYS_COUNTER = 2
+BATCH_SIZE = 1000
+
+url_map = sa.table(
+    "url_map", sa.column("id", sa.BigInteger), sa.column("short", sa.String)
+)
+short_id_sequence = sa.table(
+    "short_id_sequence",
+    sa.column("id", sa.Integer),
+    sa.column("next_value", sa.BigInteger),
+)
+
+
+def decode_base62(short):
+    number = 0
+    for char in short:
+        number = number * len(ALLOWED_CHARS) + ALLOWED_CHARS.index(char)
+    return number
+
+
+def short_key(row_id, short):
+    if len(short) == SHORT_LENGTH and all(
+        char in ALLOWED_CHARS for char in short
+    ):
+        return decode_base62(short)
+    return SHORT_SPACE + row_id
+
+
+def rekey(connection, key):
+    rows = connection.execute(
+        sa.select(url_map.c.id, url_map.c.short)
+    ).fetchall()
+    # Сначала все ключи уходят в отрицательные, чтобы новые значения не
+    # пересеклись со старыми во время обновления.
+    connection.execute(url_map.update().values(id=-url_map.c.id))
+    updates = [
+        {"old_id": -row_id, "new_id": key(row_id, short)}
+        for row_id, short in rows
+    ]
+    for start in range(0, len(updates), BATCH_SIZE):
+        connection.execute(
+            url_map.update()
+            .where(url_map.c.id == sa.bindparam("old_id"))
+            .values(id=sa.bindparam("new_id")),
+            updates[start:start + BATCH_SIZE],
+        )
+    return max((update["new_id"] for update in updates), default=0)
+
+
+def upgrade():
+    with op.batch_alter_table("url_map", schema=None) as batch_op:
+        batch_op.alter_column(
+            "id",
+            existing_type=sa.Integer(),
+            type_=sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            existing_nullable=False,
+        )
+        batch_op.alter_column(
+            "original",
+            existing_type=sa.Text(),
+            type_=sa.String(length=2048),
+            existing_nullable=False,
+        )
+        batch_op.create_index(
+            batch_op.f("ix_url_map_timestamp"), ["timestamp"], unique=False
+        )
+
+    max_key = rekey(op.get_bind(), short_key)
+    if op.get_bind().dialect.name == "postgresql":
+        # Ключи назначает приложение. Последовательность serial отстала
+        # бы от перенумерованных ключей и пересеклась с ними.
+        op.execute("ALTER TABLE url_map ALTER COLUMN id DROP DEFAULT")
+    op.bulk_insert(
+        short_id_sequence,
+        [
+            {
+                "id": CUSTOM_KEYS_COUNTER,
+                "next_value": max(max_key + 1, SHORT_SPACE),
+            }
+        ],
+    )
+
+
+def downgrade():
+    op.execute(
+        short_id_sequence.delete().where(
+            short_id_sequence.c.id == CUSTOM_KEYS_COUNTER
+        )
+    )
+    keys = iter(range(1, 2**62))
+    max_id = rekey(op.get_bind(), lambda row_id, short: next(keys))
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            "ALTER TABLE url_map ALTER COLUMN id "
+            "SET DEFAULT nextval('url_map_id_seq'::regclass)"
+        )
+        op.execute(f"SELECT setval('url_map_id_seq', {max(max_id, 1)})")
+
+    with op.batch_alter_table("url_map", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_url_map_timestamp"))
+        batch_op.alter_column(
+            "original",
+            existing_type=sa.String(length=2048),
+            type_=sa.Text(),
+            existing_nullable=False,
+        )
+        batch_op.alter_column(
+            "id",
+            existing_type=sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            type_=sa.Integer(),
+            existing_nullable=False,
+        )
@@ -0,0 +1,31 @@
+"""Uploaded files
+
+Revision ID: a7d3e8b14f05
+Revises: 5c2f7a9e1d36
+Create Date: 2026-10-18 15:21:47.630114
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a7d3e8b14f05"
+down_revision = "5c2f7a9e1d36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "uploaded_file",
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("path", sa.String(length=1024), nullable=False),
+        sa.Column("short", sa.String(length=16), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("sha256"),
+    )
+
+
+def downgrade():
+    op.drop_table("uploaded_file")
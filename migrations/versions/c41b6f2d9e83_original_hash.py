@@ -0,0 +1,72 @@
+"""Original hash
+
+Revision ID: c41b6f2d9e83
+Revises: a7d3e8b14f05
+Create Date: 2026-10-18 16:02:33.581920
+
+"""
+
+import hashlib
+import string
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c41b6f2d9e83"
+down_revision = "a7d3e8b14f05"
+branch_labels = None
+depends_on = None
+
+ALLOWED_CHARS = set(string.ascii_letters + string.digits)
+SHORT_LENGTH = 6
+BATCH_SIZE = 1000
+
+url_map = sa.table(
+    "url_map",
+    sa.column("id", sa.BigInteger),
+    sa.column("original", sa.String),
+    sa.column("short", sa.String),
+    sa.column("original_hash", sa.String),
+)
+
+
+def upgrade():
+    with op.batch_alter_table("url_map", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("original_hash", sa.String(length=32), nullable=True)
+        )
+        batch_op.create_index(
+            batch_op.f("ix_url_map_original_hash"),
+            ["original_hash"],
+            unique=False,
+        )
+
+    # Какие из старых ID сгенерированы, не записано: хеш получают все
+    # ID длины SHORT_LENGTH, как у генератора.
+    connection = op.get_bind()
+    updates = [
+        {
+            "row_id": row_id,
+            "original_hash": hashlib.blake2b(
+                original.encode(), digest_size=16
+            ).hexdigest(),
+        }
+        for row_id, original, short in connection.execute(
+            sa.select(url_map.c.id, url_map.c.original, url_map.c.short)
+        ).fetchall()
+        if len(short) == SHORT_LENGTH and set(short) <= ALLOWED_CHARS
+    ]
+    for start in range(0, len(updates), BATCH_SIZE):
+        connection.execute(
+            url_map.update()
+            .where(url_map.c.id == sa.bindparam("row_id"))
+            .values(original_hash=sa.bindparam("original_hash")),
+            updates[start:start + BATCH_SIZE],
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("url_map", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_url_map_original_hash"))
+        batch_op.drop_column("original_hash")
@@ -0,0 +1,51 @@
+"""Chunked uploads
+
+Revision ID: d95e2a7c3b18
+Revises: c41b6f2d9e83
+Create Date: 2026-10-18 18:44:09.217365
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d95e2a7c3b18"
+down_revision = "c41b6f2d9e83"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "chunked_upload",
+        sa.Column("id", sa.String(length=32), nullable=False),
+        sa.Column("filename", sa.String(length=255), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("chunk_size", sa.Integer(), nullable=False),
+        sa.Column("spool_path", sa.String(length=1024), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("job_id", sa.String(length=32), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=True),
+        sa.Column("updated", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["job_id"], ["upload_job.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("chunked_upload", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_chunked_upload_updated"), ["updated"], unique=False
+        )
+    op.create_table(
+        "upload_chunk",
+        sa.Column("upload_id", sa.String(length=32), nullable=False),
+        sa.Column("index", sa.Integer(), autoincrement=False, nullable=False),
+        sa.ForeignKeyConstraint(["upload_id"], ["chunked_upload.id"]),
+        sa.PrimaryKeyConstraint("upload_id", "index"),
+    )
+
+
+def downgrade():
+    op.drop_table("upload_chunk")
+    with op.batch_alter_table("chunked_upload", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_chunked_upload_updated"))
+    op.drop_table("chunked_upload")
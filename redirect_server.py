@@ -0,0 +1,14 @@
+from aiohttp import web
+
+from yacut import create_app
+from yacut.redirect_server import create_redirect_app
+
+flask_app = create_app()
+app = create_redirect_app(flask_app)
+
+if __name__ == "__main__":
+    web.run_app(
+        app,
+        host=flask_app.config["REDIRECT_SERVER_HOST"],
+        port=flask_app.config["REDIRECT_SERVER_PORT"],
+    )
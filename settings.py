@@ -1,11 +1,107 @@
 import os
+import tempfile
 
 
 class Config(object):
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:///yacut.db")
+    # Реплики для чтения: DATABASE_REPLICA_URIS через запятую.
+    SQLALCHEMY_BINDS = {
+        f"replica{index}": uri
+        for index, uri in enumerate(
+            filter(None, os.getenv("DATABASE_REPLICA_URIS", "").split(","))
+        )
+    }
+    REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", 10))
+    REPLICA_RETRY_INTERVAL = float(os.getenv("REPLICA_RETRY_INTERVAL", 10))
+    ASYNC_DATABASE_URI = os.getenv("ASYNC_DATABASE_URI")
     SECRET_KEY = os.getenv("SECRET_KEY", "MY_SECRET_KEY")
     DISK_TOKEN = os.getenv("DISK_TOKEN")
     API_VERSION = os.getenv("API_VERSION", "v1")
     YANDEX_API_BASE = os.getenv(
         "YANDEX_API_BASE", "https://cloud-api.yandex.net"
     )
+    DISK_CONNECTOR_LIMIT = int(os.getenv("DISK_CONNECTOR_LIMIT", 100))
+    DISK_CONNECTOR_LIMIT_PER_HOST = int(
+        os.getenv("DISK_CONNECTOR_LIMIT_PER_HOST", 20)
+    )
+    DISK_DNS_CACHE_TTL = int(os.getenv("DISK_DNS_CACHE_TTL", 300))
+    DISK_KEEPALIVE_TIMEOUT = float(os.getenv("DISK_KEEPALIVE_TIMEOUT", 30))
+    DISK_UPLOAD_CHUNK_SIZE = int(os.getenv("DISK_UPLOAD_CHUNK_SIZE", 65536))
+    DISK_UPLOAD_READ_AHEAD = int(os.getenv("DISK_UPLOAD_READ_AHEAD", 4))
+    DISK_UPLOAD_CONCURRENCY = int(os.getenv("DISK_UPLOAD_CONCURRENCY", 4))
+    DISK_HREF_TIMEOUT = float(os.getenv("DISK_HREF_TIMEOUT", 10))
+    DISK_PUT_TIMEOUT = float(os.getenv("DISK_PUT_TIMEOUT", 120))
+    DISK_RETRIES = int(os.getenv("DISK_RETRIES", 3))
+    DISK_BACKOFF_BASE = float(os.getenv("DISK_BACKOFF_BASE", 0.5))
+    DISK_BACKOFF_MAX = float(os.getenv("DISK_BACKOFF_MAX", 8))
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "yandex")
+    STORAGE_LOCAL_ROOT = os.getenv(
+        "STORAGE_LOCAL_ROOT",
+        os.path.join(tempfile.gettempdir(), "yacut-files"),
+    )
+    STORAGE_LOCAL_MAX_AGE = int(
+        os.getenv("STORAGE_LOCAL_MAX_AGE", 365 * 24 * 60 * 60)
+    )
+    IMAGE_OPTIMIZE = os.getenv("IMAGE_OPTIMIZE") == "1"
+    IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 85))
+    IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", 0))
+    IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 50 * 1024 * 1024))
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 0)) or None
+    DISK_HREF_CACHE_SIZE = int(os.getenv("DISK_HREF_CACHE_SIZE", 10000))
+    DISK_HREF_CACHE_TTL = int(os.getenv("DISK_HREF_CACHE_TTL", 3600))
+    DISK_HREF_EXPIRY_MARGIN = int(os.getenv("DISK_HREF_EXPIRY_MARGIN", 60))
+    DISK_BREAKER_FAILURES = int(os.getenv("DISK_BREAKER_FAILURES", 5))
+    DISK_BREAKER_WINDOW = int(os.getenv("DISK_BREAKER_WINDOW", 20))
+    DISK_BREAKER_RESET_TIMEOUT = float(
+        os.getenv("DISK_BREAKER_RESET_TIMEOUT", 30)
+    )
+    DISK_BREAKER_SLOW_CALL = float(os.getenv("DISK_BREAKER_SLOW_CALL", 10))
+    URL_CACHE_SIZE = int(os.getenv("URL_CACHE_SIZE", 10000))
+    URL_CACHE_TTL = int(os.getenv("URL_CACHE_TTL", 300))
+    URL_CACHE_NEGATIVE_TTL = int(os.getenv("URL_CACHE_NEGATIVE_TTL", 5))
+    REDIRECT_SERVER_HOST = os.getenv("REDIRECT_SERVER_HOST", "127.0.0.1")
+    REDIRECT_SERVER_PORT = int(os.getenv("REDIRECT_SERVER_PORT", 8081))
+    REDIRECT_SERVER_THREADS = int(os.getenv("REDIRECT_SERVER_THREADS", 8))
+    REDIRECT_LOOKUP = os.getenv("REDIRECT_LOOKUP", "db")
+    REDIRECT_SNAPSHOT_PATH = os.getenv("REDIRECT_SNAPSHOT_PATH")
+    REDIRECT_SNAPSHOT_CHECK_INTERVAL = float(
+        os.getenv("REDIRECT_SNAPSHOT_CHECK_INTERVAL", 1)
+    )
+    URL_DEDUP = os.getenv("URL_DEDUP") == "1"
+    URL_DEDUP_CACHE_SIZE = int(os.getenv("URL_DEDUP_CACHE_SIZE", 10000))
+    URL_DEDUP_CACHE_TTL = int(os.getenv("URL_DEDUP_CACHE_TTL", 300))
+    SHARED_CACHE_BACKEND = os.getenv("SHARED_CACHE_BACKEND")
+    SHARED_CACHE_NAME = os.getenv("SHARED_CACHE_NAME", "yacut-urls")
+    SHARED_CACHE_SLOTS = int(os.getenv("SHARED_CACHE_SLOTS", 65536))
+    SHARED_CACHE_SLOT_SIZE = int(os.getenv("SHARED_CACHE_SLOT_SIZE", 512))
+    SHARED_CACHE_URL = os.getenv(
+        "SHARED_CACHE_URL", "redis://localhost:6379/0"
+    )
+    SHORT_POOL_SIZE = int(os.getenv("SHORT_POOL_SIZE", 0))
+    SHORT_POOL_BATCH = int(os.getenv("SHORT_POOL_BATCH", 100))
+    SHORT_ID_MODE = os.getenv("SHORT_ID_MODE", "random")
+    SHORT_ID_LEASE_SIZE = int(os.getenv("SHORT_ID_LEASE_SIZE", 1000))
+    SHORT_INTEGER_KEYS = os.getenv("SHORT_INTEGER_KEYS") == "1"
+    BLOOM_FILTER_CAPACITY = int(os.getenv("BLOOM_FILTER_CAPACITY", 0))
+    BLOOM_FILTER_ERROR_RATE = float(os.getenv("BLOOM_FILTER_ERROR_RATE", 0.01))
+    BLOOM_REBUILD_INTERVAL = float(os.getenv("BLOOM_REBUILD_INTERVAL", 3600))
+    BLOOM_SNAPSHOT_PATH = os.getenv("BLOOM_SNAPSHOT_PATH")
+    BULK_CREATE_LIMIT = int(os.getenv("BULK_CREATE_LIMIT", 100000))
+    BULK_MAX_BODY_SIZE = int(os.getenv("BULK_MAX_BODY_SIZE", 64 * 1024 * 1024))
+    BULK_RESOLVE_LIMIT = int(os.getenv("BULK_RESOLVE_LIMIT", 1000))
+    WRITE_BATCH_MAX_SIZE = int(os.getenv("WRITE_BATCH_MAX_SIZE", 0))
+    WRITE_BATCH_MAX_LATENCY = float(os.getenv("WRITE_BATCH_MAX_LATENCY", 5))
+    UPLOAD_JOBS_ENABLED = os.getenv("UPLOAD_JOBS_ENABLED") == "1"
+    UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 2))
+    UPLOAD_SPOOL_DIR = os.getenv(
+        "UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "yacut")
+    )
+    UPLOAD_JOB_POLL_INTERVAL = float(os.getenv("UPLOAD_JOB_POLL_INTERVAL", 1))
+    UPLOAD_JOB_STALE = int(os.getenv("UPLOAD_JOB_STALE", 600))
+    CHUNKED_UPLOAD_CHUNK_SIZE = int(
+        os.getenv("CHUNKED_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024)
+    )
+    CHUNKED_UPLOAD_MAX_SIZE = int(
+        os.getenv("CHUNKED_UPLOAD_MAX_SIZE", 1024 * 1024 * 1024)
+    )
+    CHUNKED_UPLOAD_TTL = int(os.getenv("CHUNKED_UPLOAD_TTL", 24 * 3600))
@@ -21,11 +21,16 @@ os.environ["DISK_TOKEN"] = "y0_nbfoiu3445tno35_fd09v854bn2_cs0e8hrb4k"
 PY_URL = "https://www.python.org"
 TEST_BASE_URL = "http://localhost"
 
-pytest_plugins = ["tests.yandex_disk_mock_server"]
+pytest_plugins = [
+    "tests.yandex_disk_mock_server",
+    "tests.redis_mock_server",
+]
 
 try:
     from yacut import app, db
+    from yacut.cache import original_cache, url_cache
     from yacut.models import URLMap  # noqa
+    from yacut.yandex_disk import disk_client, download_links
 except NameError as exc:
     raise AssertionError(
         "При попытке импорта объекта приложения вознакло исключение: "
@@ -67,7 +72,11 @@ def _app():
     )
     with app.app_context():
         db.create_all()
+        url_cache.clear()
+        original_cache.clear()
+        download_links.cache.clear()
         yield app
+        disk_client.stop()
         db.drop_all()
         db.session.close()
 
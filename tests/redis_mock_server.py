@@ -0,0 +1,58 @@
+import socketserver
+import threading
+
+import pytest
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    """Минимальный Redis-совместимый сервер: SELECT, GET и SET."""
+
+    def read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        assert header.startswith(b"*"), (
+            "Убедитесь, что команды отправляются в формате массива RESP."
+        )
+        args = []
+        for _ in range(int(header[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def handle(self):
+        storage = self.server.storage
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            self.server.calls.append(command.decode())
+            if command == b"GET":
+                value = storage.get(args[1])
+                self.wfile.write(
+                    b"$-1\r\n"
+                    if value is None
+                    else b"$%d\r\n%s\r\n" % (len(value), value)
+                )
+            elif command == b"SET":
+                storage[args[1]] = args[2]
+                self.wfile.write(b"+OK\r\n")
+            elif command == b"SELECT":
+                self.wfile.write(b"+OK\r\n")
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+@pytest.fixture
+def redis_server():
+    """Возвращает адрес мок-сервера Redis, его хранилище и вызовы."""
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), RESPHandler)
+    server.daemon_threads = True
+    server.storage = {}
+    server.calls = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
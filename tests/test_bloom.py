@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from tests.conftest import PY_URL
+from yacut import db
+from yacut.bloom import BloomFilter, ShortFilter, short_filter
+from yacut.models import URLMap
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000)
+    keys = [f"key{number}" for number in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys), (
+        "Фильтр Блума не должен давать ложноотрицательных ответов."
+    )
+    false_positives = sum(f"other{number}" in bloom for number in range(1000))
+    assert false_positives < 50
+
+
+def test_filter_tracks_inserts(client, monkeypatch):
+    monkeypatch.setattr(short_filter, "capacity", 1000)
+    monkeypatch.setattr(short_filter, "filter", None)
+    assert URLMap.get("py") is None
+    db.session.add(URLMap(original=PY_URL, short="py"))
+    db.session.commit()
+    assert short_filter.might_exist("py"), (
+        "Вставленный короткий ID должен попадать в фильтр."
+    )
+    assert URLMap.get("py").original == PY_URL
+
+
+def test_filter_snapshot(client, tmp_path, short_python_url):
+    snapshot_path = str(tmp_path / "shorts.bloom")
+    first = ShortFilter()
+    first.capacity, first.snapshot_path = 1000, snapshot_path
+    assert first.might_exist("py")
+    first.save()
+    second = ShortFilter()
+    second.capacity, second.snapshot_path = 1000, snapshot_path
+    second._load()
+    assert second.last_timestamp == first.last_timestamp, (
+        "После загрузки снимка должны досканироваться только новые строки."
+    )
+    assert "py" in second.filter
+
+
+def test_rebuild_finds_late_commits(client):
+    bloom = ShortFilter()
+    bloom.capacity = 1000
+    assert not bloom.might_exist("py")
+    # Строка с timestamp старше окна досканирования, как у долгой вставки.
+    db.session.add(
+        URLMap(
+            original=PY_URL,
+            short="py",
+            timestamp=datetime(2000, 1, 1),
+        )
+    )
+    db.session.commit()
+    bloom.last_timestamp = datetime.utcnow() + timedelta(hours=1)
+    bloom.sync()
+    assert "py" not in bloom.filter
+    bloom.rebuild()
+    assert bloom.might_exist("py"), (
+        "Полное перестроение должно находить строки, пропущенные "
+        "досканированием."
+    )
+
+
+def test_snapshot_loaded_triggers_rebuild(client, tmp_path):
+    snapshot_path = str(tmp_path / "shorts.bloom")
+    first = ShortFilter()
+    first.capacity, first.snapshot_path = 1000, snapshot_path
+    first.rebuild_interval = 3600
+    first._load()
+    assert not first._rebuild_due()
+    second = ShortFilter()
+    second.capacity, second.snapshot_path = 1000, snapshot_path
+    second.rebuild_interval = 3600
+    second._load()
+    assert second._rebuild_due(), (
+        "Фильтр из снимка мог пропустить строки и должен перестраиваться."
+    )
+    assert os.listdir(tmp_path) == ["shorts.bloom"], (
+        "Временные файлы снимка не должны оставаться после сохранения."
+    )
+
+
+def test_negative_answer_syncs_first(client):
+    bloom = ShortFilter()
+    bloom.capacity = 1000
+    assert not bloom.might_exist("newone")
+    # Вставка из другого процесса: этот фильтр о ней не знает.
+    db.session.add(URLMap(original=PY_URL, short="newone"))
+    db.session.commit()
+    assert bloom.might_exist("newone"), (
+        "Перед отрицательным ответом фильтр должен досканировать базу, "
+        "иначе ссылку, созданную другим воркером, не найти."
+    )
+
+
+def test_concurrent_misses_share_sync(client, monkeypatch):
+    bloom = ShortFilter()
+    bloom.capacity = 1000
+    bloom.might_exist("warmup")
+    calls = []
+
+    def slow_sync():
+        calls.append(1)
+        time.sleep(0.05)
+
+    monkeypatch.setattr(bloom, "sync", slow_sync)
+    threads = [
+        threading.Thread(target=bloom.might_exist, args=(f"miss{number}",))
+        for number in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) <= 2, (
+        "Одновременные промахи должны объединяться в один проход."
+    )
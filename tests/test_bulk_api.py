@@ -0,0 +1,74 @@
+import gzip
+import json
+from http import HTTPStatus
+
+from tests.conftest import PY_URL, TEST_BASE_URL
+from yacut.models import URLMap
+
+CREATE_SHORT_LINKS_URL = "/api/ids/"
+RESOLVE_SHORT_LINKS_URL = "/api/ids/resolve/"
+
+
+def test_bulk_create(client, short_python_url, duplicated_custom_id_msg):
+    response = client.post(
+        CREATE_SHORT_LINKS_URL,
+        json=[
+            {"url": PY_URL},
+            {"url": PY_URL, "custom_id": "docs"},
+            {"url": PY_URL, "custom_id": "py"},
+            {"url": PY_URL, "custom_id": "docs"},
+            {"custom_id": "nourl"},
+        ],
+    )
+    assert response.status_code == HTTPStatus.CREATED, (
+        f"POST-запрос к эндпоинту `{CREATE_SHORT_LINKS_URL}` должен вернуть "
+        f"ответ со статус-кодом {HTTPStatus.CREATED.value}."
+    )
+    generated, custom, taken, repeated, no_url = response.json
+    assert generated["short_link"].startswith(TEST_BASE_URL)
+    assert custom == {"url": PY_URL, "short_link": f"{TEST_BASE_URL}/docs"}
+    assert taken == {"url": PY_URL, "message": duplicated_custom_id_msg}, (
+        "Для занятого `custom_id` должна возвращаться ошибка элемента."
+    )
+    assert repeated["message"] == duplicated_custom_id_msg
+    assert no_url == {"message": '"url" является обязательным полем!'}
+    assert URLMap.query.count() == 3
+
+
+def test_bulk_create_gzip(client):
+    response = client.post(
+        CREATE_SHORT_LINKS_URL,
+        data=gzip.compress(json.dumps([{"url": PY_URL}] * 3).encode()),
+        headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        },
+    )
+    assert response.status_code == HTTPStatus.CREATED, (
+        "Эндпоинт должен принимать тело запроса, сжатое gzip."
+    )
+    assert len({item["short_link"] for item in response.json}) == 3
+
+
+def test_bulk_create_not_list(client):
+    response = client.post(CREATE_SHORT_LINKS_URL, json={"url": PY_URL})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_bulk_resolve(client, short_python_url):
+    response = client.post(
+        RESOLVE_SHORT_LINKS_URL, json=["py", "missing", "не-id", "py"]
+    )
+    assert response.status_code == HTTPStatus.OK, (
+        f"POST-запрос к эндпоинту `{RESOLVE_SHORT_LINKS_URL}` должен вернуть "
+        f"ответ со статус-кодом {HTTPStatus.OK.value}."
+    )
+    assert response.json == {"py": PY_URL, "missing": None, "не-id": None}, (
+        "Для отсутствующих коротких ID должно возвращаться значение `null`."
+    )
+
+
+def test_bulk_resolve_limit(client, _app, monkeypatch):
+    monkeypatch.setitem(_app.config, "BULK_RESOLVE_LIMIT", 2)
+    response = client.post(RESOLVE_SHORT_LINKS_URL, json=["a", "b", "c"])
+    assert response.status_code == HTTPStatus.BAD_REQUEST
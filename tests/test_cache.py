@@ -0,0 +1,71 @@
+import time
+
+from tests.conftest import PY_URL
+from yacut import db
+from yacut.bloom import short_filter
+from yacut.cache import MISSING, LRUCache, url_cache
+from yacut.models import URLMap
+from yacut.replicas import replicas
+
+
+def test_lru_eviction():
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING, (
+        "При переполнении кэша должна вытесняться давно не использованная "
+        "запись."
+    )
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration(monkeypatch):
+    cache = LRUCache(max_size=10, ttl=5)
+    cache.set("a", 1)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    assert cache.get("a") is MISSING, "Устаревшая запись не должна отдаваться."
+
+
+def test_negative_result_cached(client, monkeypatch):
+    assert URLMap.get_original("py") is None
+    db.session.add(URLMap(original=PY_URL, short="py"))
+    db.session.commit()
+    assert URLMap.get_original("py") is None, (
+        "Отсутствие записи должно кэшироваться."
+    )
+    assert url_cache.stats()["hits"] == 1
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    assert URLMap.get_original("py") == PY_URL, (
+        "Отсутствие записи должно кэшироваться на короткое время "
+        "URL_CACHE_NEGATIVE_TTL, а не на URL_CACHE_TTL."
+    )
+
+
+def test_bloom_and_replica_misses_not_cached(client, monkeypatch):
+    monkeypatch.setattr(short_filter, "might_exist", lambda short: False)
+    assert URLMap.get_original("py") is None
+    monkeypatch.undo()
+    db.session.add(URLMap(original=PY_URL, short="py"))
+    db.session.commit()
+    assert URLMap.get_original("py") == PY_URL, (
+        "Отрицательный ответ фильтра Блума может устареть и не должен "
+        "кэшироваться."
+    )
+    monkeypatch.setattr(replicas, "may_lag", lambda: True)
+    assert URLMap.get_original("missing") is None
+    assert url_cache.get("missing") is MISSING, (
+        "Отсутствие ссылки на реплике не должно кэшироваться."
+    )
+
+
+def test_create_invalidates_cache(client):
+    assert URLMap.get_original("py") is None
+    URLMap.create(original=PY_URL, short="py")
+    assert URLMap.get_original("py") == PY_URL, (
+        "Создание ссылки должно обновлять кэш."
+    )
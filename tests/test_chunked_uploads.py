@@ -0,0 +1,235 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+
+from yacut import db, upload_jobs
+from yacut.error_handlers import YandexDiskError
+from yacut.models import ChunkedUpload, UploadChunk
+from yacut.storage import UploadResult, storage
+from yacut.upload_jobs import upload_workers
+
+CONTENT = bytes(range(256)) * 40
+CHUNK_SIZE = 4096
+
+
+@pytest.fixture
+def chunked_app(_app, monkeypatch, tmp_path):
+    monkeypatch.setitem(_app.config, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setitem(_app.config, "CHUNKED_UPLOAD_CHUNK_SIZE", CHUNK_SIZE)
+    monkeypatch.setattr(upload_workers, "size", 0)
+    uploaded = []
+
+    async def fake_upload_files(files, on_result=None, digests=None):
+        results = []
+        for index, file in enumerate(files):
+            uploaded.append(file.read())
+            result = UploadResult(file.filename, "https://disk/1", None)
+            on_result(index, result)
+            results.append(result)
+        return results
+
+    monkeypatch.setattr(upload_jobs, "upload_files", fake_upload_files)
+    return uploaded
+
+
+@pytest.fixture
+def local_storage(_app, monkeypatch, tmp_path):
+    root = tmp_path / "storage"
+    monkeypatch.setattr(storage, "backend", storage.local)
+    monkeypatch.setattr(storage.local, "root", str(root))
+    monkeypatch.setitem(_app.config, "UPLOAD_JOB_POLL_INTERVAL", 0.01)
+    return root
+
+
+def put_chunk(client, upload_id, index):
+    return client.put(
+        f"/api/uploads/{upload_id}/chunks/{index}",
+        data=CONTENT[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE],
+    )
+
+
+def test_chunked_upload_resumes_and_completes(chunked_app, client):
+    response = client.post(
+        "/api/uploads/", json={"filename": "архив.pdf", "size": len(CONTENT)}
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    upload = response.json
+    assert upload["chunks"] == 3
+    upload_id = upload["id"]
+
+    assert put_chunk(client, upload_id, 2).status_code == (
+        HTTPStatus.NO_CONTENT
+    ), "Части должны приниматься в любом порядке."
+    assert put_chunk(client, upload_id, 0).status_code == (
+        HTTPStatus.NO_CONTENT
+    )
+    assert put_chunk(client, upload_id, 0).status_code == (
+        HTTPStatus.NO_CONTENT
+    ), "Повтор уже принятой части не должен быть ошибкой."
+    response = client.post(f"/api/uploads/{upload_id}/complete")
+    assert response.status_code == HTTPStatus.CONFLICT, (
+        "Загрузку нельзя завершить, пока не получены все части."
+    )
+    status = client.get(f"/api/uploads/{upload_id}/").json
+    assert status["received"] == [0, 2], (
+        "Состояние загрузки должно показывать принятые части для докачки."
+    )
+
+    assert put_chunk(client, upload_id, 1).status_code == (
+        HTTPStatus.NO_CONTENT
+    )
+    response = client.post(f"/api/uploads/{upload_id}/complete")
+    assert response.status_code == HTTPStatus.ACCEPTED
+    job_id = response.json["job_id"]
+    assert client.post(f"/api/uploads/{upload_id}/complete").status_code == (
+        HTTPStatus.CONFLICT
+    )
+
+    assert upload_workers.run_once()
+    assert chunked_app == [CONTENT], (
+        "В хранилище должен уйти файл, собранный из всех частей."
+    )
+    job = client.get(f"/api/files/{job_id}/").json
+    assert job["status"] == "done" and job["files"][0]["short_link"]
+
+
+def test_upload_streams_while_chunks_arrive(
+    chunked_app, local_storage, client, monkeypatch
+):
+    sent = []
+    upload_stream = storage.local.upload_stream
+
+    async def recording_upload_stream(chunks, path, size):
+        async def record():
+            async for chunk in chunks:
+                sent.append(chunk)
+                yield chunk
+
+        await upload_stream(record(), path, size)
+
+    monkeypatch.setattr(storage.local, "upload_stream", recording_upload_stream)
+    upload = client.post(
+        "/api/uploads/", json={"filename": "архив.pdf", "size": len(CONTENT)}
+    ).json
+    upload_id = upload["id"]
+    put_chunk(client, upload_id, 0)
+    # Непрерывное начало файла к моменту шага клиента и сам шаг: часть 2
+    # до прихода части 1 отправляться не должна.
+    client_steps = iter(
+        [
+            (CHUNK_SIZE, lambda: put_chunk(client, upload_id, 2)),
+            (CHUNK_SIZE, lambda: put_chunk(client, upload_id, 1)),
+            (
+                len(CONTENT),
+                lambda: client.post(f"/api/uploads/{upload_id}/complete"),
+            ),
+        ]
+    )
+
+    def client_sends_next(seconds):
+        prefix, step = next(client_steps)
+        deadline = time.monotonic() + 5
+        while len(b"".join(sent)) < prefix and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert b"".join(sent) == CONTENT[:prefix], (
+            "Принятые подряд части должны отправляться в хранилище, не "
+            "дожидаясь завершения загрузки."
+        )
+        step()
+
+    monkeypatch.setattr(
+        upload_jobs, "time", SimpleNamespace(sleep=client_sends_next)
+    )
+    assert upload_workers.run_once()
+
+    assert chunked_app == [], (
+        "После завершения сессии файл не должен загружаться заново."
+    )
+    digest = hashlib.sha256(CONTENT).hexdigest()
+    assert [path.name for path in local_storage.iterdir()] == [
+        f"{digest}.pdf"
+    ], "Файл должен переноситься из временного пути на путь по хешу."
+    assert (local_storage / f"{digest}.pdf").read_bytes() == CONTENT
+    job = client.get(f"/api/files/{upload['job_id']}/").json
+    assert job["status"] == "done" and job["files"][0]["short_link"]
+
+
+def test_interrupted_stream_uploads_after_completion(
+    chunked_app, local_storage, client, monkeypatch
+):
+    async def failing_upload_stream(chunks, path, size):
+        raise YandexDiskError("Ошибка загрузки: 507", 507)
+
+    monkeypatch.setattr(storage.local, "upload_stream", failing_upload_stream)
+    upload = client.post(
+        "/api/uploads/", json={"filename": "архив.pdf", "size": len(CONTENT)}
+    ).json
+    put_chunk(client, upload["id"], 0)
+    assert upload_workers.run_once()
+    status_url = f"/api/files/{upload['job_id']}/"
+    assert client.get(status_url).json["status"] == "waiting", (
+        "После обрыва отправки задание должно ждать завершения сессии."
+    )
+    assert not upload_workers.run_once()
+
+    put_chunk(client, upload["id"], 1)
+    put_chunk(client, upload["id"], 2)
+    response = client.post(f"/api/uploads/{upload['id']}/complete")
+    assert response.json["job_id"] == upload["job_id"]
+    assert upload_workers.run_once()
+    assert chunked_app == [CONTENT], (
+        "Завершенная сессия с прерванной отправкой должна загружаться "
+        "обычным путем."
+    )
+    assert client.get(status_url).json["status"] == "done"
+
+
+def test_chunked_upload_validation(chunked_app, client):
+    assert client.post(
+        "/api/uploads/", json={"filename": "вирус.exe", "size": 10}
+    ).status_code == HTTPStatus.BAD_REQUEST
+    assert client.post(
+        "/api/uploads/", json={"filename": "файл.txt", "size": 0}
+    ).status_code == HTTPStatus.BAD_REQUEST
+    upload_id = client.post(
+        "/api/uploads/", json={"filename": "файл.txt", "size": 10}
+    ).json["id"]
+    assert client.put(
+        f"/api/uploads/{upload_id}/chunks/0", data=b"short"
+    ).status_code == HTTPStatus.BAD_REQUEST
+    assert client.put(
+        f"/api/uploads/{upload_id}/chunks/1", data=b"0123456789"
+    ).status_code == HTTPStatus.BAD_REQUEST
+    assert client.get("/api/uploads/unknown/").status_code == (
+        HTTPStatus.NOT_FOUND
+    )
+
+
+def test_abandoned_uploads_expire(chunked_app, client, tmp_path):
+    abandoned_upload = client.post(
+        "/api/uploads/", json={"filename": "архив.pdf", "size": len(CONTENT)}
+    ).json
+    abandoned = abandoned_upload["id"]
+    put_chunk(client, abandoned, 0)
+    ChunkedUpload.query.filter_by(id=abandoned).update(
+        dict(updated=datetime.utcnow() - timedelta(days=2))
+    )
+    db.session.commit()
+    active = client.post(
+        "/api/uploads/", json={"filename": "архив.pdf", "size": len(CONTENT)}
+    ).json["id"]
+    assert client.get(f"/api/uploads/{abandoned}/").status_code == (
+        HTTPStatus.NOT_FOUND
+    ), "Сессия без новых частей дольше CHUNKED_UPLOAD_TTL должна удаляться."
+    assert not UploadChunk.query.filter_by(upload_id=abandoned).count()
+    assert [path.name for path in tmp_path.iterdir()] == [f"{active}.part"], (
+        "Временный файл брошенной сессии должен удаляться."
+    )
+    job = client.get(f"/api/files/{abandoned_upload['job_id']}/").json
+    assert job["status"] == "failed", (
+        "Задание брошенной сессии должно отменяться."
+    )
@@ -1,6 +1,14 @@
+from unittest.mock import patch
+
+import pytest
 from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
 
+from tests.conftest import PY_URL
+from yacut import db
+from yacut.cache import original_cache
 from yacut.models import URLMap
+from yacut.short_ids import SHORT_SPACE, decode_base62, short_keys
 
 
 def test_fields(_app):
@@ -13,3 +21,79 @@ def test_fields(_app):
         "Проверьте модель: в ней должны быть поля `id`, `original`, `short` "
         "и `timestamp`."
     )
+
+
+def test_create_retries_generated_collision(client, short_python_url):
+    shorts = iter(["py", "docs"])
+    with patch.object(URLMap, "generate_short", lambda: next(shorts)):
+        url_map = URLMap.create(original=PY_URL)
+    assert url_map.short == "docs", (
+        "При конфликте сгенерированного ID по уникальному индексу "
+        "должен генерироваться новый ID."
+    )
+
+
+def test_create_custom_conflict_without_lookup(
+    client, short_python_url, duplicated_custom_id_msg
+):
+    with patch.object(URLMap, "get", side_effect=AssertionError):
+        with pytest.raises(ValueError, match=duplicated_custom_id_msg):
+            URLMap.create(original=PY_URL, short="py")
+    assert URLMap.query.count() == 1
+
+
+def test_integer_short_keys(client, monkeypatch):
+    monkeypatch.setattr(short_keys, "enabled", True)
+    short_keys.custom.reset()
+    generated = URLMap.create(original=PY_URL)
+    custom = URLMap.create(original=PY_URL, short="py")
+    assert generated.id == decode_base62(generated.short), (
+        "Первичный ключ сгенерированной ссылки должен быть равен значению "
+        "короткого ID в base62."
+    )
+    assert custom.id >= SHORT_SPACE
+    db.session.expunge_all()
+    assert URLMap.get(generated.short).original == PY_URL
+    assert URLMap.get("py").original == PY_URL
+
+
+def test_dedup_generated_originals(client, monkeypatch):
+    monkeypatch.setitem(client.application.config, "URL_DEDUP", True)
+    first = URLMap.create(original=PY_URL)
+    custom = URLMap.create(original=PY_URL, short="py")
+    assert URLMap.create(original=PY_URL).short == first.short, (
+        "В режиме URL_DEDUP повторное сокращение той же ссылки должно "
+        "возвращать уже сгенерированный короткий ID."
+    )
+    assert custom.short == "py" and custom.original_hash is None
+    original_cache.clear()
+    with patch.object(URLMap, "generate_short", side_effect=AssertionError):
+        assert URLMap.create(original=PY_URL).short == first.short
+    assert URLMap.query.count() == 2
+    monkeypatch.setitem(client.application.config, "URL_DEDUP", False)
+    assert URLMap.create(original=PY_URL).short != first.short
+
+
+def test_short_keys_survive_mode_switch(client, monkeypatch):
+    monkeypatch.setattr(short_keys, "enabled", False)
+    short_keys.custom.reset()
+    before = URLMap.create(original=PY_URL, short="longername")
+    generated = URLMap.create(original=PY_URL)
+    assert generated.id == decode_base62(generated.short), (
+        "Ключи должны назначаться и без SHORT_INTEGER_KEYS, чтобы их "
+        "диапазоны не пересекались с автоинкрементом."
+    )
+    monkeypatch.setattr(short_keys, "enabled", True)
+    after = URLMap.create(original=PY_URL, short="otherlongname")
+    assert SHORT_SPACE <= before.id < after.id
+    assert URLMap.get("otherlongname").original == PY_URL
+
+
+def test_key_clash_is_not_reported_as_taken_short(client, monkeypatch):
+    short_keys.custom.reset()
+    URLMap.create(original=PY_URL, short="firstname")
+    taken_key = short_keys.custom._next
+    db.session.add(URLMap(id=taken_key, original=PY_URL, short="squatter"))
+    db.session.commit()
+    with pytest.raises(IntegrityError):
+        URLMap.create(original=PY_URL, short="secondname")
@@ -0,0 +1,62 @@
+import asyncio
+import re
+from io import BytesIO
+
+from tests.conftest import TEST_BASE_URL
+from tests.yandex_disk_mock_server import intercept_requests
+from yacut.models import UploadedFile
+from yacut.storage import storage
+
+FILES_URL = "/files"
+
+
+def short_links(response):
+    return re.findall(
+        rf'href="({re.escape(TEST_BASE_URL)}/\w+)"', response.data.decode()
+    )
+
+
+def test_content_path(_app):
+    assert storage.path("ab", "Фото.JPG") == "disk:/yacut/ab.jpg"
+    assert storage.path("ab", "../без расширения") == "disk:/yacut/ab"
+
+
+async def test_repeated_upload_skips_transfer(
+    _app, client, mock_server, monkeypatch
+):
+    mock_server, user_calls = await mock_server
+    await intercept_requests(mock_server, monkeypatch)
+    content = b"first file"
+
+    def sync_test():
+        first = client.post(
+            FILES_URL,
+            data={
+                "files": [
+                    (BytesIO(content), "одинаковое.txt"),
+                    (BytesIO(b"second file"), "одинаковое.txt"),
+                ]
+            },
+        )
+        first_links = short_links(first)
+        assert len(set(first_links)) == 2, (
+            "Разные файлы с одинаковым именем должны получать разные "
+            "ссылки, а не перезаписывать друг друга."
+        )
+        with _app.app_context():
+            assert UploadedFile.query.count() == 2
+        user_calls.clear()
+
+        second = client.post(
+            FILES_URL, data={"files": [(BytesIO(content), "копия.txt")]}
+        )
+        assert not user_calls, (
+            "Повторная загрузка того же содержимого не должна обращаться к "
+            "API Диска."
+        )
+        assert short_links(second) == first_links[:1], (
+            "Для повторно загруженного файла должна возвращаться "
+            "существующая короткая ссылка."
+        )
+
+    await asyncio.get_running_loop().run_in_executor(None, sync_test)
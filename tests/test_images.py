@@ -0,0 +1,94 @@
+import asyncio
+import random
+from io import BytesIO
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from yacut import yandex_disk
+from yacut.images import image_optimizer, optimize_image
+from yacut.storage import upload_files_async
+
+
+def generate_jpeg_bytes(size=(800, 600)):
+    image = Image.frombytes(
+        "RGB", size, bytes(random.getrandbits(8) for _ in range(3))
+        * (size[0] * size[1])
+    )
+    exif = Image.Exif()
+    exif[0x010E] = "описание" * 500
+    output = BytesIO()
+    image.save(output, "JPEG", quality=100, exif=exif)
+    return output.getvalue()
+
+
+def test_optimize_image_strips_metadata_and_downsizes():
+    data = generate_jpeg_bytes()
+    optimized = optimize_image(data, quality=75, max_side=200)
+    assert optimized is not None and len(optimized) < len(data)
+    image = Image.open(BytesIO(optimized))
+    assert max(image.size) == 200, "Изображение должно уменьшаться."
+    assert not image.getexif(), "Метаданные должны удаляться."
+    assert optimize_image(b"not an image", 75, 0) is None
+
+
+def test_upload_sends_optimized_images(_app, monkeypatch):
+    monkeypatch.setattr(image_optimizer, "enabled", True)
+    monkeypatch.setattr(image_optimizer, "max_side", 100)
+    monkeypatch.setattr(image_optimizer, "files", 0)
+    monkeypatch.setattr(image_optimizer, "bytes_before", 0)
+    monkeypatch.setattr(image_optimizer, "bytes_after", 0)
+    sent = {}
+
+    async def upload_single_file(session, file, digest):
+        sent[file.filename] = file.stream.read()
+        return file.filename, f"https://disk/{file.filename}"
+
+    monkeypatch.setattr(yandex_disk, "upload_single_file", upload_single_file)
+    data = generate_jpeg_bytes()
+    upload_files_async(
+        [
+            FileStorage(BytesIO(data), filename="фото.jpg"),
+            FileStorage(BytesIO(b"text"), filename="заметка.txt"),
+        ]
+    )
+    assert len(sent["фото.jpg"]) < len(data), (
+        "На Диск должно отправляться сжатое изображение."
+    )
+    assert sent["заметка.txt"] == b"text"
+    stats = image_optimizer.stats()
+    assert stats["files"] == 1
+    assert stats["bytes_saved"] == len(data) - len(sent["фото.jpg"])
+
+
+def test_decompression_bomb_is_skipped(monkeypatch):
+    data = generate_jpeg_bytes(size=(100, 100))
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100 * 100 - 1)
+    assert optimize_image(data, 75, 0) is None, (
+        "Изображение больше MAX_IMAGE_PIXELS не должно распаковываться."
+    )
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)
+    assert optimize_image(data, 75, 0) is None
+
+
+def test_large_images_are_not_read(_app, monkeypatch):
+    monkeypatch.setattr(image_optimizer, "max_bytes", 1000)
+    monkeypatch.setattr(image_optimizer, "skipped", 0)
+    stream = BytesIO(generate_jpeg_bytes())
+    file = FileStorage(stream, filename="фото.jpg")
+    assert asyncio.run(image_optimizer.optimize(file, _app.logger)) is None
+    assert stream.tell() == 0, (
+        "Изображение больше IMAGE_MAX_BYTES не должно читаться в память."
+    )
+    assert image_optimizer.stats()["skipped"] == 1
+
+
+def test_pool_does_not_fork(monkeypatch):
+    monkeypatch.setattr(image_optimizer, "_executor", None)
+    executor = image_optimizer._get_executor()
+    try:
+        assert executor._mp_context.get_start_method() != "fork", (
+            "Пул сжатия создается из потока и не должен использовать fork."
+        )
+    finally:
+        executor.shutdown()
@@ -0,0 +1,132 @@
+import time
+from http import HTTPStatus
+
+import pytest
+from aiohttp.test_utils import TestClient
+from sqlalchemy import create_engine
+
+from tests.conftest import PY_URL
+from yacut import db
+from yacut.cache import url_cache
+from yacut.models import URLMap
+from yacut.redirect_server import create_redirect_app
+from yacut.replicas import STICKY_KEY, replicas
+from yacut.repository import url_maps
+from yacut.storage import storage
+
+
+@pytest.fixture
+async def redirect_client(_app, aiohttp_server, tmp_path, monkeypatch):
+    # Промахи кэша идут в базу через асинхронный драйвер, а ему нужна
+    # файловая база: каждое соединение с :memory: видит свою.
+    monkeypatch.setattr(
+        url_maps, "uri", f"sqlite+aiosqlite:///{tmp_path / 'async.db'}"
+    )
+    monkeypatch.setattr(url_maps, "engine", None)
+    monkeypatch.setattr(url_maps, "_sessions", None)
+    monkeypatch.setattr(url_maps, "_replicas", {})
+    async with url_maps.session() as session:
+        connection = await session.connection()
+        await connection.run_sync(db.metadata.create_all)
+        await session.commit()
+    client = TestClient(await aiohttp_server(create_redirect_app(_app)))
+    await client.start_server()
+    return client
+
+
+def test_redirect_routes(_app):
+    routes = {
+        route.resource.canonical
+        for route in create_redirect_app(_app).router.routes()
+    }
+    assert routes == {"/{short}", "/api/id/{short}/"}, (
+        "Отдельный сервер должен обслуживать только переходы по коротким "
+        "ссылкам и получение оригинальной ссылки через API."
+    )
+
+
+async def test_redirect(_app, redirect_client):
+    redirect_client = await redirect_client
+    await url_maps.create(PY_URL, short="py")
+    url_cache.clear()
+    response = await redirect_client.get("/py", allow_redirects=False)
+    assert response.status == HTTPStatus.FOUND, (
+        "Переход по короткой ссылке должен возвращать статус 302."
+    )
+    assert response.headers["Location"] == PY_URL
+
+    response = await redirect_client.get("/api/id/py/")
+    assert response.status == HTTPStatus.OK
+    assert await response.json() == {"url": PY_URL}
+
+
+async def test_not_found(_app, redirect_client):
+    redirect_client = await redirect_client
+    response = await redirect_client.get("/missing", allow_redirects=False)
+    assert response.status == HTTPStatus.NOT_FOUND
+    assert "Страница не найдена" in await response.text(), (
+        "Для несуществующей ссылки должна отдаваться та же страница 404, "
+        "что и во Flask."
+    )
+
+    response = await redirect_client.get("/api/id/missing/")
+    assert response.status == HTTPStatus.NOT_FOUND
+    assert await response.json() == {"message": "Указанный id не найден"}
+
+
+async def test_redirect_to_local_file(
+    _app, redirect_client, monkeypatch, tmp_path
+):
+    redirect_client = await redirect_client
+    monkeypatch.setattr(storage.local, "root", str(tmp_path))
+    name = "0" * 64 + ".txt"
+    await url_maps.create(
+        storage.local.path(name), short="file", validate=False
+    )
+
+    response = await redirect_client.get("/file", allow_redirects=False)
+    assert response.status == HTTPStatus.FOUND
+    assert response.headers["Location"] == (
+        f"{redirect_client.make_url('/')}download/{name}"
+    ), "Файл из локального хранилища должен отдаваться маршрутом Flask."
+
+
+@pytest.fixture
+def replica(_app, monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    db.metadata.create_all(engine)
+    monkeypatch.setitem(db.engines, "replica0", engine)
+    monkeypatch.setattr(replicas, "keys", ["replica0"])
+    monkeypatch.setattr(replicas, "down", {})
+    yield engine
+    engine.dispose()
+
+
+async def test_reads_go_to_replica_unless_sticky(
+    _app, replica, redirect_client
+):
+    redirect_client = await redirect_client
+    with replica.begin() as connection:
+        connection.execute(
+            db.insert(URLMap), [dict(original=PY_URL, short="replica")]
+        )
+    response = await redirect_client.get("/replica", allow_redirects=False)
+    assert response.status == HTTPStatus.FOUND, (
+        "Промах кэша сервера редиректов должен читать из реплики."
+    )
+
+    await url_maps.create(PY_URL, short="fresh")
+    url_cache.clear()
+    response = await redirect_client.get("/fresh", allow_redirects=False)
+    assert response.status == HTTPStatus.NOT_FOUND
+    serializer = _app.session_interface.get_signing_serializer(_app)
+    cookie = serializer.dumps({STICKY_KEY: time.time() + 10})
+    response = await redirect_client.get(
+        "/fresh",
+        allow_redirects=False,
+        headers={"Cookie": f"{_app.config['SESSION_COOKIE_NAME']}={cookie}"},
+    )
+    assert response.status == HTTPStatus.FOUND, (
+        "Сразу после создания ссылки через Flask переход того же клиента "
+        "должен читать из основной базы."
+    )
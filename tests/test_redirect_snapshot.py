@@ -0,0 +1,79 @@
+import os
+from http import HTTPStatus
+
+import pytest
+
+from tests.conftest import PY_URL
+from yacut.models import URLMap
+from yacut.redirect_snapshot import (
+    SnapshotFile,
+    redirect_snapshot,
+    write_snapshot,
+)
+
+
+@pytest.fixture
+def snapshot_lookup(_app, monkeypatch, tmp_path):
+    path = str(tmp_path / "redirects.bin")
+    monkeypatch.setattr(redirect_snapshot, "enabled", True)
+    monkeypatch.setattr(redirect_snapshot, "path", path)
+    monkeypatch.setattr(redirect_snapshot, "check_interval", 0)
+    monkeypatch.setattr(redirect_snapshot, "snapshot", None)
+    return path
+
+
+def test_snapshot_binary_search(tmp_path):
+    path = tmp_path / "redirects.bin"
+    rows = [
+        (f"s{number}", f"https://example.com/{number}")
+        for number in range(100)
+    ]
+    rows.append(("ключ", "https://пример.рф/"))
+    assert write_snapshot(path, reversed(rows)) == len(rows)
+    snapshot = SnapshotFile(path)
+    for short, original in rows:
+        assert snapshot.get(short) == original, (
+            "Поиск по снимку должен находить каждую выгруженную ссылку."
+        )
+    for short in ("s", "s100", "a", "zzz", "x" * 20):
+        assert snapshot.get(short) is None
+    write_snapshot(path, [])
+    assert SnapshotFile(path).get("s1") is None
+
+
+def test_failed_export_keeps_old_snapshot(tmp_path, monkeypatch):
+    path = tmp_path / "redirects.bin"
+    write_snapshot(path, [("py", PY_URL)])
+
+    def fail(descriptor):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(os, "fsync", fail)
+    with pytest.raises(OSError):
+        write_snapshot(path, [("docs", PY_URL)])
+    assert [file.name for file in tmp_path.iterdir()] == ["redirects.bin"], (
+        "Временный файл неудачной выгрузки должен удаляться."
+    )
+    assert SnapshotFile(path).get("py") == PY_URL
+
+
+def test_export_and_redirect_without_db(
+    _app,
+    short_python_url, snapshot_lookup, cli_runner, client, monkeypatch
+):
+    result = cli_runner.invoke(args=["export-snapshot", snapshot_lookup])
+    assert "Записей в снимке: 1" in result.output
+
+    def no_db(short):
+        raise AssertionError("В режиме снимка база не должна запрашиваться.")
+
+    monkeypatch.setattr(URLMap, "get_original", no_db)
+    response = client.get("/py")
+    assert response.status_code == HTTPStatus.FOUND
+    assert response.location == PY_URL
+    assert client.get("/new").status_code == HTTPStatus.NOT_FOUND
+
+    write_snapshot(snapshot_lookup, [("py", PY_URL), ("new", PY_URL)])
+    assert client.get("/new").location == PY_URL, (
+        "После атомарной подмены файла снимок должен перечитываться."
+    )
@@ -0,0 +1,69 @@
+from http import HTTPStatus
+
+import pytest
+from flask import g
+from sqlalchemy import create_engine
+
+from tests.conftest import PY_URL
+from yacut import db
+from yacut.cache import url_cache
+from yacut.models import URLMap
+from yacut.replicas import replicas
+
+
+@pytest.fixture
+def replica(_app, monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    db.metadata.create_all(engine)
+    monkeypatch.setitem(db.engines, "replica0", engine)
+    monkeypatch.setattr(replicas, "keys", ["replica0"])
+    monkeypatch.setattr(replicas, "sticky_seconds", 10)
+    monkeypatch.setattr(replicas, "down", {})
+    yield engine
+    engine.dispose()
+
+
+def test_reads_go_to_replica(replica):
+    with replica.begin() as connection:
+        connection.execute(
+            db.insert(URLMap), [dict(original=PY_URL, short="replica")]
+        )
+    assert URLMap.get_original("replica") == PY_URL, (
+        "Поиск по короткой ссылке должен идти в реплику."
+    )
+    assert URLMap.get_originals(["replica", "py"]) == {
+        "replica": PY_URL,
+        "py": None,
+    }
+
+
+def test_read_your_writes(replica, client):
+    response = client.post(
+        "/api/id/", json={"url": PY_URL, "custom_id": "new"}
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    # Контекст приложения фикстуры общий для запросов клиента: метка в
+    # g сбрасывается, чтобы проверялась именно сессия.
+    g.pop("primary_until")
+    url_cache.clear()
+    assert client.get("/new").status_code == HTTPStatus.FOUND, (
+        "Сразу после создания ссылки переход того же клиента должен "
+        "читать из основной базы, а не из отстающей реплики."
+    )
+    url_cache.clear()
+    other_client = client.application.test_client()
+    assert other_client.get("/new").status_code == HTTPStatus.NOT_FOUND
+
+
+def test_failed_replica_falls_back_to_primary(
+    _app, short_python_url, monkeypatch, tmp_path
+):
+    engine = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    monkeypatch.setitem(db.engines, "replica0", engine)
+    monkeypatch.setattr(replicas, "keys", ["replica0"])
+    monkeypatch.setattr(replicas, "down", {})
+    assert URLMap.get("py") is not None, (
+        "При недоступной реплике чтение должно идти в основную базу."
+    )
+    assert "replica0" in replicas.down
+    assert replicas.choose() is None
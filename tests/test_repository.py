@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+
+from tests.conftest import PY_URL
+from yacut import db
+from yacut.models import URLMap
+from yacut.replicas import replicas
+from yacut.repository import (
+    AsyncURLMapRepository,
+    async_database_uri,
+    url_maps,
+)
+
+
+@pytest.fixture
+def repository(_app, tmp_path, monkeypatch):
+    # Каждое соединение с :memory: открывает свою пустую базу.
+    monkeypatch.setattr(
+        url_maps, "uri", f"sqlite+aiosqlite:///{tmp_path / 'async.db'}"
+    )
+
+    async def prepare():
+        async with url_maps.session() as session:
+            connection = await session.connection()
+            await connection.run_sync(db.metadata.create_all)
+            await session.commit()
+        return url_maps
+
+    return prepare()
+
+
+def test_async_database_uri():
+    assert async_database_uri("sqlite:///yacut.db") == (
+        "sqlite+aiosqlite:///yacut.db"
+    )
+    assert async_database_uri("postgresql+psycopg2://u:p@host/yacut") == (
+        "postgresql+asyncpg://u:p@host/yacut"
+    ), "Для PostgreSQL должен подставляться драйвер asyncpg."
+
+
+def test_relative_sqlite_path_matches_flask(_app, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = Flask(__name__, instance_path=str(tmp_path / "instance"))
+    app.config.update(_app.config)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite:///yacut.db",
+        SQLALCHEMY_BINDS={},
+        ASYNC_DATABASE_URI=None,
+    )
+    db.init_app(app)
+    repository = AsyncURLMapRepository()
+    repository.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(URLMap(original=PY_URL, short="py"))
+        db.session.commit()
+
+    async def lookup():
+        try:
+            return await repository.get("py")
+        finally:
+            await repository.dispose()
+
+    assert asyncio.run(lookup()).original == PY_URL, (
+        "Асинхронный движок должен открывать ту же базу SQLite, что и "
+        "Flask-SQLAlchemy (в каталоге instance)."
+    )
+    assert not (tmp_path / "yacut.db").exists()
+
+
+async def test_create_and_get(repository):
+    repository = await repository
+    try:
+        url_map = await repository.create("https://www.python.org")
+        assert await repository.get(url_map.short) is not None
+        assert await repository.get_original(url_map.short) == (
+            "https://www.python.org"
+        )
+        await repository.create("https://docs.python.org", short="docs")
+        with pytest.raises(ValueError):
+            await repository.create("https://pypi.org", short="docs")
+        assert await repository.get("missing") is None
+    finally:
+        await repository.dispose()
+
+
+async def test_concurrent_and_bulk_create(repository):
+    repository = await repository
+    try:
+        created = await asyncio.gather(
+            *(
+                repository.create(f"https://example.com/{number}")
+                for number in range(20)
+            )
+        )
+        assert len({url_map.short for url_map in created}) == 20, (
+            "Конкурентные вставки должны получать разные короткие ID."
+        )
+        results = await repository.bulk_create(
+            [
+                ("https://example.com/a", "bulkA"),
+                ("https://example.com/b", None),
+                ("https://example.com/c", "bulkA"),
+                ("https://example.com/d", created[0].short),
+            ]
+        )
+        assert results[0] == ("bulkA", None)
+        assert results[1][0] is not None
+        assert results[2][0] is None and results[3][0] is None, (
+            "Повтор в пачке и занятый ID должны возвращать ошибку."
+        )
+        originals = await repository.get_originals(
+            ["bulkA", results[1][0], "missing"]
+        )
+        assert originals == {
+            "bulkA": "https://example.com/a",
+            results[1][0]: "https://example.com/b",
+            "missing": None,
+        }
+    finally:
+        await repository.dispose()
+
+
+async def test_failed_replica_falls_back_to_primary(
+    repository, monkeypatch, tmp_path
+):
+    repository = await repository
+    engine = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    monkeypatch.setitem(db.engines, "replica0", engine)
+    monkeypatch.setattr(replicas, "keys", ["replica0"])
+    monkeypatch.setattr(replicas, "down", {})
+    monkeypatch.setattr(repository, "_replicas", {})
+    try:
+        await repository.create(PY_URL, short="py")
+        assert (await repository.get("py", primary=False)) is not None, (
+            "При недоступной реплике чтение должно идти в основную базу."
+        )
+        assert "replica0" in replicas.down
+    finally:
+        await repository.dispose()
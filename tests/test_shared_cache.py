@@ -0,0 +1,91 @@
+import os
+import struct
+from multiprocessing import Process
+
+from tests.conftest import PY_URL
+from yacut.models import URLMap
+from yacut.shared_cache import (
+    RedisBackend,
+    SharedMemoryTable,
+    shared_cache,
+)
+
+
+def _write_from_child(name):
+    table = SharedMemoryTable(name, slots=64, slot_size=256)
+    table.set("py", PY_URL)
+    table.close()
+
+
+def test_shared_memory_table_visible_across_processes():
+    name = f"yacut-test-{os.getpid()}"
+    table = SharedMemoryTable(name, slots=64, slot_size=256)
+    try:
+        process = Process(target=_write_from_child, args=(name,))
+        process.start()
+        process.join()
+        assert table.get("py") == PY_URL, (
+            "Запись из другого процесса должна быть видна в общем кэше."
+        )
+        assert table.get("missing") is None
+        table.set("long", "x" * 1024)
+        assert table.get("long") is None, (
+            "Значения, не помещающиеся в слот, не должны кэшироваться."
+        )
+    finally:
+        table.unlink()
+
+
+def test_shared_memory_table_overwrites_full_window():
+    name = f"yacut-test-full-{os.getpid()}"
+    table = SharedMemoryTable(name, slots=4, slot_size=128)
+    try:
+        for number in range(20):
+            table.set(f"key{number}", f"value{number}")
+        assert table.get("key19") == "value19"
+    finally:
+        table.unlink()
+
+
+def test_redis_backend(client, redis_server, monkeypatch, short_python_url):
+    host, port = redis_server.server_address
+    monkeypatch.setattr(
+        shared_cache, "backend", RedisBackend(f"redis://{host}:{port}/1", 60)
+    )
+    assert URLMap.get_original("py") == PY_URL
+    assert redis_server.storage == {b"yacut:url:py": PY_URL.encode()}, (
+        "Найденная ссылка должна сохраняться в общем кэше."
+    )
+    redis_server.storage[b"yacut:url:docs"] = b"https://docs.python.org"
+    assert URLMap.get_original("docs") == "https://docs.python.org"
+    assert "SELECT" in redis_server.calls
+
+
+def test_shared_memory_table_recreated_on_new_geometry():
+    name = f"yacut-test-geometry-{os.getpid()}"
+    old = SharedMemoryTable(name, slots=4, slot_size=128)
+    old.set("py", PY_URL)
+    old.close()
+    table = SharedMemoryTable(name, slots=64, slot_size=256)
+    try:
+        assert table.get("py") is None, (
+            "Сегмент с другой геометрией должен создаваться заново."
+        )
+        table.set("py", PY_URL)
+        assert table.get("py") == PY_URL
+    finally:
+        table.unlink()
+
+
+def test_backend_errors_fall_through(client, monkeypatch, short_python_url):
+    class BrokenBackend:
+        def get(self, short):
+            raise struct.error("unpack_from requires a buffer")
+
+        def set(self, short, original):
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid")
+
+    monkeypatch.setattr(shared_cache, "backend", BrokenBackend())
+    assert URLMap.get_original("py") == PY_URL, (
+        "Ошибка разбора данных общего кэша не должна ломать поиск."
+    )
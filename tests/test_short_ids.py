@@ -0,0 +1,56 @@
+from tests.conftest import PY_URL
+from yacut import db
+from yacut.constants import SHORT_LENGTH
+from yacut.models import ShortIdSequence, URLMap
+from yacut.short_ids import (
+    SHORT_SPACE,
+    decode_base62,
+    encode_base62,
+    find_free_shorts,
+    permute,
+    short_pool,
+    short_sequence,
+)
+
+
+def test_find_free_shorts(client, short_python_url):
+    assert find_free_shorts(["py", "files", "abc", "abc"]) == ["abc"], (
+        "Занятые и зарезервированные ID не должны попадать в пул."
+    )
+
+
+def test_create_uses_pool(client, monkeypatch):
+    monkeypatch.setattr(short_pool, "size", 5)
+    monkeypatch.setattr(short_pool, "_start", lambda: None)
+    short_pool.refill()
+    assert len(short_pool) == 5
+    pooled = list(short_pool._shorts)
+    url_map = URLMap.create(original=PY_URL)
+    assert url_map.short == pooled[0], (
+        "Сгенерированный ID должен браться из пула."
+    )
+    assert len(url_map.short) == SHORT_LENGTH
+    short_pool.clear()
+
+
+def test_permute_is_bijective():
+    key = b"secret"
+    numbers = range(1000)
+    permuted = {permute(number, key) for number in numbers}
+    assert len(permuted) == len(numbers), (
+        "Перестановка должна давать разные значения для разных чисел."
+    )
+    assert all(number < SHORT_SPACE for number in permuted)
+    assert decode_base62(encode_base62(SHORT_SPACE - 1)) == SHORT_SPACE - 1
+
+
+def test_sequence_leases_ranges(client, monkeypatch):
+    monkeypatch.setattr(short_sequence, "enabled", True)
+    monkeypatch.setattr(short_sequence.lease, "size", 2)
+    short_sequence.lease.reset()
+    shorts = [URLMap.create(original=PY_URL).short for _ in range(5)]
+    assert len(set(shorts)) == 5
+    assert all(len(short) == SHORT_LENGTH for short in shorts)
+    assert db.session.get(ShortIdSequence, 1).next_value == 6, (
+        "Счетчик должен выдаваться процессу диапазонами."
+    )
@@ -0,0 +1,56 @@
+import hashlib
+import re
+from http import HTTPStatus
+from io import BytesIO
+
+import pytest
+
+from yacut.storage import storage
+
+CONTENT = b"0123456789" * 100
+
+
+@pytest.fixture
+def local_storage(_app, monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, "backend", storage.local)
+    monkeypatch.setattr(storage.local, "root", str(tmp_path))
+    return tmp_path
+
+
+def test_local_storage_serves_files(client, local_storage):
+    response = client.post(
+        "/files", data={"files": [(BytesIO(CONTENT), "данные.txt")]}
+    )
+    short_url = re.search(
+        r'href="http://localhost/(\w+)"', response.data.decode()
+    ).group(1)
+    digest = hashlib.sha256(CONTENT).hexdigest()
+    assert (local_storage / f"{digest}.txt").read_bytes() == CONTENT, (
+        "Файл должен записываться в каталог локального хранилища."
+    )
+
+    redirect = client.get(f"/{short_url}")
+    assert redirect.location == f"http://localhost/download/{digest}.txt"
+    response = client.get(redirect.location)
+    assert response.data == CONTENT
+    assert response.headers["ETag"] == f'"{digest}"', (
+        "ETag файла должен быть строгим и совпадать с хешем содержимого."
+    )
+
+    partial = client.get(redirect.location, headers={"Range": "bytes=0-9"})
+    assert partial.status_code == HTTPStatus.PARTIAL_CONTENT
+    assert partial.data == CONTENT[:10]
+    cached = client.get(
+        redirect.location, headers={"If-None-Match": f'"{digest}"'}
+    )
+    assert cached.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_download_rejects_unknown_names(client, local_storage):
+    assert client.get("/download/..%2Fsecret").status_code == (
+        HTTPStatus.NOT_FOUND
+    )
+    missing = "0" * 64 + ".txt"
+    assert client.get(f"/download/{missing}").status_code == (
+        HTTPStatus.NOT_FOUND
+    )
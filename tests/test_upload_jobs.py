@@ -0,0 +1,140 @@
+from http import HTTPStatus
+from io import BytesIO
+
+import pytest
+
+from yacut import upload_jobs
+from yacut.constants import MAX_FILE_SIZE
+from yacut.upload_jobs import UploadWorkers, upload_workers
+from yacut.storage import UploadResult
+
+
+@pytest.fixture
+def jobs_app(_app, monkeypatch, tmp_path):
+    monkeypatch.setitem(_app.config, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(upload_workers, "size", 0)
+
+    async def fake_upload_files(files, on_result=None, digests=None):
+        results = []
+        for index, file in enumerate(files):
+            if file.read() == b"broken":
+                result = UploadResult(file.filename, None, "Ошибка Диска")
+            else:
+                result = UploadResult(
+                    file.filename, f"https://disk.yandex.ru/{index}", None
+                )
+            on_result(index, result)
+            results.append(result)
+        return results
+
+    monkeypatch.setattr(upload_jobs, "upload_files", fake_upload_files)
+    return _app
+
+
+def test_upload_job_progress(jobs_app, client, tmp_path):
+    response = client.post(
+        "/api/files/",
+        data={
+            "files": [
+                (BytesIO(b"data"), "good.txt"),
+                (BytesIO(b"broken"), "bad.txt"),
+            ]
+        },
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == HTTPStatus.ACCEPTED, (
+        "Постановка файлов в очередь должна возвращать статус 202."
+    )
+    job_id = response.json["job_id"]
+    assert len(list(tmp_path.iterdir())) == 2
+    status = client.get(f"/api/files/{job_id}/").json
+    assert status["status"] == "pending"
+
+    assert upload_workers.run_once()
+    assert not upload_workers.run_once(), (
+        "Обработанное задание не должно захватываться повторно."
+    )
+    status = client.get(f"/api/files/{job_id}/").json
+    assert status["status"] == "failed"
+    good, bad = status["files"]
+    assert good["status"] == "done" and good["short_link"]
+    assert bad["status"] == "failed" and bad["error"] == "Ошибка Диска"
+    assert [path.name for path in tmp_path.iterdir()] == [f"{job_id}-1"], (
+        "Временный файл удаляется только после успешной загрузки."
+    )
+
+    events = client.get(f"/api/files/{job_id}/events")
+    assert events.mimetype == "text/event-stream"
+    assert events.get_data(as_text=True).startswith("data: ")
+
+
+def test_upload_job_errors(jobs_app, client):
+    assert client.post("/api/files/").status_code == HTTPStatus.BAD_REQUEST
+    response = client.get("/api/files/unknown/")
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_lost_results_do_not_hang_worker(jobs_app, client, monkeypatch):
+    monkeypatch.setitem(jobs_app.config, "UPLOAD_JOB_POLL_INTERVAL", 0.01)
+
+    async def silent_upload_files(files, on_result=None, digests=None):
+        return []
+
+    monkeypatch.setattr(upload_jobs, "upload_files", silent_upload_files)
+    response = client.post(
+        "/api/files/",
+        data={"files": [(BytesIO(b"data"), "good.txt")]},
+        content_type="multipart/form-data",
+    )
+    job_id = response.json["job_id"]
+    assert upload_workers.run_once(), (
+        "Воркер не должен ждать результатов завершившейся загрузки."
+    )
+    status = client.get(f"/api/files/{job_id}/").json
+    assert status["status"] == "running"
+
+
+def test_workers_start_with_app(jobs_app, monkeypatch):
+    monkeypatch.setitem(jobs_app.config, "UPLOAD_JOBS_ENABLED", True)
+    monkeypatch.setitem(jobs_app.config, "UPLOAD_WORKERS", 1)
+    workers = UploadWorkers()
+    monkeypatch.setattr(workers, "run_once", lambda: False)
+    workers.init_app(jobs_app)
+    assert [thread.is_alive() for thread in workers.threads] == [True], (
+        "С UPLOAD_JOBS_ENABLED воркеры должны запускаться вместе с "
+        "приложением и подхватывать оставшиеся задания."
+    )
+
+
+def test_upload_job_rejects_invalid_files(jobs_app, client, tmp_path):
+    response = client.post(
+        "/api/files/",
+        data={"files": [(BytesIO(b"MZ"), "evil.exe")]},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST, (
+        "Файлы недопустимых типов не должны ставиться в очередь."
+    )
+    response = client.post(
+        "/api/files/",
+        data={"files": [(BytesIO(b"x" * (MAX_FILE_SIZE + 1)), "big.txt")]},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST, (
+        "Файлы больше MAX_FILE_SIZE не должны ставиться в очередь."
+    )
+    assert not list(tmp_path.iterdir())
+
+
+def test_files_page_polls_job_status(jobs_app, client, monkeypatch):
+    monkeypatch.setitem(jobs_app.config, "UPLOAD_JOBS_ENABLED", True)
+    response = client.post(
+        "/files",
+        data={"files": [(BytesIO(b"data"), "good.txt")]},
+        content_type="multipart/form-data",
+    )
+    page = response.get_data(as_text=True)
+    assert "EventSource" not in page and "fetch(statusUrl)" in page, (
+        "Страница /files должна опрашивать статус задания, а не держать "
+        "воркер потоком server-sent events."
+    )
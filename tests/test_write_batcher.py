@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.conftest import PY_URL
+from yacut.models import URLMap
+from yacut.write_batcher import write_batcher
+
+
+def test_concurrent_creates_share_batch(client, monkeypatch):
+    monkeypatch.setattr(write_batcher, "max_size", 10)
+    monkeypatch.setattr(write_batcher, "max_latency", 0.2)
+    monkeypatch.setattr(write_batcher, "max_batch_size", 0)
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        results = list(
+            executor.map(
+                lambda number: write_batcher.submit(PY_URL, f"link{number}"),
+                range(10),
+            )
+        )
+    assert results == [(f"link{number}", None) for number in range(10)]
+    assert URLMap.query.count() == 10, (
+        "Все ссылки из очереди должны быть сохранены в базе данных."
+    )
+    assert write_batcher.stats()["max_batch_size"] > 1, (
+        "Параллельные создания должны сохраняться общей пачкой."
+    )
+
+
+def test_batched_create_reports_conflict(
+    client, monkeypatch, short_python_url, duplicated_custom_id_msg
+):
+    monkeypatch.setattr(write_batcher, "max_size", 10)
+    assert write_batcher.submit(PY_URL, "py") == (
+        None,
+        duplicated_custom_id_msg,
+    )
+    url_map = URLMap.create(original=PY_URL)
+    assert URLMap.get_original(url_map.short) == PY_URL
@@ -0,0 +1,311 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from http import HTTPStatus
+from io import BytesIO
+
+import pytest
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+from werkzeug.datastructures import FileStorage
+
+from yacut import yandex_disk
+from yacut.error_handlers import YandexDiskError
+from yacut.models import URLMap
+from yacut.storage import UploadResult, upload_files_async
+from yacut.yandex_disk import (
+    BREAKER_OPEN_ERROR,
+    CircuitBreaker,
+    delete_resource,
+    disk_client,
+    download_links,
+    get_stream_size,
+    move_resource,
+    read_chunks,
+    upload_file_content,
+    with_retries,
+)
+
+
+def test_disk_client_reuses_loop_and_session(_app):
+    first = disk_client.run(disk_client.get_session())
+    loop_thread = disk_client.thread
+    second = disk_client.run(disk_client.get_session())
+    assert first is second, (
+        "Запросы к API Диска должны использовать общую сессию aiohttp."
+    )
+    assert disk_client.thread is loop_thread
+    assert loop_thread is not threading.current_thread()
+    disk_client.stop()
+    assert first.closed, "При остановке клиента сессия должна закрываться."
+    assert not loop_thread.is_alive()
+
+
+class CountingStream(BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def test_read_chunks_bounded_read_ahead():
+    stream = CountingStream(b"x" * 100)
+
+    async def consume():
+        chunks = read_chunks(stream, chunk_size=10, read_ahead=2)
+        first = await chunks.__anext__()
+        await asyncio.sleep(0.05)
+        reads_after_first = stream.reads
+        rest = [chunk async for chunk in chunks]
+        return first, reads_after_first, rest
+
+    first, reads_after_first, rest = asyncio.run(consume())
+    assert first + b"".join(rest) == b"x" * 100
+    assert reads_after_first <= 4, (
+        "Чтение файла не должно опережать отправку больше чем на "
+        "`read_ahead` кусков."
+    )
+    assert get_stream_size(BytesIO(b"abc")) == 3
+
+
+class SlowStream(BytesIO):
+    def read(self, size=-1):
+        time.sleep(0.02)
+        return super().read(size)
+
+
+def test_put_timeout_limits_idle_time(_app, monkeypatch):
+    monkeypatch.setitem(_app.config, "DISK_PUT_TIMEOUT", 0.2)
+    monkeypatch.setitem(_app.config, "DISK_UPLOAD_CHUNK_SIZE", 10)
+    response_delay = 0
+    received = []
+
+    async def receive(request):
+        received.append(await request.read())
+        await asyncio.sleep(response_delay)
+        return web.Response(status=HTTPStatus.CREATED)
+
+    async def upload(stream):
+        app = web.Application()
+        app.router.add_put("/upload", receive)
+        async with TestServer(app) as server, ClientSession() as session:
+            await upload_file_content(
+                session,
+                str(server.make_url("/upload")),
+                FileStorage(stream, filename="big.bin"),
+            )
+
+    asyncio.run(upload(SlowStream(b"x" * 300)))
+    assert received == [b"x" * 300], (
+        "Загрузка дольше DISK_PUT_TIMEOUT не должна прерываться, "
+        "пока данные отправляются."
+    )
+    response_delay = 1
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(upload(BytesIO(b"x")))
+
+
+def test_move_waits_for_async_operation(_app, monkeypatch):
+    monkeypatch.setattr(yandex_disk, "OPERATION_POLL_INTERVAL", 0)
+    calls = []
+    statuses = iter(["in-progress", "success"])
+    urls = {}
+
+    async def move(request):
+        calls.append(("move", request.query["from"], request.query["path"]))
+        return web.json_response(
+            {"href": urls["operation"]}, status=HTTPStatus.ACCEPTED
+        )
+
+    async def operation(request):
+        calls.append("operation")
+        return web.json_response({"status": next(statuses)})
+
+    async def delete(request):
+        calls.append(("delete", request.query["path"]))
+        return web.Response(status=HTTPStatus.NOT_FOUND)
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post("/v1/disk/resources/move", move)
+        app.router.add_get("/operation", operation)
+        app.router.add_delete("/v1/disk/resources", delete)
+        async with TestServer(app) as server, ClientSession() as session:
+            urls["operation"] = str(server.make_url("/operation"))
+            monkeypatch.setitem(
+                _app.config,
+                "YANDEX_API_BASE",
+                str(server.make_url("")).rstrip("/"),
+            )
+            await move_resource(session, "disk:/yacut/.upload-1", "disk:/a")
+            await delete_resource(session, "disk:/yacut/.upload-1")
+
+    asyncio.run(scenario())
+    assert calls == [
+        ("move", "disk:/yacut/.upload-1", "disk:/a"),
+        "operation",
+        "operation",
+        ("delete", "disk:/yacut/.upload-1"),
+    ], (
+        "Перемещение должно дожидаться асинхронной операции Диска, а "
+        "удаление отсутствующего файла - не быть ошибкой."
+    )
+
+
+def test_with_retries_retries_retryable_statuses(_app, monkeypatch):
+    monkeypatch.setitem(_app.config, "DISK_BACKOFF_BASE", 0)
+    calls = []
+
+    async def step():
+        calls.append(1)
+        if len(calls) < 3:
+            raise YandexDiskError("503", HTTPStatus.SERVICE_UNAVAILABLE)
+        return "href"
+
+    assert asyncio.run(with_retries(step)) == "href"
+    assert len(calls) == 3, (
+        "Ответы API Диска с временными ошибками должны повторяться."
+    )
+
+
+def test_with_retries_does_not_retry_client_errors(_app):
+    calls = []
+
+    async def step():
+        calls.append(1)
+        raise YandexDiskError("404", HTTPStatus.NOT_FOUND)
+
+    with pytest.raises(YandexDiskError):
+        asyncio.run(with_retries(step))
+    assert len(calls) == 1
+
+
+def test_failed_file_does_not_cancel_others(_app, monkeypatch):
+    async def upload_single_file(session, file, digest):
+        if file.filename == "bad.png":
+            raise YandexDiskError("Ошибка загрузки: 507", 507)
+        await asyncio.sleep(0.01)
+        return file.filename, f"https://disk/{file.filename}"
+
+    monkeypatch.setattr(yandex_disk, "upload_single_file", upload_single_file)
+    files = [
+        FileStorage(BytesIO(b"1"), filename="good.png"),
+        FileStorage(BytesIO(b"2"), filename="bad.png"),
+    ]
+    assert [result[:3] for result in upload_files_async(files)] == [
+        ("good.png", "https://disk/good.png", None),
+        ("bad.png", None, "Ошибка загрузки: 507"),
+    ], "Ошибка загрузки одного файла не должна отменять загрузку остальных."
+
+
+def test_circuit_breaker_opens_and_recovers(client, monkeypatch):
+    breaker = CircuitBreaker(failures=2, window=5, reset_timeout=10)
+    now = time.monotonic()
+
+    async def fail():
+        raise YandexDiskError("500", HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    async def succeed():
+        return "ok"
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(YandexDiskError):
+                await breaker.call(fail())
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(YandexDiskError, match=BREAKER_OPEN_ERROR):
+            await breaker.call(succeed())
+        monkeypatch.setattr(time, "monotonic", lambda: now + 60)
+        assert await breaker.call(succeed()) == "ok"
+
+    asyncio.run(scenario())
+    assert breaker.state == CircuitBreaker.CLOSED, (
+        "Успешный пробный вызов должен замыкать предохранитель."
+    )
+    assert breaker.stats()["trips"] == 1
+    assert breaker.stats()["rejected"] == 1
+    monkeypatch.undo()
+    response = client.get("/api/status/")
+    assert response.json["disk_breaker"]["state"] == CircuitBreaker.CLOSED
+
+
+def test_download_link_ttl_follows_expires(_app):
+    expires = int(time.time()) + 30 + download_links.expiry_margin
+    download_links.remember("disk:/a", f"https://dl/a?expires={expires}")
+    download_links.remember("disk:/b", "https://dl/b?expires=1")
+    download_links.remember("disk:/c", "https://dl/c")
+    assert download_links.cache.get("disk:/a") == (
+        f"https://dl/a?expires={expires}"
+    )
+    assert download_links.cache.get("disk:/b") is yandex_disk.MISSING, (
+        "Истекающая ссылка на скачивание не должна попадать в кэш."
+    )
+    assert download_links.cache.get("disk:/c") == "https://dl/c"
+
+
+def test_file_link_resolves_once_for_concurrent_redirects(
+    client, monkeypatch
+):
+    calls = []
+
+    async def fetch_download_url(session, path):
+        calls.append(path)
+        await asyncio.sleep(0.05)
+        return f"https://dl{path[len('disk:'):]}"
+
+    monkeypatch.setattr(yandex_disk, "fetch_download_url", fetch_download_url)
+    short = URLMap.create(original="disk:/yacut/abc.png", is_file=True).short
+    with pytest.raises(ValueError):
+        URLMap.create(original="disk:/yacut/abc.png")
+
+    responses = []
+    threads = [
+        threading.Thread(
+            target=lambda: responses.append(
+                download_links.resolve("disk:/yacut/abc.png")
+            )
+        )
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert responses == ["https://dl/yacut/abc.png"] * 5
+    assert len(calls) == 1, (
+        "Параллельные запросы одного файла должны ждать общего обращения "
+        "к API Диска."
+    )
+    response = client.get(f"/{short}")
+    assert response.location == "https://dl/yacut/abc.png"
+    assert len(calls) == 1, "Ссылка на скачивание должна браться из кэша."
+
+
+def test_resolve_does_not_deadlock_on_finished_future(_app, monkeypatch):
+    def submit(coroutine):
+        coroutine.close()
+        future = Future()
+        future.set_exception(YandexDiskError(BREAKER_OPEN_ERROR))
+        return future
+
+    monkeypatch.setattr(disk_client, "submit", submit)
+    errors = []
+
+    def resolve():
+        try:
+            download_links.resolve("disk:/yacut/closed.png")
+        except YandexDiskError as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=resolve, daemon=True)
+    thread.start()
+    thread.join(2)
+    assert not thread.is_alive(), (
+        "Уже завершенное обращение к API не должно блокировать поток."
+    )
+    assert len(errors) == 1
+    assert not download_links._pending
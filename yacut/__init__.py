@@ -16,10 +16,47 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
 
+    from .bloom import short_filter
+    from .cache import original_cache, url_cache
+    from .images import image_optimizer
+    from .redirect_snapshot import redirect_snapshot
+    from .replicas import replicas
+    from .repository import url_maps
+    from .shared_cache import shared_cache
+    from .short_ids import short_keys, short_pool, short_sequence
+    from .write_batcher import write_batcher
+    from .storage import storage
+    from .yandex_disk import disk_breaker, disk_client, download_links
+
+    replicas.init_app(app)
+    url_cache.init_app(app)
+    original_cache.init_app(app, "URL_DEDUP_CACHE")
+    shared_cache.init_app(app)
+    short_filter.init_app(app)
+    short_pool.init_app(app)
+    short_sequence.init_app(app)
+    short_keys.init_app(app)
+    write_batcher.init_app(app)
+    disk_client.init_app(app)
+    disk_breaker.init_app(app)
+    download_links.init_app(app)
+    image_optimizer.init_app(app)
+    storage.init_app(app)
+    url_maps.init_app(app)
+    redirect_snapshot.init_app(app)
+
     from .api_views import api_bp
+    from .chunked_uploads import expire_uploads_command
     from .error_handlers import init_error_handlers
+    from .redirect_snapshot import export_snapshot_command
+    from .upload_jobs import upload_worker_command, upload_workers
     from .views import main_bp
 
+    upload_workers.init_app(app)
+    app.cli.add_command(upload_worker_command)
+    app.cli.add_command(export_snapshot_command)
+    app.cli.add_command(expire_uploads_command)
+
     app.register_blueprint(main_bp)
     app.register_blueprint(api_bp, url_prefix="/api")
 
@@ -1,13 +1,45 @@
+import json
+import time
+import zlib
 from http import HTTPStatus
 
-from flask import Blueprint, jsonify, request
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+    url_for,
+)
 
+from . import db
+from .cache import original_cache, url_cache
+from .chunked_uploads import complete_upload, create_upload, write_chunk
+from .images import image_optimizer
+from .constants import ALLOWED_FILES, MAX_FILE_SIZE, REDIRECT_ENPOINT
 from .error_handlers import InvalidAPIUsage
-from .models import URLMap
+from .models import INVALID_SHORT_NAME, ChunkedUpload, UploadJob, URLMap
+from .redirect_snapshot import redirect_snapshot
+from .replicas import replicas
+from .upload_jobs import create_job
+from .write_batcher import write_batcher
+from .storage import storage
+from .yandex_disk import disk_breaker, download_links, get_stream_size
 
 EMPTY_REQUEST_BODY = "Отсутствует тело запроса"
 URL_REQUIRED_FIELD = '"url" является обязательным полем!'
 NOT_FOUND_ID = "Указанный id не найден"
+LIST_REQUIRED = "Ожидается непустой список"
+STRINGS_REQUIRED = "Ожидается список строк"
+TOO_MANY_ITEMS = "Слишком много элементов, максимум {}"
+INVALID_GZIP = "Некорректное сжатое тело запроса"
+BODY_TOO_LARGE = "Слишком большое тело запроса"
+FILES_REQUIRED = '"files" является обязательным полем!'
+NOT_FOUND_JOB = "Указанное задание не найдено"
+NOT_FOUND_UPLOAD = "Указанная загрузка не найдена"
+INVALID_FILE_TYPE = "Недопустимый тип файла {}, разрешены: {}"
+FILE_TOO_LARGE = "Файл {} больше {} байт"
 
 api_bp = Blueprint("api", __name__)
 
@@ -38,11 +70,258 @@ def create_short_link():
     )
 
 
+def get_request_json():
+    """Тело запроса в JSON, в том числе сжатое gzip."""
+    data = request.get_data()
+    if request.content_encoding == "gzip":
+        max_size = current_app.config["BULK_MAX_BODY_SIZE"]
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        try:
+            data = decompressor.decompress(data, max_size)
+        except zlib.error:
+            raise InvalidAPIUsage(INVALID_GZIP)
+        if decompressor.unconsumed_tail:
+            raise InvalidAPIUsage(
+                BODY_TOO_LARGE, HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+            )
+    if not data:
+        raise InvalidAPIUsage(EMPTY_REQUEST_BODY)
+    try:
+        return json.loads(data)
+    except ValueError:
+        raise InvalidAPIUsage(EMPTY_REQUEST_BODY)
+
+
+@api_bp.route("/ids/", methods=["POST"])
+def create_short_links():
+    """Массовое создание коротких ссылок"""
+    items = get_request_json()
+    if not isinstance(items, list) or not items:
+        raise InvalidAPIUsage(LIST_REQUIRED)
+    limit = current_app.config["BULK_CREATE_LIMIT"]
+    if len(items) > limit:
+        raise InvalidAPIUsage(TOO_MANY_ITEMS.format(limit))
+
+    results = [dict(message=URL_REQUIRED_FIELD) for _ in items]
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("url"), str):
+            continue
+        if not isinstance(item.get("custom_id") or "", str):
+            results[index] = dict(url=item["url"], message=INVALID_SHORT_NAME)
+            continue
+        valid.append(index)
+    try:
+        created = URLMap.bulk_create(
+            [(items[i]["url"], items[i].get("custom_id")) for i in valid]
+        )
+    except RuntimeError as e:
+        raise InvalidAPIUsage(str(e))
+    for index, (short, error) in zip(valid, created):
+        results[index] = (
+            dict(
+                url=items[index]["url"],
+                short_link=url_for(
+                    REDIRECT_ENPOINT, short=short, _external=True
+                ),
+            )
+            if short
+            else dict(url=items[index]["url"], message=error)
+        )
+    return jsonify(results), HTTPStatus.CREATED
+
+
+@api_bp.route("/ids/resolve/", methods=["POST"])
+def get_original_urls():
+    """Получение оригинальных ссылок для списка коротких ID"""
+    shorts = get_request_json()
+    if not isinstance(shorts, list) or not shorts:
+        raise InvalidAPIUsage(LIST_REQUIRED)
+    if not all(isinstance(short, str) for short in shorts):
+        raise InvalidAPIUsage(STRINGS_REQUIRED)
+    limit = current_app.config["BULK_RESOLVE_LIMIT"]
+    if len(shorts) > limit:
+        raise InvalidAPIUsage(TOO_MANY_ITEMS.format(limit))
+    originals = URLMap.get_originals(shorts)
+    links = storage.resolve_many(
+        [
+            original
+            for original in originals.values()
+            if original and storage.is_file_path(original)
+        ]
+    )
+    return jsonify(
+        {
+            short: links.get(original, original)
+            for short, original in originals.items()
+        }
+    )
+
+
 @api_bp.route("/id/<short>/", methods=["GET"])
 def get_original_url(short):
     """Получение оригинальной ссылки по короткому ID"""
-    url_map = URLMap.get(short)
+    original = URLMap.get_original(short)
 
-    if not url_map:
+    if not original:
         raise InvalidAPIUsage(NOT_FOUND_ID, HTTPStatus.NOT_FOUND)
-    return jsonify({"url": url_map.original})
+    if storage.is_file_path(original):
+        original = storage.resolve(original)
+    return jsonify({"url": original})
+
+
+@api_bp.route("/files/", methods=["POST"])
+def create_upload_job():
+    """Постановка файлов в очередь на загрузку"""
+    files = [file for file in request.files.getlist("files") if file]
+    if not files:
+        raise InvalidAPIUsage(FILES_REQUIRED)
+    for file in files:
+        validate_file(file)
+    job = create_job(files)
+    return (
+        jsonify(
+            job_id=job.id,
+            status_url=url_for(
+                "api.get_upload_job", job_id=job.id, _external=True
+            ),
+        ),
+        HTTPStatus.ACCEPTED,
+    )
+
+
+def validate_file(file):
+    """Те же проверки, что у FileUploadForm: тип и размер файла."""
+    filename = file.filename or ""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension not in ALLOWED_FILES:
+        raise InvalidAPIUsage(
+            INVALID_FILE_TYPE.format(filename, ", ".join(ALLOWED_FILES))
+        )
+    size = get_stream_size(file.stream)
+    if size is not None and size > MAX_FILE_SIZE:
+        raise InvalidAPIUsage(FILE_TOO_LARGE.format(filename, MAX_FILE_SIZE))
+
+
+def get_job_or_404(job_id):
+    job = db.session.get(UploadJob, job_id)
+    if job is None:
+        raise InvalidAPIUsage(NOT_FOUND_JOB, HTTPStatus.NOT_FOUND)
+    return job
+
+
+@api_bp.route("/files/<job_id>/", methods=["GET"])
+def get_upload_job(job_id):
+    """Прогресс задания на загрузку"""
+    return jsonify(get_job_or_404(job_id).to_dict())
+
+
+@api_bp.route("/files/<job_id>/events", methods=["GET"])
+def get_upload_job_events(job_id):
+    """Прогресс задания на загрузку потоком server-sent events.
+
+    Поток держит обработчик до завершения задания: только для
+    асинхронных воркеров (gevent, eventlet). Страница /files и клиенты
+    синхронного WSGI опрашивают GET /api/files/<job_id>/.
+    """
+    get_job_or_404(job_id)
+    poll_interval = current_app.config["UPLOAD_JOB_POLL_INTERVAL"]
+
+    def events():
+        sent = None
+        while True:
+            db.session.expire_all()
+            job = db.session.get(UploadJob, job_id)
+            data = json.dumps(job.to_dict(), ensure_ascii=False)
+            if data != sent:
+                sent = data
+                yield f"data: {data}\n\n"
+            if job.finished:
+                return
+            time.sleep(poll_interval)
+
+    return Response(
+        stream_with_context(events()), mimetype="text/event-stream"
+    )
+
+
+@api_bp.route("/uploads/", methods=["POST"])
+def create_chunked_upload():
+    """Создание сессии загрузки файла по частям"""
+    data = get_request_json()
+    if not isinstance(data, dict):
+        raise InvalidAPIUsage(EMPTY_REQUEST_BODY)
+    try:
+        upload = create_upload(data.get("filename"), data.get("size"))
+    except ValueError as error:
+        raise InvalidAPIUsage(str(error))
+    return (
+        jsonify(
+            dict(
+                upload.to_dict(),
+                upload_url=url_for(
+                    "api.get_chunked_upload",
+                    upload_id=upload.id,
+                    _external=True,
+                ),
+            )
+        ),
+        HTTPStatus.CREATED,
+    )
+
+
+def get_upload_or_404(upload_id):
+    upload = db.session.get(ChunkedUpload, upload_id)
+    if upload is None:
+        raise InvalidAPIUsage(NOT_FOUND_UPLOAD, HTTPStatus.NOT_FOUND)
+    return upload
+
+
+@api_bp.route("/uploads/<upload_id>/", methods=["GET"])
+def get_chunked_upload(upload_id):
+    """Принятые части: по ним клиент докачивает недостающие"""
+    return jsonify(get_upload_or_404(upload_id).to_dict())
+
+
+@api_bp.route("/uploads/<upload_id>/chunks/<int:index>", methods=["PUT"])
+def put_upload_chunk(upload_id, index):
+    """Прием одной части файла"""
+    upload = get_upload_or_404(upload_id)
+    try:
+        write_chunk(upload, index, request.stream, request.content_length)
+    except ValueError as error:
+        raise InvalidAPIUsage(str(error))
+    return "", HTTPStatus.NO_CONTENT
+
+
+@api_bp.route("/uploads/<upload_id>/complete", methods=["POST"])
+def complete_chunked_upload(upload_id):
+    """Завершение загрузки и постановка файла в очередь"""
+    try:
+        job = complete_upload(get_upload_or_404(upload_id))
+    except ValueError as error:
+        raise InvalidAPIUsage(str(error), HTTPStatus.CONFLICT)
+    return (
+        jsonify(
+            job_id=job.id,
+            status_url=url_for(
+                "api.get_upload_job", job_id=job.id, _external=True
+            ),
+        ),
+        HTTPStatus.ACCEPTED,
+    )
+
+
+@api_bp.route("/status/", methods=["GET"])
+def get_status():
+    """Состояние кэшей, групповой записи и предохранителя API Диска"""
+    return jsonify(
+        url_cache=url_cache.stats(),
+        original_cache=original_cache.stats(),
+        write_batcher=write_batcher.stats(),
+        disk_breaker=disk_breaker.stats(),
+        download_links=download_links.stats(),
+        image_optimizer=image_optimizer.stats(),
+        redirect_snapshot=redirect_snapshot.stats(),
+        replicas=replicas.stats(),
+    )
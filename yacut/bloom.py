@@ -0,0 +1,274 @@
+import atexit
+import hashlib
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+SNAPSHOT_HEADER = struct.Struct(">QQQ")
+SCAN_BATCH_SIZE = 10000
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class BloomFilter:
+    """Фильтр Блума: отвечает «точно нет» или «возможно есть»."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(
+            8, int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        for index in range(self.hashes):
+            yield (first + index * second) % self.size
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class ShortFilter:
+    """Фильтр Блума по всем существующим коротким ID.
+
+    Строится потоковым проходом по url_map при первом обращении и
+    дополняется при каждой вставке. Строки, добавленные другими
+    процессами, подгружаются по индексу на timestamp перед каждым
+    отрицательным ответом, поэтому только что созданная где угодно
+    ссылка сразу находится. Досканирования одновременных промахов
+    объединяются в один проход. Первичный ключ для этого не подходит: с
+    SHORT_INTEGER_KEYS он не растет монотонно. Досканирование видит
+    только строки, закоммиченные не позже SYNC_OVERLAP после своего
+    timestamp; остальные (например, долгие массовые вставки) ловит
+    полное перестроение в фоновом потоке раз в BLOOM_REBUILD_INTERVAL
+    секунд. Снимок фильтра сохраняется в файл, и после перезапуска
+    досканируются только новые строки, а перестроение запускается
+    сразу.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.capacity = 0
+        self.error_rate = 0.01
+        self.rebuild_interval = 0
+        self.snapshot_path = None
+        self.filter = None
+        self.last_timestamp = None
+        self.rebuilt_at = 0
+        self._added = None
+        self._sync_requests = 0
+        self._synced_requests = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.capacity = app.config["BLOOM_FILTER_CAPACITY"]
+        self.error_rate = app.config["BLOOM_FILTER_ERROR_RATE"]
+        self.rebuild_interval = app.config["BLOOM_REBUILD_INTERVAL"]
+        self.snapshot_path = app.config["BLOOM_SNAPSHOT_PATH"]
+        self.filter = None
+        self._added = None
+        if self.enabled and self.snapshot_path:
+            atexit.register(self.save)
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def might_exist(self, short):
+        """False означает, что такого короткого ID в базе точно нет."""
+        if not self.enabled:
+            return True
+        if self.filter is None:
+            self._load()
+        if self._rebuild_due():
+            self._start_rebuild()
+        if short in self.filter:
+            return True
+        self._sync_after_request()
+        return short in self.filter
+
+    def add(self, short):
+        if self.filter is not None:
+            with self._lock:
+                self._add(short)
+
+    def _add(self, short, bloom=None):
+        if bloom is not None:
+            bloom.add(short)
+            return
+        self.filter.add(short)
+        if self._added is not None:
+            # Идет перестроение: ID попадет и в новый фильтр.
+            self._added.append(short)
+
+    def sync(self):
+        """Досканирование строк, добавленных после последнего прохода."""
+        since = None
+        if self.last_timestamp is not None:
+            # Перекрытие ловит строки, закоммиченные позже более новых.
+            since = self.last_timestamp - SYNC_OVERLAP
+        last_timestamp = self._scan(since)
+        with self._lock:
+            self._advance(last_timestamp)
+
+    def _sync_after_request(self):
+        """Досканирование, начатое не раньше этого вызова.
+
+        Потоки, пришедшие во время прохода, ждут и делят следующий
+        проход на всех, так что на любое число одновременных промахов
+        приходится не больше двух проходов.
+        """
+        with self._lock:
+            self._sync_requests += 1
+            request = self._sync_requests
+        with self._sync_lock:
+            if self._synced_requests >= request:
+                return
+            with self._lock:
+                covered = self._sync_requests
+            self.sync()
+            self._synced_requests = covered
+
+    def rebuild(self):
+        """Полный проход по url_map в новый фильтр вместо текущего."""
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        with self._lock:
+            self._added = []
+        try:
+            last_timestamp = self._scan(None, bloom)
+            with self._lock:
+                for short in self._added:
+                    bloom.add(short)
+                self.filter = bloom
+                self._advance(last_timestamp)
+        finally:
+            with self._lock:
+                self._added = None
+            self.rebuilt_at = time.monotonic()
+        self.save()
+
+    def _scan(self, since, bloom=None):
+        """Добавление ID строк с timestamp не раньше since.
+
+        Возвращает наибольший встреченный timestamp.
+        """
+        from .models import URLMap
+
+        rows = URLMap.query.with_entities(URLMap.timestamp, URLMap.short)
+        if since is not None:
+            rows = rows.filter(URLMap.timestamp >= since)
+        last_timestamp = None
+        for timestamp, short in rows.yield_per(SCAN_BATCH_SIZE):
+            with self._lock:
+                self._add(short, bloom)
+            if timestamp and (
+                last_timestamp is None or timestamp > last_timestamp
+            ):
+                last_timestamp = timestamp
+        return last_timestamp
+
+    def _advance(self, timestamp):
+        if timestamp and (
+            self.last_timestamp is None or timestamp > self.last_timestamp
+        ):
+            self.last_timestamp = timestamp
+
+    def _rebuild_due(self):
+        return (
+            self.rebuild_interval > 0
+            and self._added is None
+            and time.monotonic() - self.rebuilt_at >= self.rebuild_interval
+        )
+
+    def _start_rebuild(self):
+        with self._lock:
+            if not self._rebuild_due():
+                return
+            # Отметка до запуска: второй поток не начнет еще один проход.
+            self.rebuilt_at = time.monotonic()
+        threading.Thread(
+            target=self._run_rebuild, name="bloom-rebuild", daemon=True
+        ).start()
+
+    def _run_rebuild(self):
+        with self.app.app_context():
+            try:
+                self.rebuild()
+            except Exception:
+                self.app.logger.exception("Ошибка перестроения фильтра Блума")
+
+    def save(self):
+        """Атомарное сохранение снимка фильтра в файл.
+
+        Временный файл у каждого процесса свой, поэтому воркеры,
+        сохраняющие снимок одновременно, не пишут в один файл.
+        """
+        if self.filter is None or not self.snapshot_path:
+            return
+        directory, name = os.path.split(self.snapshot_path)
+        descriptor, tmp_path = tempfile.mkstemp(
+            prefix=f"{name}.", suffix=".tmp", dir=directory or None
+        )
+        try:
+            with self._lock, os.fdopen(descriptor, "wb") as snapshot:
+                snapshot.write(
+                    SNAPSHOT_HEADER.pack(
+                        self.filter.size,
+                        self.filter.hashes,
+                        int(self.last_timestamp.timestamp() * 1000000)
+                        if self.last_timestamp
+                        else 0,
+                    )
+                )
+                snapshot.write(self.filter.bits)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def _load(self):
+        with self._lock:
+            if self.filter is not None:
+                return
+            bloom = BloomFilter(self.capacity, self.error_rate)
+            self.last_timestamp = None
+            # Без снимка первый проход полный и перестроение не нужно.
+            self.rebuilt_at = time.monotonic()
+            if self.snapshot_path and os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "rb") as snapshot:
+                    size, hashes, last_timestamp = SNAPSHOT_HEADER.unpack(
+                        snapshot.read(SNAPSHOT_HEADER.size)
+                    )
+                    bits = bytearray(snapshot.read())
+                if (size, hashes, len(bits)) == (
+                    bloom.size,
+                    bloom.hashes,
+                    len(bloom.bits),
+                ):
+                    bloom.bits = bits
+                    if last_timestamp:
+                        self.last_timestamp = datetime.fromtimestamp(
+                            last_timestamp / 1000000
+                        )
+                    self.rebuilt_at = float("-inf")
+            self.filter = bloom
+        self.sync()
+        self.save()
+
+
+short_filter = ShortFilter()
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с ограничением размера и временем жизни."""
+
+    def __init__(self, max_size=0, ttl=0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app, prefix="URL_CACHE"):
+        """Настройка кэша из ключей конфигурации <prefix>_SIZE и _TTL."""
+        self.max_size = app.config[f"{prefix}_SIZE"]
+        self.ttl = app.config[f"{prefix}_TTL"]
+        self.clear()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, key):
+        """Значение по ключу или MISSING, если его нет или оно устарело."""
+        if not self.enabled:
+            return MISSING
+        with self._lock:
+            item = self._data.get(key, MISSING)
+            if item is MISSING or item[1] < time.monotonic():
+                if item is not MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl=None):
+        """Сохранение значения. None кэшируется как отсутствие записи.
+
+        ttl переопределяет время жизни для этого значения; при ttl <= 0
+        значение не сохраняется.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if not self.enabled or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Счетчики для подбора размера кэша."""
+        with self._lock:
+            return dict(
+                size=len(self._data),
+                max_size=self.max_size,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+            )
+
+
+url_cache = LRUCache()
+original_cache = LRUCache()
@@ -0,0 +1,171 @@
+import os
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .constants import (
+    ALLOWED_FILES,
+    JOB_PENDING,
+    JOB_WAITING,
+    UPLOAD_COMPLETE,
+    UPLOAD_RECEIVING,
+)
+from .images import image_optimizer
+from .models import ChunkedUpload, UploadChunk, UploadJob
+from .upload_jobs import UPLOAD_EXPIRED, cancel_job, enqueue_job, resume_job
+
+READ_SIZE = 65536
+INVALID_FILENAME = "Недопустимое имя или тип файла"
+INVALID_SIZE = "Размер файла должен быть от 1 до {} байт"
+INVALID_CHUNK = "Недопустимый номер части"
+INVALID_CHUNK_LENGTH = "Длина части {} должна быть {} байт"
+UPLOAD_FINISHED = "Загрузка уже завершена"
+MISSING_CHUNKS = "Не получены части: {}"
+EXPIRE_BATCH_SIZE = 100
+
+
+def create_upload(filename, size):
+    """Новая сессия загрузки по частям с файлом нужного размера.
+
+    Задание на загрузку создается сразу: воркер отправляет файл в
+    хранилище по мере прихода частей. Сжимаемым изображениям нужен весь
+    файл, их задание ждет завершения сессии.
+    """
+    config = current_app.config
+    if (
+        not isinstance(filename, str)
+        or not 0 < len(filename) <= 255
+        or filename.rsplit(".", 1)[-1].lower() not in ALLOWED_FILES
+    ):
+        raise ValueError(INVALID_FILENAME)
+    max_size = config["CHUNKED_UPLOAD_MAX_SIZE"]
+    if not isinstance(size, int) or not 0 < size <= max_size:
+        raise ValueError(INVALID_SIZE.format(max_size))
+    expire_uploads(EXPIRE_BATCH_SIZE)
+    spool_dir = config["UPLOAD_SPOOL_DIR"]
+    os.makedirs(spool_dir, exist_ok=True)
+    upload = ChunkedUpload(
+        filename=filename,
+        size=size,
+        chunk_size=config["CHUNKED_UPLOAD_CHUNK_SIZE"],
+        spool_path="",
+    )
+    db.session.add(upload)
+    db.session.flush()
+    upload.spool_path = os.path.join(spool_dir, f"{upload.id}.part")
+    # Части пишутся по своим смещениям, поэтому могут приходить в любом
+    # порядке, параллельно и повторно.
+    with open(upload.spool_path, "wb") as spool:
+        spool.truncate(size)
+    job = UploadJob(
+        status=(
+            JOB_WAITING if image_optimizer.accepts(filename) else JOB_PENDING
+        )
+    )
+    db.session.add(job)
+    db.session.flush()
+    upload.job_id = job.id
+    enqueue_job(job, [(upload.filename, upload.spool_path)])
+    return upload
+
+
+def write_chunk(upload, index, stream, length):
+    """Запись части из потока запроса без буферизации целиком."""
+    if upload.status != UPLOAD_RECEIVING:
+        raise ValueError(UPLOAD_FINISHED)
+    if not 0 <= index < upload.chunks:
+        raise ValueError(INVALID_CHUNK)
+    expected = upload.chunk_length(index)
+    if length != expected:
+        raise ValueError(INVALID_CHUNK_LENGTH.format(index, expected))
+    written = 0
+    with open(upload.spool_path, "r+b") as spool:
+        spool.seek(index * upload.chunk_size)
+        while written < expected:
+            data = stream.read(min(READ_SIZE, expected - written))
+            if not data:
+                break
+            spool.write(data)
+            written += len(data)
+    if written != expected:
+        # Обрыв соединения: часть не засчитывается и присылается снова.
+        raise ValueError(INVALID_CHUNK_LENGTH.format(index, expected))
+    db.session.add(UploadChunk(upload_id=upload.id, index=index))
+    upload.updated = datetime.utcnow()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Повтор уже принятой части.
+        db.session.rollback()
+
+
+def complete_upload(upload):
+    """Завершение сессии: файл собран из всех частей.
+
+    Идущая потоковая отправка дописывает файл сама, ожидающее задание
+    ставится в очередь.
+    """
+    missing = sorted(set(range(upload.chunks)) - set(upload.received()))
+    if missing:
+        raise ValueError(
+            MISSING_CHUNKS.format(", ".join(map(str, missing[:20])))
+        )
+    # Условный UPDATE не даст завершить сессию дважды.
+    if not ChunkedUpload.query.filter_by(
+        id=upload.id, status=UPLOAD_RECEIVING
+    ).update(dict(status=UPLOAD_COMPLETE), synchronize_session=False):
+        db.session.rollback()
+        raise ValueError(UPLOAD_FINISHED)
+    db.session.commit()
+    resume_job(upload.job_id)
+    db.session.refresh(upload)
+    return db.session.get(UploadJob, upload.job_id)
+
+
+def expire_uploads(limit=None):
+    """Удаление сессий, не получавших частей дольше CHUNKED_UPLOAD_TTL.
+
+    Удаляются временный файл, принятые части и сама сессия, а ее
+    задание отменяется. Удаление сессии условное, по времени изменения:
+    если часть пришла во время чистки, сессия остается. Возвращает
+    число удаленных сессий.
+    """
+    expired = datetime.utcnow() - timedelta(
+        seconds=current_app.config["CHUNKED_UPLOAD_TTL"]
+    )
+    uploads = (
+        ChunkedUpload.query.filter(
+            ChunkedUpload.status == UPLOAD_RECEIVING,
+            ChunkedUpload.updated < expired,
+        )
+        .order_by(ChunkedUpload.updated)
+        .limit(limit)
+        .all()
+    )
+    removed = 0
+    for upload in uploads:
+        UploadChunk.query.filter_by(upload_id=upload.id).delete()
+        if not ChunkedUpload.query.filter_by(
+            id=upload.id, status=UPLOAD_RECEIVING, updated=upload.updated
+        ).delete():
+            db.session.rollback()
+            continue
+        cancel_job(upload.job_id, UPLOAD_EXPIRED)
+        db.session.commit()
+        try:
+            os.remove(upload.spool_path)
+        except FileNotFoundError:
+            pass
+        removed += 1
+    return removed
+
+
+@click.command("expire-uploads")
+@with_appcontext
+def expire_uploads_command():
+    """Удаление брошенных сессий загрузки по частям."""
+    click.echo(f"Удалено сессий: {expire_uploads()}")
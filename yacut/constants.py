@@ -6,8 +6,21 @@ MAX_SHORT_LENGTH = 16
 ORIGINAL_LENGTH = 2048
 SHORT_LENGTH = 6
 GENERATED_SHORT_ATTEMPTS = 100
+BULK_CHUNK_SIZE = 500
+BULK_INSERT_ATTEMPTS = 3
 SHORT_PATTERN = re.compile(f"^[{re.escape(ALLOWED_CHARS)}]+$")
 RESERVED_SHORTS = ["files"]
 ALLOWED_FILES = ["jpg", "jpeg", "png", "gif", "pdf", "txt"]
 MAX_FILE_SIZE = 10 * 1024 * 1024
 REDIRECT_ENPOINT = "main.redirect_to_url"
+DISK_PATH_PREFIX = "disk:"
+LOCAL_PATH_PREFIX = "local:"
+FILE_PATH_PREFIXES = (DISK_PATH_PREFIX, LOCAL_PATH_PREFIX)
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_WAITING = "waiting"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_FINISHED_STATUSES = (JOB_DONE, JOB_FAILED)
+UPLOAD_RECEIVING = "receiving"
+UPLOAD_COMPLETE = "complete"
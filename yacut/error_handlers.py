@@ -4,11 +4,17 @@ from flask import jsonify, render_template, request
 
 from . import db
 
+NOT_FOUND_PAGE = "Страница не найдена"
+SERVER_ERROR = "Ошибка сервера"
+SERVER_ERROR_PAGE = "Внутренняя ошибка сервера"
+
 
 class YandexDiskError(Exception):
     """Кастомное исключение для ошибок Яндекс Диска"""
 
-    pass
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
 
 
 class InvalidAPIUsage(Exception):
@@ -57,7 +63,7 @@ def init_error_handlers(app):  # noqa: C901
             render_template(
                 "error.html",
                 error_code=HTTPStatus.NOT_FOUND,
-                error_message="Страница не найдена",
+                error_message=NOT_FOUND_PAGE,
             ),
             HTTPStatus.NOT_FOUND,
         )
@@ -66,12 +72,12 @@ def init_error_handlers(app):  # noqa: C901
     def intrnal_error(error):
         """Ошибка сервера."""
         if request.path.startswith("/api/"):
-            return jsonify({"message": "Ошибка сервера"})
+            return jsonify({"message": SERVER_ERROR})
         return (
             render_template(
                 "error.html",
                 error_code=HTTPStatus.INTERNAL_SERVER_ERROR,
-                error_message="Внутренняя ошибка сервера",
+                error_message=SERVER_ERROR_PAGE,
             ),
             HTTPStatus.INTERNAL_SERVER_ERROR,
         )
@@ -96,14 +102,14 @@ def init_error_handlers(app):  # noqa: C901
         db.session.rollback()
         if request.path.startswith("/api/"):
             return (
-                jsonify({"message": "Ошибка сервера"}),
+                jsonify({"message": SERVER_ERROR}),
                 HTTPStatus.INTERNAL_SERVER_ERROR,
             )
         return (
             render_template(
                 "error.html",
                 error_code=HTTPStatus.INTERNAL_SERVER_ERROR,
-                error_message="Внутренняя ошибка сервера",
+                error_message=SERVER_ERROR_PAGE,
             ),
             HTTPStatus.INTERNAL_SERVER_ERROR,
         )
@@ -0,0 +1,32 @@
+from flask import current_app
+
+from .models import UploadedFile, URLMap
+from .storage import FileDigest, file_digest, storage
+
+
+def find_uploaded(files):
+    """Хеши файлов и короткие ссылки на уже загруженные копии.
+
+    Хеш считается потоковым чтением файла, а поиск по базе - одним
+    запросом на все файлы.
+    """
+    chunk_size = current_app.config["DISK_UPLOAD_CHUNK_SIZE"]
+    digests = [file_digest(file.stream, chunk_size) for file in files]
+    shorts = UploadedFile.find(digests)
+    return [FileDigest(digest, shorts.get(digest)) for digest in digests]
+
+
+def shorten_upload(result):
+    """Короткая ссылка на загруженный файл: существующая или новая.
+
+    Ссылка ведет на путь файла в хранилище, а не на ссылку для
+    скачивания из result.url.
+    """
+    if result.short:
+        url_map = URLMap.get(result.short)
+        if url_map is not None:
+            return url_map
+    path = storage.path(result.digest, result.filename)
+    url_map = URLMap.create(original=path, is_file=True)
+    UploadedFile.remember(result.digest, path, url_map.short)
+    return url_map
@@ -0,0 +1,173 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .yandex_disk import get_stream_size
+
+OPTIMIZED_FORMATS = ("JPEG", "PNG")
+OPTIMIZED_EXTENSIONS = (".jpg", ".jpeg", ".png")
+OPTIMIZED_LOG = "Сжатие %s: %d -> %d байт за %.3f с"
+OPTIMIZE_ERROR = "Не удалось сжать %s"
+OPTIMIZE_SKIPPED = "Сжатие %s пропущено: файл больше %d байт"
+
+
+def optimize_image(data, quality, max_side):
+    """Пересжатие изображения без метаданных.
+
+    Выполняется в отдельном процессе. Поворот из EXIF применяется к
+    пикселям до удаления метаданных. Возвращает новые байты или None,
+    если это не JPEG/PNG, результат не меньше исходного или в
+    изображении больше Image.MAX_IMAGE_PIXELS пикселей: такие файлы
+    не распаковываются вовсе.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            image = Image.open(BytesIO(data))
+            image_format = image.format
+            if image_format not in OPTIMIZED_FORMATS:
+                return None
+            image = ImageOps.exif_transpose(image)
+    except (
+        UnidentifiedImageError,
+        OSError,
+        Image.DecompressionBombError,
+        Image.DecompressionBombWarning,
+    ):
+        return None
+    if max_side:
+        image.thumbnail((max_side, max_side))
+    output = BytesIO()
+    if image_format == "JPEG":
+        image.convert("RGB").save(
+            output, "JPEG", quality=quality, optimize=True, progressive=True
+        )
+    else:
+        image.save(output, "PNG", optimize=True)
+    optimized = output.getvalue()
+    return optimized if len(optimized) < len(data) else None
+
+
+def pool_context():
+    """Контекст процессов пула без fork.
+
+    Пул создается из потока цикла загрузок, пока другие потоки могут
+    держать блокировки; fork скопировал бы их захваченными.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class ImageOptimizer:
+    """Этап сжатия изображений перед загрузкой на Диск.
+
+    Работа с пикселями идет в пуле процессов, поэтому не держит ни GIL
+    воркера, ни цикл событий загрузок. Файлы больше IMAGE_MAX_BYTES
+    загружаются как есть, не читаясь в память.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.quality = 85
+        self.max_side = 0
+        self.max_bytes = 0
+        self.workers = None
+        self.files = 0
+        self.skipped = 0
+        self.optimized = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.seconds = 0
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config["IMAGE_OPTIMIZE"]
+        self.quality = app.config["IMAGE_QUALITY"]
+        self.max_side = app.config["IMAGE_MAX_SIDE"]
+        self.max_bytes = app.config["IMAGE_MAX_BYTES"]
+        self.workers = app.config["IMAGE_WORKERS"]
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=pool_context()
+                )
+                self._pid = os.getpid()
+                atexit.register(self._executor.shutdown)
+            return self._executor
+
+    def accepts(self, filename):
+        return self.enabled and (filename or "").lower().endswith(
+            OPTIMIZED_EXTENSIONS
+        )
+
+    async def optimize(self, file, logger):
+        """Сжатые байты файла или None; тогда поток файла не сдвигается."""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        start = file.stream.tell()
+        size = get_stream_size(file.stream)
+        if self.max_bytes and size is not None and size > self.max_bytes:
+            return self._skip(file, logger)
+        # Поток без размера читается не дальше предела.
+        limit = self.max_bytes + 1 if self.max_bytes else -1
+        data = await loop.run_in_executor(None, file.stream.read, limit)
+        if self.max_bytes and len(data) > self.max_bytes:
+            file.stream.seek(start)
+            return self._skip(file, logger)
+        try:
+            optimized = await loop.run_in_executor(
+                self._get_executor(),
+                optimize_image,
+                data,
+                self.quality,
+                self.max_side,
+            )
+        except Exception:
+            # Сбой сжатия не мешает загрузить файл как есть.
+            logger.warning(OPTIMIZE_ERROR, file.filename, exc_info=True)
+            optimized = None
+        elapsed = time.monotonic() - started
+        if optimized is None:
+            file.stream.seek(start)
+        size = len(optimized) if optimized is not None else len(data)
+        self.files += 1
+        self.optimized += optimized is not None
+        self.bytes_before += len(data)
+        self.bytes_after += size
+        self.seconds += elapsed
+        logger.info(OPTIMIZED_LOG, file.filename, len(data), size, elapsed)
+        return optimized
+
+    def _skip(self, file, logger):
+        self.skipped += 1
+        logger.info(OPTIMIZE_SKIPPED, file.filename, self.max_bytes)
+        return None
+
+    def stats(self):
+        """Сэкономленные байты и затраченное время."""
+        return dict(
+            enabled=self.enabled,
+            files=self.files,
+            skipped=self.skipped,
+            optimized=self.optimized,
+            bytes_before=self.bytes_before,
+            bytes_after=self.bytes_after,
+            bytes_saved=self.bytes_before - self.bytes_after,
+            seconds=self.seconds,
+        )
+
+
+image_optimizer = ImageOptimizer()
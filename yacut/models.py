@@ -1,19 +1,37 @@
+import hashlib
+import uuid
 from datetime import datetime
-import random
 
-from flask import url_for
+from flask import current_app, url_for
+from sqlalchemy.exc import IntegrityError
 
 from . import db
+from .bloom import short_filter
+from .cache import MISSING, original_cache, url_cache
 from .constants import (
-    ALLOWED_CHARS,
+    BULK_CHUNK_SIZE,
+    BULK_INSERT_ATTEMPTS,
+    FILE_PATH_PREFIXES,
     GENERATED_SHORT_ATTEMPTS,
     MAX_SHORT_LENGTH,
+    JOB_FINISHED_STATUSES,
+    JOB_PENDING,
     ORIGINAL_LENGTH,
-    SHORT_LENGTH,
     SHORT_PATTERN,
     RESERVED_SHORTS,
     REDIRECT_ENPOINT,
+    UPLOAD_RECEIVING,
 )
+from .replicas import replicas
+from .shared_cache import shared_cache
+from .short_ids import (
+    find_free_shorts,
+    random_short,
+    short_keys,
+    short_pool,
+    short_sequence,
+)
+from .write_batcher import write_batcher
 
 INVALID_SHORT_NAME = "Указано недопустимое имя для короткой ссылки"
 SHORT_ALREADY_EXISTS = "Предложенный вариант короткой ссылки уже существует."
@@ -22,51 +40,535 @@ GENERATE_ERROR = (
     f"после {GENERATED_SHORT_ATTEMPTS} попыток"
 )
 ORIGINAL_URL_TOO_LONG = "Слишком длинный URL"
+INVALID_ORIGINAL = "Недопустимая исходная ссылка"
+BULK_INSERT_ERROR = (
+    f"Не удалось сохранить ссылки после {BULK_INSERT_ATTEMPTS} попыток"
+)
 
 
 class URLMap(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(
+        db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True
+    )
     original = db.Column(db.String(ORIGINAL_LENGTH), nullable=False)
     short = db.Column(
         db.String(MAX_SHORT_LENGTH), unique=True, nullable=False, index=True
     )
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    is_file = db.Column(db.Boolean, default=False)
+    # Хеш original только у сгенерированных ссылок: по нему ищутся
+    # повторы, пользовательские ID в поиск не попадают.
+    original_hash = db.Column(db.String(32), index=True)
 
     @staticmethod
-    def create(original, short=None, validate=True):
-        """Создание и сохранение новой записи URLMap."""
-        if validate:
-            if len(original) > ORIGINAL_LENGTH:
-                raise ValueError(ORIGINAL_URL_TOO_LONG)
-            if short:
-                if len(short) > MAX_SHORT_LENGTH:
-                    raise ValueError(INVALID_SHORT_NAME)
-                if not SHORT_PATTERN.fullmatch(short):
-                    raise ValueError(INVALID_SHORT_NAME)
-        if not short:
-            short = URLMap.get_unique_short()
-        if short in RESERVED_SHORTS or URLMap.get(short):
-            raise ValueError(SHORT_ALREADY_EXISTS)
+    def create(original, short=None, validate=True, is_file=False):
+        """Создание и сохранение новой записи URLMap.
 
-        url_map = URLMap(original=original, short=short)
-        db.session.add(url_map)
-        db.session.commit()
+        Для файла (is_file) original - путь в хранилище с одним из
+        FILE_PATH_PREFIXES, ссылка на скачивание получается при переходе.
+        Следующие чтения того же клиента на время идут в основную базу.
+        """
+        url_map = URLMap._create(original, short, validate, is_file)
+        replicas.stick()
         return url_map
 
     @staticmethod
-    def get_unique_short():
-        """Генерация уникального короткого ID"""
+    def _create(original, short, validate, is_file):
+        if validate:
+            URLMap.validate(original, short, is_file)
+        if short in RESERVED_SHORTS:
+            raise ValueError(SHORT_ALREADY_EXISTS)
+        if is_file:
+            return URLMap._insert(original, short, is_file)
+        if not short and current_app.config["URL_DEDUP"]:
+            url_map = URLMap.find_generated(original)
+            if url_map is not None:
+                return url_map
+        if write_batcher.enabled:
+            short, error = write_batcher.submit(original, short)
+            if error:
+                raise ValueError(error)
+            return URLMap(original=original, short=short)
+        return URLMap._insert(original, short)
+
+    @staticmethod
+    def _insert(original, short, is_file=False):
+        """Вставка одной записи.
+
+        Уникальность проверяет индекс по short: при конфликте
+        сгенерированный ID заменяется новым, а пользовательский
+        считается занятым. Нарушения других ограничений не выдаются
+        за занятый ID.
+        """
+        generated = not short
         for attempt in range(GENERATED_SHORT_ATTEMPTS):
-            short = "".join(random.choices(ALLOWED_CHARS, k=SHORT_LENGTH))
-            if short not in RESERVED_SHORTS and not URLMap.get(short):
-                return short
+            if generated:
+                short = URLMap.generate_short()
+            url_map = URLMap(
+                original=original,
+                short=short,
+                is_file=is_file,
+                original_hash=URLMap.hash_original(original)
+                if generated
+                else None,
+            )
+            db.session.add(url_map)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                if not URLMap._short_taken(short):
+                    raise
+                if not generated:
+                    raise ValueError(SHORT_ALREADY_EXISTS)
+                continue
+            url_cache.set(short, original)
+            shared_cache.set(short, original)
+            if generated:
+                original_cache.set(url_map.original_hash, short)
+            return url_map
         raise RuntimeError(GENERATE_ERROR)
 
+    @staticmethod
+    def _short_taken(short):
+        return (
+            db.session.query(URLMap.id).filter_by(short=short).first()
+            is not None
+        )
+
+    @staticmethod
+    def hash_original(original):
+        """Хеш фиксированной длины для индекса по длинной ссылке."""
+        return hashlib.blake2b(original.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def find_generated(original):
+        """Ранее сгенерированная ссылка на тот же original или None.
+
+        Сначала смотрит горячий кэш хеш -> short, затем индекс по
+        original_hash. Совпадение original проверяется явно, поэтому
+        коллизии хеша не страшны. Параллельные создания одного original
+        могут разминуться и получить разные ссылки.
+        """
+        original_hash = URLMap.hash_original(original)
+        short = original_cache.get(original_hash)
+        if short is not MISSING:
+            return URLMap(original=original, short=short)
+        url_map = (
+            URLMap.query.filter_by(
+                original_hash=original_hash, original=original
+            )
+            .order_by(URLMap.timestamp)
+            .first()
+        )
+        if url_map is not None:
+            original_cache.set(original_hash, url_map.short)
+        return url_map
+
+    @staticmethod
+    def validate(original, short=None, is_file=False):
+        """Проверка длинной ссылки и пользовательского варианта короткой."""
+        if len(original) > ORIGINAL_LENGTH:
+            raise ValueError(ORIGINAL_URL_TOO_LONG)
+        if original.startswith(FILE_PATH_PREFIXES) != is_file:
+            raise ValueError(INVALID_ORIGINAL)
+        if short:
+            if len(short) > MAX_SHORT_LENGTH:
+                raise ValueError(INVALID_SHORT_NAME)
+            if not SHORT_PATTERN.fullmatch(short):
+                raise ValueError(INVALID_SHORT_NAME)
+
+    @staticmethod
+    def bulk_create(items, chunk_size=BULK_CHUNK_SIZE):
+        """Массовое создание ссылок в одной транзакции.
+
+        items - список пар (original, short). Для каждой пары возвращает
+        (short, None) при успехе или (None, текст ошибки).
+        """
+        for attempt in range(BULK_INSERT_ATTEMPTS):
+            results, rows = URLMap._prepare_bulk(items, chunk_size)
+            try:
+                for start in range(0, len(rows), chunk_size):
+                    db.session.execute(
+                        db.insert(URLMap), rows[start:start + chunk_size]
+                    )
+                db.session.commit()
+            except IntegrityError:
+                # Пачку опередила параллельная вставка: при повторной
+                # подготовке занятые ID будут видны в проверке.
+                db.session.rollback()
+                continue
+            replicas.stick()
+            for row in rows:
+                short_filter.add(row["short"])
+                url_cache.set(row["short"], row["original"])
+                shared_cache.set(row["short"], row["original"])
+                if row["original_hash"]:
+                    original_cache.set(row["original_hash"], row["short"])
+            return results
+        raise RuntimeError(BULK_INSERT_ERROR)
+
+    @staticmethod
+    def _prepare_bulk(items, chunk_size):
+        """Результаты проверки пачки и строки для вставки."""
+        results = URLMap._check_custom_shorts(items, chunk_size)
+        custom = {short for _, short in items if short}
+        generated = URLMap.get_unique_shorts(
+            URLMap._generated_count(items, results), exclude=custom
+        )
+        return results, URLMap._bulk_rows(items, results, generated)
+
+    @staticmethod
+    def _generated_count(items, results):
+        """Сколько ID нужно сгенерировать для прошедших проверку."""
+        return sum(
+            1
+            for result, (_, short) in zip(results, items)
+            if result is None and not short
+        )
+
+    @staticmethod
+    def _bulk_rows(items, results, generated):
+        """Строки для вставки; дополняет results выданными ID."""
+        generated = iter(generated)
+        rows = []
+        for index, (original, short) in enumerate(items):
+            if results[index] is None:
+                row = dict(
+                    original=original,
+                    short=short or next(generated),
+                    original_hash=None
+                    if short
+                    else URLMap.hash_original(original),
+                )
+                short = row["short"]
+                row["id"] = short_keys.key(short)
+                rows.append(row)
+                results[index] = (short, None)
+        return rows
+
+    @staticmethod
+    def _check_custom_shorts(items, chunk_size):
+        """Ошибки валидации и занятые пользовательские ID для пачки."""
+        results, custom = URLMap._validate_bulk(items)
+        shorts = list(custom)
+        free = set()
+        for start in range(0, len(shorts), chunk_size):
+            free.update(find_free_shorts(shorts[start:start + chunk_size]))
+        URLMap._mark_taken(results, custom, free)
+        return results
+
+    @staticmethod
+    def _validate_bulk(items):
+        """Ошибки валидации пачки и индексы пользовательских ID."""
+        results = [None] * len(items)
+        custom = {}
+        for index, (original, short) in enumerate(items):
+            try:
+                URLMap.validate(original, short)
+                if short and (short in RESERVED_SHORTS or short in custom):
+                    raise ValueError(SHORT_ALREADY_EXISTS)
+            except ValueError as error:
+                results[index] = (None, str(error))
+                continue
+            if short:
+                custom[short] = index
+        return results, custom
+
+    @staticmethod
+    def _mark_taken(results, custom, free):
+        for short in custom.keys() - free:
+            results[custom[short]] = (None, SHORT_ALREADY_EXISTS)
+
+    @staticmethod
+    def get_unique_shorts(count, exclude=()):
+        """Пачка уникальных коротких ID, по запросу к базе на пачку."""
+        if short_sequence.enabled:
+            return [short_sequence.next() for _ in range(count)]
+        shorts = {}
+        failures = 0
+        while len(shorts) < count:
+            candidates = [
+                short
+                for short in (
+                    random_short()
+                    for _ in range(min(count - len(shorts), BULK_CHUNK_SIZE))
+                )
+                if short not in exclude and short not in shorts
+            ]
+            free = find_free_shorts(candidates)
+            if not free:
+                failures += 1
+                if failures >= GENERATED_SHORT_ATTEMPTS:
+                    raise RuntimeError(GENERATE_ERROR)
+            shorts.update(dict.fromkeys(free))
+        return list(shorts)[:count]
+
+    @staticmethod
+    def generate_short():
+        """Короткий ID без проверки по базе: ее заменяет уникальный индекс."""
+        if short_sequence.enabled:
+            return short_sequence.next()
+        return short_pool.pop() or random_short()
+
     @staticmethod
     def get(short):
         """Найти запись по короткой ссылке."""
-        return URLMap.query.filter_by(short=short).first()
+        if not short_filter.might_exist(short):
+            return None
+        key = short_keys.lookup_key(short) if short_keys.enabled else None
+        return replicas.read(
+            lambda bind_arguments: URLMap._get(short, key, bind_arguments)
+        )
+
+    @staticmethod
+    def _get(short, key, bind_arguments):
+        if key is not None:
+            url_map = db.session.get(
+                URLMap, key, bind_arguments=bind_arguments
+            )
+            if url_map is not None and url_map.short == short:
+                return url_map
+        return db.session.scalars(
+            db.select(URLMap).filter_by(short=short).limit(1),
+            bind_arguments=bind_arguments,
+        ).first()
+
+    @staticmethod
+    def get_original(short):
+        """Оригинальная ссылка по короткой, с кэшированием."""
+        original = url_cache.get(short)
+        if original is not MISSING:
+            return original
+        if not short_filter.might_exist(short):
+            # Фильтр может отставать от базы: такой ответ не кэшируется.
+            return None
+        original = shared_cache.get(short)
+        if original is None:
+            url_map = URLMap.get(short)
+            original = url_map.original if url_map else None
+            shared_cache.set(short, original)
+        URLMap._cache_original(short, original)
+        return original
+
+    @staticmethod
+    def _cache_original(short, original):
+        """Кэширование результата поиска в базе.
+
+        Отсутствие ссылки хранится только URL_CACHE_NEGATIVE_TTL секунд и
+        не хранится вовсе, если ответ могла дать отстающая реплика.
+        """
+        if original is not None:
+            url_cache.set(short, original)
+        elif not replicas.may_lag():
+            url_cache.set(
+                short, None, current_app.config["URL_CACHE_NEGATIVE_TTL"]
+            )
+
+    @staticmethod
+    def get_originals(shorts):
+        """Оригинальные ссылки для пачки коротких одним запросом.
+
+        Для отсутствующих коротких ссылок значение None.
+        """
+        originals = {}
+        lookup = []
+        for short in dict.fromkeys(shorts):
+            original = url_cache.get(short)
+            if original is not MISSING:
+                originals[short] = original
+            elif not URLMap.is_valid_short(short) or (
+                not short_filter.might_exist(short)
+            ):
+                originals[short] = None
+            else:
+                lookup.append(short)
+        if lookup:
+            found = dict(
+                replicas.read(
+                    lambda bind_arguments: db.session.execute(
+                        db.select(URLMap.short, URLMap.original).filter(
+                            URLMap.short.in_(lookup)
+                        ),
+                        bind_arguments=bind_arguments,
+                    ).all()
+                )
+            )
+            for short in lookup:
+                originals[short] = found.get(short)
+                URLMap._cache_original(short, originals[short])
+        return originals
+
+    @staticmethod
+    def is_valid_short(short):
+        return (
+            isinstance(short, str)
+            and 0 < len(short) <= MAX_SHORT_LENGTH
+            and SHORT_PATTERN.fullmatch(short) is not None
+        )
 
     def get_short_url(self):
         """Полная кортка ссылка"""
         return url_for(REDIRECT_ENPOINT, short=self.short, _external=True)
+
+
+@db.event.listens_for(URLMap, "before_insert")
+def assign_short_key(mapper, connection, url_map):
+    if url_map.id is None:
+        url_map.id = short_keys.key(url_map.short)
+
+
+@db.event.listens_for(URLMap, "after_insert")
+def add_to_short_filter(mapper, connection, url_map):
+    short_filter.add(url_map.short)
+
+
+class ShortIdSequence(db.Model):
+    """Счетчик для выдачи диапазонов генерируемых ID."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class UploadJob(db.Model):
+    """Задание на фоновую загрузку файлов."""
+
+    id = db.Column(
+        db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex
+    )
+    status = db.Column(
+        db.String(16), nullable=False, default=JOB_PENDING, index=True
+    )
+    created = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+    files = db.relationship(
+        "UploadJobFile", order_by="UploadJobFile.id", lazy="selectin"
+    )
+
+    @property
+    def finished(self):
+        return self.status in JOB_FINISHED_STATUSES
+
+    def to_dict(self):
+        return dict(
+            id=self.id,
+            status=self.status,
+            files=[file.to_dict() for file in self.files],
+        )
+
+
+class UploadJobFile(db.Model):
+    """Файл из задания на загрузку и его прогресс."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(
+        db.String(32), db.ForeignKey("upload_job.id"), nullable=False
+    )
+    filename = db.Column(db.String(255), nullable=False)
+    spool_path = db.Column(db.String(1024), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=JOB_PENDING)
+    short = db.Column(db.String(MAX_SHORT_LENGTH))
+    error = db.Column(db.Text)
+
+    def to_dict(self):
+        return dict(
+            name=self.filename,
+            status=self.status,
+            short_link=url_for(
+                REDIRECT_ENPOINT, short=self.short, _external=True
+            )
+            if self.short
+            else None,
+            error=self.error,
+        )
+
+
+class UploadedFile(db.Model):
+    """Загруженный на Диск файл, адресуемый хешем содержимого."""
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(1024), nullable=False)
+    short = db.Column(db.String(MAX_SHORT_LENGTH), nullable=False)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def find(digests):
+        """Короткие ссылки на уже загруженные файлы по их хешам."""
+        return dict(
+            db.session.query(UploadedFile.sha256, UploadedFile.short)
+            .join(URLMap, URLMap.short == UploadedFile.short)
+            .filter(UploadedFile.sha256.in_(set(digests)))
+            .all()
+        )
+
+    @staticmethod
+    def remember(digest, path, short):
+        """Запоминание загруженного файла; повтор хеша не ошибка."""
+        db.session.add(UploadedFile(sha256=digest, path=path, short=short))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Тот же файл параллельно загрузил другой запрос.
+            db.session.rollback()
+
+
+class ChunkedUpload(db.Model):
+    """Сессия загрузки файла по частям."""
+
+    id = db.Column(
+        db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex
+    )
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    spool_path = db.Column(db.String(1024), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=UPLOAD_RECEIVING)
+    job_id = db.Column(db.String(32), db.ForeignKey("upload_job.id"))
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    updated = db.Column(
+        db.DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        index=True,
+    )
+
+    @property
+    def chunks(self):
+        """Число частей файла."""
+        return max(1, -(-self.size // self.chunk_size))
+
+    def chunk_length(self, index):
+        """Ожидаемая длина части с номером index."""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def received(self):
+        """Номера уже принятых частей."""
+        return [
+            index
+            for index, in db.session.query(UploadChunk.index)
+            .filter_by(upload_id=self.id)
+            .order_by(UploadChunk.index)
+        ]
+
+    def to_dict(self):
+        return dict(
+            id=self.id,
+            filename=self.filename,
+            size=self.size,
+            chunk_size=self.chunk_size,
+            chunks=self.chunks,
+            received=self.received(),
+            status=self.status,
+            job_id=self.job_id,
+        )
+
+
+class UploadChunk(db.Model):
+    """Принятая часть файла из сессии загрузки."""
+
+    upload_id = db.Column(
+        db.String(32), db.ForeignKey("chunked_upload.id"), primary_key=True
+    )
+    index = db.Column(db.Integer, primary_key=True, autoincrement=False)
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from aiohttp import web
+from flask import render_template
+
+from .api_views import NOT_FOUND_ID
+from .error_handlers import NOT_FOUND_PAGE, SERVER_ERROR, SERVER_ERROR_PAGE
+from .redirect_snapshot import redirect_snapshot
+from .replicas import STICKY_KEY, replicas
+from .repository import url_maps
+from .storage import storage
+
+EXECUTOR_KEY = web.AppKey("executor", ThreadPoolExecutor)
+PAGES_KEY = web.AppKey("pages", dict)
+
+
+class RedirectLookup:
+    """Поиск оригинальной ссылки для обработчиков aiohttp.
+
+    Поиск целиком идет в цикле событий: url_cache, а при промахе
+    асинхронный запрос к базе через url_maps, не занимающий поток.
+    Чтение распределяется по репликам; клиенту, недавно создавшему
+    ссылку через Flask, отвечает основная база. Пул потоков нужен
+    только для ссылок на файлы, которые строятся синхронным
+    хранилищем.
+    """
+
+    def __init__(self, flask_app, executor):
+        self.flask_app = flask_app
+        self.executor = executor
+
+    async def original(self, short, primary=False):
+        if redirect_snapshot.enabled:
+            return redirect_snapshot.get(short)
+        return await url_maps.get_original(short, primary)
+
+    def primary(self, request):
+        """Читать ли из основной базы по метке в сессии Flask.
+
+        Сессия подписана SECRET_KEY и приходит сюда той же cookie.
+        """
+        if not replicas.enabled:
+            return False
+        session = self.flask_app.session_interface.open_session(
+            self.flask_app, request
+        )
+        return bool(session) and session.get(STICKY_KEY, 0) > time.time()
+
+    async def resolve(self, original, base_url):
+        """Ссылка для скачивания, если вместо ссылки сохранен файл."""
+        if not storage.is_file_path(original):
+            return original
+        return await self._run(self._resolve_file, original, base_url)
+
+    def _run(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(
+            self.executor, function, *args
+        )
+
+    def _resolve_file(self, path, base_url):
+        # Ссылки на локальные файлы строятся через url_for.
+        with self.flask_app.test_request_context(base_url=base_url):
+            return storage.resolve(path)
+
+
+LOOKUP_KEY = web.AppKey("lookup", RedirectLookup)
+
+
+async def redirect_to_url(request):
+    """Редирект по короткой ссылке."""
+    lookup = request.app[LOOKUP_KEY]
+    original = await lookup.original(
+        request.match_info["short"], lookup.primary(request)
+    )
+    if not original:
+        return error_page(request, HTTPStatus.NOT_FOUND)
+    location = await lookup.resolve(original, str(request.url.origin()))
+    return web.Response(
+        status=HTTPStatus.FOUND, headers={"Location": location}
+    )
+
+
+async def get_original_url(request):
+    """Получение оригинальной ссылки по короткому ID"""
+    lookup = request.app[LOOKUP_KEY]
+    original = await lookup.original(
+        request.match_info["short"], lookup.primary(request)
+    )
+    if not original:
+        return web.json_response(
+            {"message": NOT_FOUND_ID}, status=HTTPStatus.NOT_FOUND
+        )
+    return web.json_response(
+        {"url": await lookup.resolve(original, str(request.url.origin()))}
+    )
+
+
+def error_page(request, status):
+    return web.Response(
+        text=request.app[PAGES_KEY][status],
+        status=status,
+        content_type="text/html",
+    )
+
+
+@web.middleware
+async def handle_errors(request, handler):
+    """Ошибка поиска дает тот же ответ 500, что и во Flask."""
+    try:
+        return await handler(request)
+    except web.HTTPException:
+        raise
+    except Exception:
+        request.app[LOOKUP_KEY].flask_app.logger.exception(
+            "Ошибка запроса %s", request.path
+        )
+        if request.path.startswith("/api/"):
+            return web.json_response(
+                {"message": SERVER_ERROR},
+                status=HTTPStatus.INTERNAL_SERVER_ERROR,
+            )
+        return error_page(request, HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def render_pages(flask_app):
+    """Страницы ошибок рендерятся один раз при запуске."""
+    with flask_app.test_request_context():
+        return {
+            status: render_template(
+                "error.html", error_code=status, error_message=message
+            )
+            for status, message in (
+                (HTTPStatus.NOT_FOUND, NOT_FOUND_PAGE),
+                (HTTPStatus.INTERNAL_SERVER_ERROR, SERVER_ERROR_PAGE),
+            )
+        }
+
+
+def create_redirect_app(flask_app):
+    """Приложение aiohttp только для чтения коротких ссылок.
+
+    Обслуживает GET /<short> и GET /api/id/<short>/ с теми же ответами,
+    что и Flask, и запускается рядом с ним: остальные маршруты
+    балансировщик направляет во Flask.
+    """
+    app = web.Application(middlewares=[handle_errors])
+    executor = ThreadPoolExecutor(
+        flask_app.config["REDIRECT_SERVER_THREADS"],
+        thread_name_prefix="redirect-lookup",
+    )
+    app[EXECUTOR_KEY] = executor
+    app[LOOKUP_KEY] = RedirectLookup(flask_app, executor)
+    app[PAGES_KEY] = render_pages(flask_app)
+
+    async def shutdown(app):
+        app[EXECUTOR_KEY].shutdown(wait=False)
+        await url_maps.dispose()
+
+    app.on_cleanup.append(shutdown)
+    app.router.add_get("/api/id/{short}/", get_original_url)
+    app.router.add_get("/{short}", redirect_to_url)
+    return app
@@ -0,0 +1,186 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from . import db
+from .constants import MAX_SHORT_LENGTH
+
+SNAPSHOT_MAGIC = b"YACUTRS1"
+SNAPSHOT_HEADER = struct.Struct("<8sII")
+SNAPSHOT_OFFSET = struct.Struct("<Q")
+EXPORT_BATCH_SIZE = 10000
+INVALID_SNAPSHOT = "Файл {} не является снимком коротких ссылок"
+SNAPSHOT_PATH_REQUIRED = "Не указан путь к снимку (REDIRECT_SNAPSHOT_PATH)"
+
+
+def write_snapshot(path, rows):
+    """Атомарная запись снимка из пар (short, original).
+
+    Формат: заголовок (сигнатура, ширина ключа, число записей), ключи
+    фиксированной ширины по возрастанию, таблица смещений и блок
+    оригинальных ссылок в UTF-8. Файл пишется рядом и подменяет старый
+    через os.replace, поэтому читатели видят либо старый снимок целиком,
+    либо новый. Временный файл у каждой выгрузки свой, так что
+    пересекающиеся выгрузки не смешиваются, и удаляется при ошибке.
+    """
+    entries = sorted(
+        (short.encode().ljust(MAX_SHORT_LENGTH, b"\0"), original.encode())
+        for short, original in rows
+    )
+    directory, name = os.path.split(path)
+    descriptor, tmp_path = tempfile.mkstemp(
+        prefix=f"{name}.", suffix=".tmp", dir=directory or None
+    )
+    try:
+        with os.fdopen(descriptor, "wb") as snapshot:
+            _write_entries(snapshot, entries)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return len(entries)
+
+
+def _write_entries(snapshot, entries):
+    snapshot.write(
+        SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, MAX_SHORT_LENGTH, len(entries))
+    )
+    for key, _ in entries:
+        snapshot.write(key)
+    offset = 0
+    for _, original in entries:
+        snapshot.write(SNAPSHOT_OFFSET.pack(offset))
+        offset += len(original)
+    snapshot.write(SNAPSHOT_OFFSET.pack(offset))
+    for _, original in entries:
+        snapshot.write(original)
+
+
+class SnapshotFile:
+    """Открытый снимок: бинарный поиск прямо по отображенному файлу.
+
+    Страницы файла общие для всех процессов, открывших его, поэтому
+    снимок почти не занимает памяти воркеров.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as snapshot:
+            self.stat = os.fstat(snapshot.fileno())
+            self.map = mmap.mmap(
+                snapshot.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        magic, self.key_width, self.count = SNAPSHOT_HEADER.unpack_from(
+            self.map
+        )
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(INVALID_SNAPSHOT.format(path))
+        self.keys = SNAPSHOT_HEADER.size
+        self.offsets = self.keys + self.count * self.key_width
+        self.blob = self.offsets + (self.count + 1) * SNAPSHOT_OFFSET.size
+
+    def get(self, short):
+        key = short.encode()
+        if len(key) > self.key_width:
+            return None
+        key = key.ljust(self.key_width, b"\0")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = self.keys + middle * self.key_width
+            if self.map[start:start + self.key_width] < key:
+                low = middle + 1
+            else:
+                high = middle
+        start = self.keys + low * self.key_width
+        if low == self.count or self.map[start:start + self.key_width] != key:
+            return None
+        begin, end = (
+            SNAPSHOT_OFFSET.unpack_from(
+                self.map, self.offsets + index * SNAPSHOT_OFFSET.size
+            )[0]
+            for index in (low, low + 1)
+        )
+        return self.map[self.blob + begin:self.blob + end].decode()
+
+
+class RedirectSnapshot:
+    """Поиск оригинальных ссылок по снимку без обращений к базе.
+
+    Включается REDIRECT_LOOKUP=snapshot. Не чаще раза в
+    REDIRECT_SNAPSHOT_CHECK_INTERVAL секунд сверяется stat файла: после
+    подмены снимка командой export-snapshot открывается новый файл, а
+    старое отображение освобождается вместе с последней ссылкой на него.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.check_interval = 1
+        self.snapshot = None
+        self.checked_at = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config["REDIRECT_LOOKUP"] == "snapshot"
+        self.path = app.config["REDIRECT_SNAPSHOT_PATH"]
+        self.check_interval = app.config["REDIRECT_SNAPSHOT_CHECK_INTERVAL"]
+        self.snapshot = None
+        self.checked_at = 0
+
+    def get(self, short):
+        """Оригинальная ссылка или None, если ее нет в снимке."""
+        return self._current().get(short)
+
+    def _current(self):
+        snapshot = self.snapshot
+        if (
+            snapshot is not None
+            and time.monotonic() - self.checked_at < self.check_interval
+        ):
+            return snapshot
+        with self._lock:
+            stat = os.stat(self.path)
+            if self.snapshot is None or (stat.st_ino, stat.st_mtime_ns) != (
+                self.snapshot.stat.st_ino,
+                self.snapshot.stat.st_mtime_ns,
+            ):
+                self.snapshot = SnapshotFile(self.path)
+            self.checked_at = time.monotonic()
+            return self.snapshot
+
+    def stats(self):
+        snapshot = self.snapshot
+        return dict(
+            enabled=self.enabled,
+            entries=snapshot.count if snapshot is not None else None,
+        )
+
+
+redirect_snapshot = RedirectSnapshot()
+
+
+@click.command("export-snapshot")
+@click.argument("path", required=False)
+@with_appcontext
+def export_snapshot_command(path):
+    """Выгрузка url_map в снимок для поиска без базы."""
+    from .models import URLMap
+
+    path = path or current_app.config["REDIRECT_SNAPSHOT_PATH"]
+    if not path:
+        raise click.UsageError(SNAPSHOT_PATH_REQUIRED)
+    rows = db.session.execute(
+        db.select(URLMap.short, URLMap.original).execution_options(
+            yield_per=EXPORT_BATCH_SIZE
+        )
+    )
+    click.echo(f"Записей в снимке: {write_snapshot(path, rows)}")
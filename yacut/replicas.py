@@ -0,0 +1,149 @@
+import itertools
+import threading
+import time
+
+from flask import g, has_request_context, session
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from . import db
+
+REPLICA_BIND_PREFIX = "replica"
+STICKY_KEY = "primary_until"
+
+
+class ReplicaRouter:
+    """Выбор базы для чтения: реплики по кругу или основная.
+
+    Реплика, на которой запрос упал с OperationalError, выводится из
+    ротации; раз в REPLICA_RETRY_INTERVAL секунд она проверяется
+    запросом SELECT 1 и возвращается, если отвечает. Если здоровых
+    реплик нет, чтение идет в основную базу.
+
+    После записи чтение REPLICA_STICKY_SECONDS секунд идет в основную
+    базу: в пределах контекста приложения и, через сессию Flask, в
+    следующих запросах того же клиента. Поэтому переход по только что
+    созданной ссылке не упирается в отставание реплики.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.sticky_seconds = 0
+        self.retry_interval = 10
+        self.down = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.keys = sorted(
+            key
+            for key in app.config["SQLALCHEMY_BINDS"]
+            if key.startswith(REPLICA_BIND_PREFIX)
+        )
+        self.sticky_seconds = app.config["REPLICA_STICKY_SECONDS"]
+        self.retry_interval = app.config["REPLICA_RETRY_INTERVAL"]
+        self.down = {}
+
+    @property
+    def enabled(self):
+        return bool(self.keys)
+
+    def stick(self):
+        """Чтение из основной базы в ближайшие sticky_seconds секунд."""
+        if not self.enabled or self.sticky_seconds <= 0:
+            return
+        until = time.time() + self.sticky_seconds
+        g.primary_until = until
+        if has_request_context():
+            session[STICKY_KEY] = until
+
+    def is_sticky(self):
+        until = g.get("primary_until", 0)
+        if has_request_context():
+            until = max(until, session.get(STICKY_KEY, 0))
+        return until > time.time()
+
+    def may_lag(self):
+        """Может ли чтение сейчас уйти в реплику."""
+        return self.enabled and not self.is_sticky()
+
+    def choose(self):
+        """Ключ реплики для чтения или None для основной базы."""
+        if not self.enabled or self.is_sticky():
+            return None
+        for _ in range(len(self.keys)):
+            key = self.keys[next(self._counter) % len(self.keys)]
+            if self._healthy(key):
+                return key
+        return None
+
+    def _healthy(self, key):
+        with self._lock:
+            retry_at = self.down.get(key)
+            if retry_at is None:
+                return True
+            if retry_at > time.monotonic():
+                return False
+            # Проверку делает один поток, остальные пока идут мимо.
+            self.down[key] = time.monotonic() + self.retry_interval
+        try:
+            with db.engines[key].connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except OperationalError:
+            return False
+        with self._lock:
+            self.down.pop(key, None)
+        return True
+
+    def candidate(self):
+        """Ключ реплики для асинхронного чтения или None.
+
+        Без проверки SELECT 1: ее роль играет сам запрос. Выведенная из
+        ротации реплика раз в retry_interval отдается одному запросу;
+        по его итогу вызывается mark_up или mark_down.
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.keys)):
+                key = self.keys[next(self._counter) % len(self.keys)]
+                retry_at = self.down.get(key)
+                if retry_at is None:
+                    return key
+                if retry_at <= now:
+                    self.down[key] = now + self.retry_interval
+                    return key
+        return None
+
+    def mark_up(self, key):
+        with self._lock:
+            self.down.pop(key, None)
+
+    def mark_down(self, key):
+        with self._lock:
+            self.down[key] = time.monotonic() + self.retry_interval
+
+    def read(self, query):
+        """Результат query(bind_arguments) с реплики или основной базы.
+
+        При ошибке соединения с репликой запрос повторяется в основной
+        базе.
+        """
+        key = self.choose()
+        if key is None:
+            return query(None)
+        try:
+            return query(dict(bind=db.engines[key]))
+        except OperationalError:
+            db.session.rollback()
+            self.mark_down(key)
+            return query(None)
+
+    def stats(self):
+        with self._lock:
+            down = sorted(self.down)
+        return dict(replicas=self.keys, down=down)
+
+
+replicas = ReplicaRouter()
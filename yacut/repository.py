@@ -0,0 +1,402 @@
+import asyncio
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import make_url
+from flask import has_app_context
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from . import db
+from .bloom import short_filter
+from .cache import MISSING, original_cache, url_cache
+from .constants import (
+    BULK_CHUNK_SIZE,
+    BULK_INSERT_ATTEMPTS,
+    GENERATED_SHORT_ATTEMPTS,
+    RESERVED_SHORTS,
+)
+from .models import (
+    BULK_INSERT_ERROR,
+    GENERATE_ERROR,
+    SHORT_ALREADY_EXISTS,
+    URLMap,
+)
+from .replicas import replicas
+from .short_ids import random_short, short_keys, short_pool, short_sequence
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_database_uri(uri):
+    """URI базы с асинхронным драйвером для того же бэкенда."""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS or url.get_driver_name() in (
+        ASYNC_DRIVERS.values()
+    ):
+        return url.render_as_string(hide_password=False)
+    return url.set(
+        drivername=f"{backend}+{ASYNC_DRIVERS[backend]}"
+    ).render_as_string(hide_password=False)
+
+
+class AsyncURLMapRepository:
+    """Асинхронный доступ к URLMap через расширение asyncio SQLAlchemy.
+
+    Повторяет семантику статических методов URLMap, но запросы не
+    держат поток: много операций идут конкурентно в одном цикле
+    событий. Движок создается при первом запросе в рабочем цикле.
+    Шаги, которым нужна синхронная сессия Flask (выдача диапазонов
+    счетчика ID), выполняются в пуле потоков и нужны раз на диапазон.
+    Общий кэш и фильтр Блума не используются: их Redis-бэкенд и
+    синхронизация блокирующие.
+
+    Чтение по коротким ссылкам распределяется по репликам так же, как
+    в ReplicaRouter.read, через асинхронные движки для их binds. В
+    контексте приложения после записи чтение идет в основную базу;
+    вне его (сервер редиректов) это решает параметр primary.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.uri = None
+        self.engine = None
+        self._sessions = None
+        self._replicas = {}
+
+    def init_app(self, app):
+        self.app = app
+        self.uri = app.config["ASYNC_DATABASE_URI"]
+        if not self.uri:
+            # URL движка Flask-SQLAlchemy: относительный путь SQLite в
+            # нем уже приведен к каталогу instance.
+            with app.app_context():
+                self.uri = async_database_uri(db.engine.url)
+        self.engine = self._sessions = None
+        self._replicas = {}
+
+    def session(self, key=None):
+        """Сессия основной базы или реплики с ключом bind key."""
+        if key is not None:
+            return self._replica_sessions(key)[1]()
+        if self._sessions is None:
+            self.engine = create_async_engine(self.uri)
+            self._sessions = async_sessionmaker(
+                self.engine, expire_on_commit=False
+            )
+        return self._sessions()
+
+    def _replica_sessions(self, key):
+        if key not in self._replicas:
+            with self.app.app_context():
+                uri = async_database_uri(db.engines[key].url)
+            engine = create_async_engine(uri)
+            self._replicas[key] = (
+                engine,
+                async_sessionmaker(engine, expire_on_commit=False),
+            )
+        return self._replicas[key]
+
+    async def dispose(self):
+        """Закрытие соединений движков перед остановкой цикла событий."""
+        if self.engine is not None:
+            await self.engine.dispose()
+        for engine, _ in self._replicas.values():
+            await engine.dispose()
+        self.engine = self._sessions = None
+        self._replicas = {}
+
+    async def _read(self, query, primary):
+        """Результат query(session) с реплики или основной базы.
+
+        При ошибке соединения реплика выводится из ротации, а запрос
+        повторяется в основной базе.
+        """
+        key = None if primary else replicas.candidate()
+        if key is not None:
+            try:
+                async with self.session(key) as session:
+                    result = await query(session)
+            except OperationalError:
+                replicas.mark_down(key)
+            else:
+                replicas.mark_up(key)
+                return result
+        async with self.session() as session:
+            return await query(session)
+
+    @staticmethod
+    def _primary(primary):
+        if primary is None:
+            return has_app_context() and replicas.is_sticky()
+        return primary
+
+    async def _run_sync(self, function, *args):
+        def call():
+            with self.app.app_context():
+                return function(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    async def get(self, short, primary=None):
+        """Найти запись по короткой ссылке."""
+        return await self._read(
+            lambda session: self._get(session, short), self._primary(primary)
+        )
+
+    @staticmethod
+    async def _get(session, short):
+        key = short_keys.lookup_key(short) if short_keys.enabled else None
+        if key is not None:
+            url_map = await session.get(URLMap, key)
+            if url_map is not None and url_map.short == short:
+                return url_map
+        return await session.scalar(
+            select(URLMap).where(URLMap.short == short).limit(1)
+        )
+
+    async def get_original(self, short, primary=None):
+        """Оригинальная ссылка по короткой, с кэшированием."""
+        original = url_cache.get(short)
+        if original is not MISSING:
+            return original
+        primary = self._primary(primary)
+        url_map = await self.get(short, primary)
+        original = url_map.original if url_map else None
+        self._cache_original(short, original, primary)
+        return original
+
+    def _cache_original(self, short, original, primary):
+        if original is not None:
+            url_cache.set(short, original)
+        elif primary or not replicas.enabled:
+            # Промах на реплике может быть отставанием: не кэшируется.
+            url_cache.set(
+                short, None, self.app.config["URL_CACHE_NEGATIVE_TTL"]
+            )
+
+    async def get_originals(self, shorts, primary=None):
+        """Оригинальные ссылки для пачки коротких одним запросом.
+
+        Для отсутствующих коротких ссылок значение None.
+        """
+        primary = self._primary(primary)
+        originals = {}
+        lookup = []
+        for short in dict.fromkeys(shorts):
+            original = url_cache.get(short)
+            if original is not MISSING:
+                originals[short] = original
+            elif not URLMap.is_valid_short(short):
+                originals[short] = None
+            else:
+                lookup.append(short)
+        if lookup:
+            found = await self._read(
+                lambda session: self._find_originals(session, lookup),
+                primary,
+            )
+            for short in lookup:
+                originals[short] = found.get(short)
+                self._cache_original(short, originals[short], primary)
+        return originals
+
+    @staticmethod
+    async def _find_originals(session, shorts):
+        return dict(
+            (
+                await session.execute(
+                    select(URLMap.short, URLMap.original).where(
+                        URLMap.short.in_(shorts)
+                    )
+                )
+            ).all()
+        )
+
+    async def create(self, original, short=None, validate=True):
+        """Создание и сохранение новой записи URLMap.
+
+        Пишет сразу в базу, минуя write_batcher: конкурентные вставки
+        и так не занимают потоки.
+        """
+        if validate:
+            URLMap.validate(original, short)
+        if short in RESERVED_SHORTS:
+            raise ValueError(SHORT_ALREADY_EXISTS)
+        if not short and self.app.config["URL_DEDUP"]:
+            url_map = await self.find_generated(original)
+            if url_map is not None:
+                return url_map
+        url_map = await self._insert(original, short)
+        self._stick()
+        return url_map
+
+    @staticmethod
+    def _stick():
+        # Вне контекста приложения (сервер редиректов) липкости нет.
+        if has_app_context():
+            replicas.stick()
+
+    async def _insert(self, original, short):
+        """Вставка одной записи с заменой занятого сгенерированного ID."""
+        generated = not short
+        for attempt in range(GENERATED_SHORT_ATTEMPTS):
+            if generated:
+                short = await self.generate_short()
+            url_map = URLMap(
+                original=original,
+                short=short,
+                original_hash=URLMap.hash_original(original)
+                if generated
+                else None,
+            )
+            url_map.id = await self._key(short)
+            async with self.session() as session:
+                session.add(url_map)
+                try:
+                    await session.commit()
+                except IntegrityError:
+                    await session.rollback()
+                    if not await self._short_taken(session, short):
+                        raise
+                    if not generated:
+                        raise ValueError(SHORT_ALREADY_EXISTS)
+                    continue
+            url_cache.set(short, original)
+            if generated:
+                original_cache.set(url_map.original_hash, short)
+            return url_map
+        raise RuntimeError(GENERATE_ERROR)
+
+    @staticmethod
+    async def _short_taken(session, short):
+        return (
+            await session.scalar(
+                select(URLMap.id).where(URLMap.short == short).limit(1)
+            )
+            is not None
+        )
+
+    async def find_generated(self, original):
+        """Ранее сгенерированная ссылка на тот же original или None."""
+        original_hash = URLMap.hash_original(original)
+        short = original_cache.get(original_hash)
+        if short is not MISSING:
+            return URLMap(original=original, short=short)
+        async with self.session() as session:
+            url_map = await session.scalar(
+                select(URLMap)
+                .where(
+                    URLMap.original_hash == original_hash,
+                    URLMap.original == original,
+                )
+                .order_by(URLMap.timestamp)
+                .limit(1)
+            )
+        if url_map is not None:
+            original_cache.set(original_hash, url_map.short)
+        return url_map
+
+    async def generate_short(self):
+        """Короткий ID без проверки по базе: ее заменяет уникальный индекс."""
+        if short_sequence.enabled:
+            return await self._run_sync(short_sequence.next)
+        return short_pool.pop() or random_short()
+
+    async def _key(self, short):
+        key = short_keys.lookup_key(short)
+        if key is None:
+            key = await self._run_sync(short_keys.key, short)
+        return key
+
+    async def bulk_create(self, items, chunk_size=BULK_CHUNK_SIZE):
+        """Массовое создание ссылок в одной транзакции.
+
+        items - список пар (original, short). Для каждой пары возвращает
+        (short, None) при успехе или (None, текст ошибки).
+        """
+        for attempt in range(BULK_INSERT_ATTEMPTS):
+            async with self.session() as session:
+                results, rows = await self._prepare_bulk(
+                    session, items, chunk_size
+                )
+                try:
+                    for start in range(0, len(rows), chunk_size):
+                        await session.execute(
+                            insert(URLMap), rows[start:start + chunk_size]
+                        )
+                    await session.commit()
+                except IntegrityError:
+                    await session.rollback()
+                    continue
+            for row in rows:
+                short_filter.add(row["short"])
+                url_cache.set(row["short"], row["original"])
+                if row["original_hash"]:
+                    original_cache.set(row["original_hash"], row["short"])
+            self._stick()
+            return results
+        raise RuntimeError(BULK_INSERT_ERROR)
+
+    async def _prepare_bulk(self, session, items, chunk_size):
+        """Результаты проверки пачки и строки для вставки."""
+        results, custom = URLMap._validate_bulk(items)
+        shorts = list(custom)
+        free = set()
+        for start in range(0, len(shorts), chunk_size):
+            free.update(
+                await self._find_free_shorts(
+                    session, shorts[start:start + chunk_size]
+                )
+            )
+        URLMap._mark_taken(results, custom, free)
+        generated = await self._unique_shorts(
+            session, URLMap._generated_count(items, results), set(custom)
+        )
+        # Ключи пользовательских ID берутся из счетчика в базе.
+        rows = await self._run_sync(
+            URLMap._bulk_rows, items, results, generated
+        )
+        return results, rows
+
+    async def _unique_shorts(self, session, count, exclude):
+        """Пачка уникальных коротких ID, по запросу к базе на пачку."""
+        if short_sequence.enabled:
+            return await self._run_sync(
+                lambda: [short_sequence.next() for _ in range(count)]
+            )
+        shorts = {}
+        failures = 0
+        while len(shorts) < count:
+            candidates = [
+                short
+                for short in (
+                    random_short()
+                    for _ in range(min(count - len(shorts), BULK_CHUNK_SIZE))
+                )
+                if short not in exclude and short not in shorts
+            ]
+            free = await self._find_free_shorts(session, candidates)
+            if not free:
+                failures += 1
+                if failures >= GENERATED_SHORT_ATTEMPTS:
+                    raise RuntimeError(GENERATE_ERROR)
+            shorts.update(dict.fromkeys(free))
+        return list(shorts)[:count]
+
+    @staticmethod
+    async def _find_free_shorts(session, candidates):
+        """Отбор незанятых ID из кандидатов одним запросом к базе."""
+        taken = set(
+            await session.scalars(
+                select(URLMap.short).where(URLMap.short.in_(candidates))
+            )
+        )
+        return [
+            short
+            for short in dict.fromkeys(candidates)
+            if short not in taken and short not in RESERVED_SHORTS
+        ]
+
+
+url_maps = AsyncURLMapRepository()
@@ -0,0 +1,278 @@
+import hashlib
+import os
+import socket
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from urllib.parse import urlparse
+
+from .constants import MAX_SHORT_LENGTH
+
+TABLE_MAGIC = b"YACUTSM1"
+TABLE_HEADER = struct.Struct("<8sII")
+SLOT_HEADER = struct.Struct("<IBxH")
+MAX_PROBES = 8
+READ_RETRIES = 4
+REDIS_KEY_PREFIX = "yacut:url:"
+REDIS_TIMEOUT = 0.5
+
+
+class SharedMemoryTable:
+    """Хеш-таблица с открытой адресацией в разделяемой памяти.
+
+    Слоты фиксированного размера: заголовок (версия, длины ключа и
+    значения), ключ и значение. Читатели не берут блокировок: запись
+    делает версию слота нечетной на время изменения (seqlock), и
+    читатель повторяет чтение, если версия изменилась. Писатели
+    разных процессов сериализуются файловой блокировкой. Значения не
+    меняются после записи, поэтому удаление не нужно: при заполнении
+    окна проб перезаписывается первый слот окна.
+
+    В начале сегмента записана его геометрия (число и размер слотов).
+    Сегмент, оставшийся от запуска с другими настройками, удаляется и
+    создается заново.
+    """
+
+    def __init__(self, name, slots, slot_size):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_value_size = slot_size - SLOT_HEADER.size - MAX_SHORT_LENGTH
+        self.lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        with self._writer_lock():
+            self.memory = self._open(name)
+        # Сегмент переживает перезапуск воркеров и удаляется явно.
+        resource_tracker.unregister(self.memory._name, "shared_memory")
+        self.buffer = self.memory.buf
+
+    def _open(self, name):
+        header = TABLE_HEADER.pack(TABLE_MAGIC, self.slots, self.slot_size)
+        size = TABLE_HEADER.size + self.slots * self.slot_size
+        try:
+            memory = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            memory = None
+        if memory is not None:
+            if (
+                memory.size >= size
+                and bytes(memory.buf[:TABLE_HEADER.size]) == header
+            ):
+                return memory
+            memory.close()
+            memory.unlink()
+        memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        memory.buf[:TABLE_HEADER.size] = header
+        return memory
+
+    def _probe(self, key):
+        start = int.from_bytes(
+            hashlib.blake2b(key, digest_size=8).digest(), "big"
+        )
+        for step in range(min(MAX_PROBES, self.slots)):
+            yield TABLE_HEADER.size + (
+                (start + step) % self.slots * self.slot_size
+            )
+
+    def _read(self, offset):
+        for _ in range(READ_RETRIES):
+            version, key_size, value_size = SLOT_HEADER.unpack_from(
+                self.buffer, offset
+            )
+            if version & 1:
+                continue
+            key_offset = offset + SLOT_HEADER.size
+            value_offset = key_offset + MAX_SHORT_LENGTH
+            key = bytes(self.buffer[key_offset:key_offset + key_size])
+            value = bytes(
+                self.buffer[
+                    value_offset:value_offset
+                    + min(value_size, self.max_value_size)
+                ]
+            )
+            if SLOT_HEADER.unpack_from(self.buffer, offset)[0] == version:
+                return key, value
+        return None, None
+
+    def get(self, short):
+        key = short.encode()
+        for offset in self._probe(key):
+            stored_key, value = self._read(offset)
+            if not stored_key:
+                return None
+            if stored_key == key:
+                return value.decode()
+        return None
+
+    def set(self, short, original):
+        key, value = short.encode(), original.encode()
+        if len(key) > MAX_SHORT_LENGTH or len(value) > self.max_value_size:
+            return
+        with self._writer_lock():
+            offsets = list(self._probe(key))
+            target = offsets[0]
+            for offset in offsets:
+                _, key_size, _ = SLOT_HEADER.unpack_from(self.buffer, offset)
+                key_offset = offset + SLOT_HEADER.size
+                if not key_size or (
+                    bytes(self.buffer[key_offset:key_offset + key_size])
+                    == key
+                ):
+                    target = offset
+                    break
+            version = SLOT_HEADER.unpack_from(self.buffer, target)[0]
+            SLOT_HEADER.pack_into(
+                self.buffer, target, (version + 1) & 0xFFFFFFFF, 0, 0
+            )
+            key_offset = target + SLOT_HEADER.size
+            value_offset = key_offset + MAX_SHORT_LENGTH
+            self.buffer[key_offset:key_offset + len(key)] = key
+            self.buffer[value_offset:value_offset + len(value)] = value
+            SLOT_HEADER.pack_into(
+                self.buffer,
+                target,
+                (version + 2) & 0xFFFFFFFF,
+                len(key),
+                len(value),
+            )
+
+    @contextmanager
+    def _writer_lock(self):
+        import fcntl
+
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        self.buffer = None
+        self.memory.close()
+
+    def unlink(self):
+        self.close()
+        self.memory.unlink()
+
+
+class RedisError(Exception):
+    """Ошибка ответа Redis-совместимого сервера."""
+
+
+class RedisBackend:
+    """Клиент Redis-протокола (RESP) для общего кэша нескольких хостов."""
+
+    def __init__(self, url, ttl):
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or "localhost", parsed.port or 6379)
+        self.database = int(parsed.path.lstrip("/") or 0)
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            sock = socket.create_connection(self.address, REDIS_TIMEOUT)
+            connection = self._local.connection = (sock, sock.makefile("rb"))
+            if self.database:
+                self._command("SELECT", self.database)
+        return connection
+
+    def _command(self, *args):
+        sock, reader = self._connection()
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        try:
+            sock.sendall(b"".join(parts))
+            return self._reply(reader)
+        except OSError:
+            self._local.connection = None
+            sock.close()
+            raise
+
+    def _reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            size = int(payload)
+            return None if size < 0 else reader.read(size + 2)[:-2]
+        if kind == b"*":
+            size = int(payload)
+            return (
+                None
+                if size < 0
+                else [self._reply(reader) for _ in range(size)]
+            )
+        raise RedisError(line.decode(errors="replace"))
+
+    def get(self, short):
+        value = self._command("GET", REDIS_KEY_PREFIX + short)
+        return value.decode() if value is not None else None
+
+    def set(self, short, original):
+        self._command(
+            "SET", REDIS_KEY_PREFIX + short, original, "EX", self.ttl
+        )
+
+
+BACKEND_ERRORS = (OSError, RedisError, struct.error, ValueError)
+
+
+class SharedCache:
+    """Общий для воркеров уровень кэша коротких ссылок.
+
+    Хранит только найденные ссылки. Ошибки бэкенда, в том числе
+    разбора поврежденных данных, не ломают поиск: запрос просто уходит
+    в базу.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        backend = app.config["SHARED_CACHE_BACKEND"]
+        if backend == "shm":
+            self.backend = SharedMemoryTable(
+                app.config["SHARED_CACHE_NAME"],
+                app.config["SHARED_CACHE_SLOTS"],
+                app.config["SHARED_CACHE_SLOT_SIZE"],
+            )
+        elif backend == "redis":
+            self.backend = RedisBackend(
+                app.config["SHARED_CACHE_URL"], app.config["URL_CACHE_TTL"]
+            )
+        else:
+            self.backend = None
+
+    def get(self, short):
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.get(short)
+        except BACKEND_ERRORS:
+            self.app.logger.warning("Общий кэш недоступен", exc_info=True)
+            return None
+
+    def set(self, short, original):
+        if self.backend is None or original is None:
+            return
+        try:
+            self.backend.set(short, original)
+        except BACKEND_ERRORS:
+            self.app.logger.warning("Общий кэш недоступен", exc_info=True)
+
+
+shared_cache = SharedCache()
@@ -0,0 +1,292 @@
+import hashlib
+import os
+import random
+import threading
+from collections import deque
+
+from sqlalchemy import select
+
+from . import db
+from .constants import (
+    ALLOWED_CHARS,
+    RESERVED_SHORTS,
+    SHORT_LENGTH,
+    SHORT_PATTERN,
+)
+
+SHORT_SPACE = len(ALLOWED_CHARS) ** SHORT_LENGTH
+FEISTEL_HALF_BITS = (SHORT_SPACE.bit_length() + 1) // 2
+FEISTEL_MASK = (1 << FEISTEL_HALF_BITS) - 1
+FEISTEL_ROUNDS = 4
+SEQUENCE_COUNTER = 1
+CUSTOM_KEYS_COUNTER = 2
+SEQUENCE_EXHAUSTED = "Пространство коротких ID исчерпано"
+
+
+def random_short():
+    """Случайный короткий ID."""
+    return "".join(random.choices(ALLOWED_CHARS, k=SHORT_LENGTH))
+
+
+def encode_base62(number, length=SHORT_LENGTH):
+    """Число в строку из ALLOWED_CHARS фиксированной длины."""
+    chars = []
+    for _ in range(length):
+        number, index = divmod(number, len(ALLOWED_CHARS))
+        chars.append(ALLOWED_CHARS[index])
+    return "".join(reversed(chars))
+
+
+def decode_base62(short):
+    """Строка из ALLOWED_CHARS в число."""
+    number = 0
+    for char in short:
+        number = number * len(ALLOWED_CHARS) + ALLOWED_CHARS.index(char)
+    return number
+
+
+def _feistel_round(key, round_number, value):
+    digest = hashlib.blake2b(
+        value.to_bytes(8, "big"),
+        key=key,
+        digest_size=8,
+        person=round_number.to_bytes(16, "big"),
+    ).digest()
+    return int.from_bytes(digest, "big") & FEISTEL_MASK
+
+
+def permute(number, key):
+    """Обратимая перестановка чисел [0, SHORT_SPACE) на ключе.
+
+    Сеть Фейстеля работает на 2 * FEISTEL_HALF_BITS битах, а выход
+    за пределы SHORT_SPACE обходится повторным применением (cycle walking),
+    так что результат остается биекцией на пространстве коротких ID.
+    """
+    while True:
+        left, right = number >> FEISTEL_HALF_BITS, number & FEISTEL_MASK
+        for round_number in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ _feistel_round(
+                key, round_number, right
+            )
+        number = (left << FEISTEL_HALF_BITS) | right
+        if number < SHORT_SPACE:
+            return number
+
+
+def find_free_shorts(candidates):
+    """Отбор незанятых ID из кандидатов одним запросом к базе."""
+    from .models import URLMap
+
+    taken = {
+        short
+        for short, in URLMap.query.with_entities(URLMap.short).filter(
+            URLMap.short.in_(candidates)
+        )
+    }
+    return [
+        short
+        for short in dict.fromkeys(candidates)
+        if short not in taken and short not in RESERVED_SHORTS
+    ]
+
+
+class ShortPool:
+    """Пул заранее проверенных свободных коротких ID.
+
+    Пополняется фоновым потоком пачками: на пачку кандидатов приходится
+    один запрос к базе, а выдача ID из пула обходится без запросов.
+    """
+
+    def __init__(self, size=0, batch_size=100):
+        self.size = size
+        self.batch_size = batch_size
+        self.app = None
+        self._shorts = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.size = app.config["SHORT_POOL_SIZE"]
+        self.batch_size = app.config["SHORT_POOL_BATCH"]
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def __len__(self):
+        return len(self._shorts)
+
+    def pop(self):
+        """Свободный ID из пула или None, если пул пуст."""
+        if not self.enabled:
+            return None
+        self._start()
+        with self._lock:
+            short = self._shorts.popleft() if self._shorts else None
+        if len(self._shorts) < self.size // 2:
+            self._wakeup.set()
+        return short
+
+    def refill(self):
+        """Пополнение пула до заданного размера."""
+        while len(self._shorts) < self.size:
+            with self._lock:
+                pooled = set(self._shorts)
+            free = [
+                short
+                for short in find_free_shorts(
+                    [random_short() for _ in range(self.batch_size)]
+                )
+                if short not in pooled
+            ]
+            with self._lock:
+                self._shorts.extend(free[: self.size - len(self._shorts)])
+
+    def clear(self):
+        with self._lock:
+            self._shorts.clear()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="short-pool", daemon=True
+                )
+                self._thread.start()
+                self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    self.refill()
+                except Exception:
+                    self.app.logger.exception("Ошибка пополнения пула ID")
+
+
+short_pool = ShortPool()
+
+
+class IdLease:
+    """Выдача значений счетчика из short_id_sequence диапазонами (hi/lo).
+
+    Запрос к базе нужен один раз на size значений; после fork процесс
+    берет собственный диапазон.
+    """
+
+    def __init__(self, counter, start=0, size=1000):
+        self.counter = counter
+        self.start = start
+        self.size = size
+        self._next = self._stop = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._next = self._stop = 0
+
+    def next(self):
+        with self._lock:
+            if self._next >= self._stop or self._pid != os.getpid():
+                self._next, self._stop = self._lease()
+                self._pid = os.getpid()
+            number = self._next
+            self._next += 1
+        return number
+
+    def _lease(self):
+        from .models import ShortIdSequence
+
+        table = ShortIdSequence.__table__
+        with db.engine.begin() as connection:
+            if not connection.execute(
+                table.update()
+                .where(table.c.id == self.counter)
+                .values(next_value=table.c.next_value + self.size)
+            ).rowcount:
+                connection.execute(
+                    table.insert().values(
+                        id=self.counter, next_value=self.start + self.size
+                    )
+                )
+            stop = connection.execute(
+                select(table.c.next_value).where(table.c.id == self.counter)
+            ).scalar_one()
+        return stop - self.size, stop
+
+
+class ShortSequence:
+    """Генерация ID из монотонного счетчика через ключевую перестановку.
+
+    Уникальность гарантируется построением, поэтому проверка по базе не
+    нужна. Счетчик выдается процессам диапазонами из таблицы
+    short_id_sequence: запрос к базе нужен один раз на lease_size ID.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.key = b""
+        self.lease = IdLease(SEQUENCE_COUNTER)
+
+    def init_app(self, app):
+        self.enabled = app.config["SHORT_ID_MODE"] == "sequence"
+        self.lease.size = app.config["SHORT_ID_LEASE_SIZE"]
+        self.lease.reset()
+        self.key = hashlib.sha256(app.config["SECRET_KEY"].encode()).digest()
+
+    def next(self):
+        """Следующий короткий ID."""
+        while True:
+            number = self.lease.next()
+            if number >= SHORT_SPACE:
+                raise RuntimeError(SEQUENCE_EXHAUSTED)
+            short = encode_base62(permute(number, self.key))
+            if short not in RESERVED_SHORTS:
+                return short
+
+
+short_sequence = ShortSequence()
+
+
+class ShortKeys:
+    """Целочисленные первичные ключи url_map из коротких ID.
+
+    ID длины SHORT_LENGTH (все сгенерированные и совпадающие с ними по
+    форме пользовательские) хранятся под ключом, равным их значению в
+    base62. Остальные пользовательские ID получают ключи из отдельного
+    диапазона от SHORT_SPACE. Ключи назначаются всегда, а не только при
+    SHORT_INTEGER_KEYS: иначе автоинкремент базы пересекался бы с обоими
+    диапазонами при смене режима. Флаг включает только поиск по
+    первичному ключу.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.custom = IdLease(CUSTOM_KEYS_COUNTER, start=SHORT_SPACE)
+
+    def init_app(self, app):
+        self.enabled = app.config["SHORT_INTEGER_KEYS"]
+        self.custom.size = app.config["SHORT_ID_LEASE_SIZE"]
+        self.custom.reset()
+
+    @staticmethod
+    def lookup_key(short):
+        """Первичный ключ для ID длины SHORT_LENGTH, иначе None."""
+        if len(short) == SHORT_LENGTH and SHORT_PATTERN.fullmatch(short):
+            return decode_base62(short)
+        return None
+
+    def key(self, short):
+        """Первичный ключ для новой записи."""
+        key = self.lookup_key(short)
+        return self.custom.next() if key is None else key
+
+
+short_keys = ShortKeys()
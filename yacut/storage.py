@@ -0,0 +1,288 @@
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from collections import namedtuple
+from io import BytesIO
+
+from flask import current_app, url_for
+from werkzeug.datastructures import FileStorage
+
+from .constants import FILE_PATH_PREFIXES, LOCAL_PATH_PREFIX
+from .error_handlers import YandexDiskError
+from .images import image_optimizer
+from .yandex_disk import (
+    UPLOAD_ERROR,
+    YandexDiskStorage,
+    disk_client,
+    in_app_context,
+)
+
+FILE_EXTENSION = re.compile(r"\.[A-Za-z0-9]{1,16}$")
+LOCAL_FILE_NAME = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]{1,16})?$")
+UNKNOWN_STORAGE = "Неизвестное хранилище файлов: {}"
+
+UploadResult = namedtuple(
+    "UploadResult", "filename url error digest short", defaults=(None, None)
+)
+FileDigest = namedtuple("FileDigest", "digest short")
+
+
+def file_digest(stream, chunk_size):
+    """SHA-256 непрочитанной части потока с возвратом позиции."""
+    start = stream.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(start)
+    return digest.hexdigest()
+
+
+def content_name(digest, filename):
+    """Имя файла в хранилище, определяемое его содержимым.
+
+    Разные файлы с одинаковым именем не перезаписывают друг друга, а
+    одинаковые ложатся в одно место.
+    """
+    extension = FILE_EXTENSION.search(filename or "")
+    return f"{digest}{extension.group().lower() if extension else ''}"
+
+
+class LocalStorage:
+    """Хранилище файлов в локальном или сетевом (NFS) каталоге.
+
+    Файлы отдает маршрут main.download_file: без обращений к внешнему
+    API, с поддержкой Range и строгим ETag из хеша содержимого.
+    """
+
+    name = "local"
+    prefix = LOCAL_PATH_PREFIX
+
+    def __init__(self):
+        self.root = None
+        self.chunk_size = 65536
+
+    def init_app(self, app):
+        self.root = app.config["STORAGE_LOCAL_ROOT"]
+        self.chunk_size = app.config["DISK_UPLOAD_CHUNK_SIZE"]
+
+    def path(self, name):
+        return f"{self.prefix}{name}"
+
+    async def upload(self, file, path):
+        """Запись файла в каталог; возвращает путь."""
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._write, file.stream, path[len(self.prefix):]
+        )
+        return path
+
+    def _write(self, stream, name):
+        target = os.path.join(self.root, name)
+        if os.path.exists(target):
+            # Имя задается содержимым: такой файл уже записан.
+            return
+        os.makedirs(self.root, exist_ok=True)
+        descriptor, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".")
+        try:
+            with os.fdopen(descriptor, "wb") as output:
+                shutil.copyfileobj(stream, output, self.chunk_size)
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    async def upload_stream(self, chunks, path, size):
+        """Запись кусков по мере их поступления."""
+        loop = asyncio.get_running_loop()
+        os.makedirs(self.root, exist_ok=True)
+        descriptor, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".")
+        try:
+            with os.fdopen(descriptor, "wb") as output:
+                async for chunk in chunks:
+                    await loop.run_in_executor(None, output.write, chunk)
+            os.replace(tmp_path, os.path.join(self.root, self._name(path)))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    async def move(self, source, path):
+        os.replace(
+            os.path.join(self.root, self._name(source)),
+            os.path.join(self.root, self._name(path)),
+        )
+
+    async def remove(self, path):
+        try:
+            os.remove(os.path.join(self.root, self._name(path)))
+        except FileNotFoundError:
+            pass
+
+    def _name(self, path):
+        return path[len(self.prefix):]
+
+    def resolve_many(self, paths):
+        return {
+            path: url_for(
+                "main.download_file",
+                name=path[len(self.prefix):],
+                _external=True,
+            )
+            for path in paths
+        }
+
+
+class Storage:
+    """Выбор хранилища для новых файлов и разбор путей старых.
+
+    Новые файлы пишутся в STORAGE_BACKEND, а ссылки на файлы из любого
+    хранилища продолжают работать по префиксу сохраненного пути.
+    """
+
+    def __init__(self):
+        self.backends = {
+            backend.name: backend
+            for backend in (YandexDiskStorage(), LocalStorage())
+        }
+        self.backend = self.backends["yandex"]
+
+    def init_app(self, app):
+        name = app.config["STORAGE_BACKEND"]
+        if name not in self.backends:
+            raise ValueError(UNKNOWN_STORAGE.format(name))
+        for backend in self.backends.values():
+            backend.init_app(app)
+        self.backend = self.backends[name]
+
+    @property
+    def local(self):
+        return self.backends["local"]
+
+    def path(self, digest, filename):
+        """Путь нового файла в текущем хранилище."""
+        return self.backend.path(content_name(digest, filename))
+
+    @staticmethod
+    def is_file_path(original):
+        """Хранится ли вместо ссылки путь к файлу в хранилище."""
+        return original.startswith(FILE_PATH_PREFIXES)
+
+    def resolve(self, path):
+        """Ссылка для скачивания файла по сохраненному пути."""
+        return self.resolve_many([path])[path]
+
+    def resolve_many(self, paths):
+        links = {}
+        for backend in self.backends.values():
+            links.update(
+                backend.resolve_many(
+                    [path for path in paths if path.startswith(backend.prefix)]
+                )
+            )
+        return links
+
+
+storage = Storage()
+
+
+async def upload_files(files, on_result=None, digests=None):
+    """Асинхронная загрузка нескольких файлов в хранилище.
+
+    Одновременно загружается не больше DISK_UPLOAD_CONCURRENCY файлов.
+    Ошибка одного файла не отменяет остальные и попадает в его
+    UploadResult. on_result(index, result) вызывается по готовности
+    каждого файла. digests - заранее посчитанные FileDigest: файлы с
+    известной короткой ссылкой не отправляются повторно.
+    """
+    config = current_app.config
+    semaphore = asyncio.Semaphore(config["DISK_UPLOAD_CONCURRENCY"])
+    loop = asyncio.get_running_loop()
+
+    async def upload(file, known):
+        if known is not None and known.short:
+            return UploadResult(
+                file.filename, None, None, known.digest, known.short
+            )
+        async with semaphore:
+            try:
+                digest = (
+                    known.digest
+                    if known is not None
+                    else await loop.run_in_executor(
+                        None,
+                        file_digest,
+                        file.stream,
+                        config["DISK_UPLOAD_CHUNK_SIZE"],
+                    )
+                )
+                if image_optimizer.accepts(file.filename):
+                    file = await optimize_file(file)
+                url = await storage.backend.upload(
+                    file, storage.path(digest, file.filename)
+                )
+            except YandexDiskError as error:
+                return UploadResult(file.filename, None, str(error))
+            except Exception as error:
+                current_app.logger.exception(UPLOAD_ERROR.format(error))
+                return UploadResult(
+                    file.filename, None, UPLOAD_ERROR.format(error)
+                )
+            return UploadResult(file.filename, url, None, digest)
+
+    async def report(index, file):
+        result = await upload(file, digests[index] if digests else None)
+        if on_result is not None:
+            on_result(index, result)
+        return result
+
+    return await asyncio.gather(
+        *(report(index, file) for index, file in enumerate(files))
+    )
+
+
+async def upload_staged(chunks, size, staging):
+    """Загрузка кусков во временный путь хранилища; возвращает хеш.
+
+    Хеш содержимого до прихода последнего куска неизвестен, поэтому
+    файл сначала ложится в staging и переносится уже в finish_staged.
+    """
+    digest = hashlib.sha256()
+
+    async def hashed():
+        async for chunk in chunks:
+            digest.update(chunk)
+            yield chunk
+
+    await storage.backend.upload_stream(hashed(), staging, size)
+    return digest.hexdigest()
+
+
+async def finish_staged(staging, digest, filename, duplicate=False):
+    """Перенос файла из staging на путь по хешу или удаление копии."""
+    if duplicate:
+        await storage.backend.remove(staging)
+    else:
+        await storage.backend.move(staging, storage.path(digest, filename))
+
+
+async def optimize_file(file):
+    """Файл со сжатым изображением или исходный, если сжать не удалось.
+
+    Путь в хранилище остается по хешу исходного содержимого, поэтому
+    повторная загрузка того же файла находится без пересжатия.
+    """
+    optimized = await image_optimizer.optimize(file, current_app.logger)
+    if optimized is None:
+        return file
+    return FileStorage(BytesIO(optimized), filename=file.filename)
+
+
+def upload_files_async(files, on_result=None, digests=None):
+    """Загрузка файлов в хранилище из синхронного кода."""
+    return disk_client.run(
+        in_app_context(
+            current_app._get_current_object(),
+            upload_files(files, on_result, digests),
+        )
+    )
@@ -0,0 +1,473 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.datastructures import FileStorage
+
+from . import db
+from .constants import (
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_PENDING,
+    JOB_RUNNING,
+    JOB_WAITING,
+    UPLOAD_COMPLETE,
+    UPLOAD_RECEIVING,
+)
+from .error_handlers import YandexDiskError
+from .file_dedup import find_uploaded, shorten_upload
+from .models import (
+    ChunkedUpload,
+    UploadChunk,
+    UploadedFile,
+    UploadJob,
+    UploadJobFile,
+)
+from .storage import (
+    UploadResult,
+    finish_staged,
+    storage,
+    upload_files,
+    upload_staged,
+)
+from .yandex_disk import disk_client, in_app_context
+
+UPLOADING = "uploading"
+UPLOAD_INCOMPLETE = "Загрузка завершилась, не вернув результаты всех файлов"
+UPLOAD_EXPIRED = "Сессия загрузки по частям истекла"
+STAGING_NAME = ".upload-{}"
+
+
+def create_job(files):
+    """Сохранение файлов во временный каталог и постановка задания."""
+    spool_dir = current_app.config["UPLOAD_SPOOL_DIR"]
+    os.makedirs(spool_dir, exist_ok=True)
+    job = UploadJob()
+    db.session.add(job)
+    db.session.flush()
+    spooled = []
+    for index, file in enumerate(files):
+        path = os.path.join(spool_dir, f"{job.id}-{index}")
+        file.save(path)
+        spooled.append((file.filename, path))
+    return enqueue_job(job, spooled)
+
+
+def enqueue_job(job, spooled):
+    """Постановка задания на уже сохраненные файлы (имя, путь)."""
+    for filename, path in spooled:
+        job.files.append(UploadJobFile(filename=filename, spool_path=path))
+    db.session.add(job)
+    db.session.commit()
+    upload_workers.notify()
+    return job
+
+
+def claim_job():
+    """Захват ожидающего задания или зависшего дольше UPLOAD_JOB_STALE.
+
+    Захват - условный UPDATE по статусу и времени изменения, поэтому
+    одно задание не достанется двум воркерам даже в разных процессах.
+    """
+    stale = datetime.utcnow() - timedelta(
+        seconds=current_app.config["UPLOAD_JOB_STALE"]
+    )
+    candidates = (
+        UploadJob.query.filter(
+            (UploadJob.status == JOB_PENDING)
+            | ((UploadJob.status == JOB_RUNNING) & (UploadJob.updated < stale))
+        )
+        .order_by(UploadJob.created)
+        .limit(10)
+        .all()
+    )
+    for job in candidates:
+        claimed = UploadJob.query.filter_by(
+            id=job.id, status=job.status, updated=job.updated
+        ).update(
+            dict(status=JOB_RUNNING, updated=datetime.utcnow()),
+            synchronize_session="fetch",
+        )
+        db.session.commit()
+        if claimed:
+            return job
+    return None
+
+
+def resume_job(job_id):
+    """Постановка ожидающего задания в очередь."""
+    resumed = UploadJob.query.filter_by(id=job_id, status=JOB_WAITING).update(
+        dict(status=JOB_PENDING, updated=datetime.utcnow()),
+        synchronize_session=False,
+    )
+    db.session.commit()
+    if resumed:
+        upload_workers.notify()
+
+
+def cancel_job(job_id, error):
+    """Отмена задания, файл которого уже не будет получен."""
+    if UploadJob.query.filter(
+        UploadJob.id == job_id,
+        UploadJob.status.in_((JOB_PENDING, JOB_WAITING)),
+    ).update(dict(status=JOB_FAILED), synchronize_session=False):
+        UploadJobFile.query.filter_by(job_id=job_id).update(
+            dict(status=JOB_FAILED, error=error), synchronize_session=False
+        )
+
+
+def process_job(job):
+    """Загрузка файлов задания с сохранением прогресса по каждому файлу."""
+    upload = ChunkedUpload.query.filter_by(job_id=job.id).first()
+    if upload is not None and upload.status == UPLOAD_RECEIVING:
+        return stream_job(job, upload)
+    files = [file for file in job.files if file.status != JOB_DONE]
+    storages = [
+        FileStorage(open(file.spool_path, "rb"), filename=file.filename)
+        for file in files
+    ]
+    for file in files:
+        file.status = UPLOADING
+    db.session.commit()
+
+    results = queue.Queue()
+    future = disk_client.submit(
+        in_app_context(
+            current_app._get_current_object(),
+            upload_files(
+                storages,
+                lambda index, result: results.put((index, result)),
+                find_uploaded(storages),
+            ),
+        )
+    )
+    try:
+        for _ in files:
+            index, result = next_result(job, results, future)
+            job.updated = datetime.utcnow()
+            save_result(files[index], result)
+        future.result()
+    finally:
+        for file_storage in storages:
+            file_storage.close()
+    finish_job(job)
+
+
+def finish_job(job):
+    """Итоговый статус задания по статусам его файлов."""
+    job.status = (
+        JOB_DONE
+        if all(file.status == JOB_DONE for file in job.files)
+        else JOB_FAILED
+    )
+    db.session.commit()
+
+
+def stream_job(job, upload):
+    """Загрузка файла сессии по частям одновременно с приемом частей.
+
+    Непрерывное начало файла уходит во временный путь хранилища по
+    мере прихода частей, а после завершения сессии файл переносится на
+    путь по хешу содержимого: повторного чтения и отправки всего файла
+    нет. Пока сессия открыта, задание занимает воркер. Если отправка
+    прервалась, например клиент молчал дольше DISK_PUT_TIMEOUT,
+    задание ждет завершения сессии и грузит файл обычным путем.
+    """
+    file = job.files[0]
+    file.status = UPLOADING
+    db.session.commit()
+    upload_id, filename, size = upload.id, upload.filename, upload.size
+    staging = storage.backend.path(STAGING_NAME.format(upload_id))
+    chunks = queue.Queue(current_app.config["DISK_UPLOAD_READ_AHEAD"])
+    future = disk_client.submit(
+        in_app_context(
+            current_app._get_current_object(),
+            upload_staged(queued_chunks(chunks), size, staging),
+        )
+    )
+    try:
+        for chunk in received_chunks(job, upload, future):
+            put_chunk(chunks, chunk, future)
+        put_chunk(chunks, None, future)
+        digest = future.result()
+    except Exception as error:
+        abort_chunks(chunks, error)
+        db.session.rollback()
+        current_app.logger.warning(
+            "Потоковая загрузка %s прервана", upload_id, exc_info=True
+        )
+        return wait_for_upload(job, upload_id)
+    short = UploadedFile.find([digest]).get(digest)
+    result = UploadResult(filename, None, None, digest, short)
+    try:
+        disk_client.run(
+            in_app_context(
+                current_app._get_current_object(),
+                finish_staged(staging, digest, filename, bool(short)),
+            )
+        )
+    except YandexDiskError as error:
+        result = UploadResult(filename, None, str(error))
+    save_result(file, result)
+    finish_job(job)
+
+
+def received_chunks(job, upload, future):
+    """Куски файла сессии по порядку, по мере приема частей.
+
+    Кончаются, когда отданы все части и сессия завершена. Удаленная
+    сессия (истекла, пока клиент молчал) прерывает загрузку.
+    """
+    config = current_app.config
+    read_size = config["DISK_UPLOAD_CHUNK_SIZE"]
+    upload_id, chunk_size, size = upload.id, upload.chunk_size, upload.size
+    sent = 0
+    with open(upload.spool_path, "rb") as spool:
+        while True:
+            status = (
+                db.session.query(ChunkedUpload.status)
+                .filter_by(id=upload_id)
+                .scalar()
+            )
+            if status is None:
+                raise ValueError(UPLOAD_EXPIRED)
+            ready = sent
+            for index, in (
+                db.session.query(UploadChunk.index)
+                .filter(
+                    UploadChunk.upload_id == upload_id,
+                    UploadChunk.index >= sent,
+                )
+                .order_by(UploadChunk.index)
+            ):
+                if index != ready:
+                    break
+                ready += 1
+            # Следующий опрос должен видеть части, принятые после этого.
+            db.session.commit()
+            end = min(ready * chunk_size, size)
+            while spool.tell() < end:
+                yield spool.read(min(read_size, end - spool.tell()))
+            if spool.tell() == size and status == UPLOAD_COMPLETE:
+                return
+            if ready == sent:
+                if future.done():
+                    raise_unfinished(future)
+                keep_alive(job)
+                time.sleep(config["UPLOAD_JOB_POLL_INTERVAL"])
+            sent = ready
+
+
+def put_chunk(chunks, chunk, future):
+    """Передача куска в отправку, пока она не завершилась."""
+    while not future.done():
+        try:
+            chunks.put(
+                chunk, timeout=current_app.config["UPLOAD_JOB_POLL_INTERVAL"]
+            )
+            return
+        except queue.Full:
+            pass
+    raise_unfinished(future)
+
+
+def raise_unfinished(future):
+    """Ошибка отправки, завершившейся раньше, чем кончились куски."""
+    future.result()
+    raise RuntimeError(UPLOAD_INCOMPLETE)
+
+
+def abort_chunks(chunks, error):
+    """Прерывание отправки: очередь заменяется ошибкой.
+
+    Кладет в очередь только поток задания, поэтому после очистки место
+    для ошибки точно есть.
+    """
+    with suppress(queue.Empty):
+        while True:
+            chunks.get_nowait()
+    chunks.put_nowait(error)
+
+
+async def queued_chunks(chunks):
+    """Куски из очереди потока задания; None - конец файла."""
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await loop.run_in_executor(None, chunks.get)
+        if isinstance(chunk, Exception):
+            raise chunk
+        if chunk is None:
+            return
+        yield chunk
+
+
+def wait_for_upload(job, upload_id):
+    """Перевод задания с прерванной отправкой в ожидание сессии.
+
+    Если сессия уже завершена, задание сразу возвращается в очередь:
+    complete_upload могла успеть раньше и не застать ожидания.
+    """
+    job.files[0].status = JOB_PENDING
+    UploadJob.query.filter_by(id=job.id, status=JOB_RUNNING).update(
+        dict(status=JOB_WAITING), synchronize_session=False
+    )
+    db.session.commit()
+    status = (
+        db.session.query(ChunkedUpload.status)
+        .filter_by(id=upload_id)
+        .scalar()
+    )
+    if status is None:
+        cancel_job(job.id, UPLOAD_EXPIRED)
+        db.session.commit()
+    elif status == UPLOAD_COMPLETE:
+        resume_job(job.id)
+
+
+def next_result(job, results, future):
+    """Очередной результат загрузки файла.
+
+    Ожидание прерывается, если корутина загрузки завершилась, не вернув
+    всех результатов: ее ошибка пробрасывается, и воркер не зависает.
+    Пока загрузка идет, время изменения задания обновляется, чтобы его
+    не захватил другой воркер как зависшее.
+    """
+    poll_interval = current_app.config["UPLOAD_JOB_POLL_INTERVAL"]
+    while True:
+        try:
+            return results.get(timeout=poll_interval)
+        except queue.Empty:
+            pass
+        if future.done():
+            try:
+                return results.get_nowait()
+            except queue.Empty:
+                future.result()
+                raise RuntimeError(UPLOAD_INCOMPLETE)
+        keep_alive(job)
+
+
+def keep_alive(job):
+    """Обновление времени изменения задания, пока оно выполняется.
+
+    Иначе его захватит другой воркер как зависшее.
+    """
+    heartbeat = timedelta(seconds=current_app.config["UPLOAD_JOB_STALE"] / 2)
+    if datetime.utcnow() - job.updated > heartbeat:
+        job.updated = datetime.utcnow()
+        db.session.commit()
+
+
+def save_result(file, result):
+    """Создание короткой ссылки на загруженный файл."""
+    if not result.error:
+        try:
+            file.short = shorten_upload(result).short
+        except (ValueError, RuntimeError) as error:
+            result = result._replace(error=str(error))
+    if result.error:
+        file.status, file.error = JOB_FAILED, result.error
+    else:
+        file.status = JOB_DONE
+        os.remove(file.spool_path)
+    db.session.commit()
+
+
+class UploadWorkers:
+    """Пул фоновых потоков, обрабатывающих задания на загрузку.
+
+    С UPLOAD_JOBS_ENABLED пул запускается вместе с приложением, поэтому
+    задания, оставшиеся после перезапуска, подхватываются без новых
+    загрузок. В дочернем процессе после fork потоки запускаются заново.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.size = 0
+        self.poll_interval = 1
+        self.threads = []
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def init_app(self, app):
+        self.app = app
+        self.size = app.config["UPLOAD_WORKERS"]
+        self.poll_interval = app.config["UPLOAD_JOB_POLL_INTERVAL"]
+        # Процессы пула сжатия изображений тоже создают приложение, но
+        # заданий не обрабатывают.
+        if (
+            app.config["UPLOAD_JOBS_ENABLED"]
+            and multiprocessing.parent_process() is None
+        ):
+            self.start()
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        started, self.threads = bool(self.threads), []
+        if started:
+            self.start()
+
+    def notify(self):
+        """Пробуждение воркеров, при первом вызове - их запуск."""
+        self.start()
+        self._wakeup.set()
+
+    def start(self):
+        with self._lock:
+            if any(thread.is_alive() for thread in self.threads):
+                return
+            self.threads = [
+                threading.Thread(
+                    target=self.run,
+                    name=f"upload-worker-{number}",
+                    daemon=True,
+                )
+                for number in range(self.size)
+            ]
+            for thread in self.threads:
+                thread.start()
+
+    def run_once(self):
+        """Обработка одного задания; False, если заданий нет."""
+        with self.app.app_context():
+            job = claim_job()
+            if job is None:
+                return False
+            try:
+                process_job(job)
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Ошибка задания %s", job.id)
+            return True
+
+    def run(self):
+        while True:
+            try:
+                busy = self.run_once()
+            except Exception:
+                self.app.logger.exception("Ошибка получения задания")
+                busy = False
+            if not busy:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+
+upload_workers = UploadWorkers()
+
+
+@click.command("upload-worker")
+@with_appcontext
+def upload_worker_command():
+    """Запуск отдельного процесса-обработчика заданий на загрузку."""
+    upload_workers.start()
+    for thread in upload_workers.threads:
+        thread.join()
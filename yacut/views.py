@@ -3,14 +3,19 @@ from http import HTTPStatus
 from flask import (
     Blueprint,
     abort,
+    current_app,
     flash,
     redirect,
     render_template,
+    send_from_directory,
 )
 
+from .file_dedup import find_uploaded, shorten_upload
 from .forms import FileUploadForm, URLForm
 from .models import URLMap
-from .yandex_disk import upload_files_async
+from .redirect_snapshot import redirect_snapshot
+from .upload_jobs import create_job
+from .storage import LOCAL_FILE_NAME, storage, upload_files_async
 
 
 SHORT_COMPLETE = "Ваша новая ссылка готова:"
@@ -47,24 +52,32 @@ def files_upload():
     form = FileUploadForm()
     if not form.validate_on_submit():
         return render_template("files.html", form=form)
-
-    files = form.files.data
+    if current_app.config["UPLOAD_JOBS_ENABLED"]:
+        return render_template(
+            "files.html", form=form, job=create_job(form.files.data)
+        )
 
     try:
-        yadisk_results = upload_files_async(files)
-        yadisk_urls = [url for _, url in yadisk_results]
+        results = upload_files_async(
+            form.files.data, digests=find_uploaded(form.files.data)
+        )
     except (ValueError, RuntimeError) as e:
         flash(CREATE_SHORT_ERROR.format("файлов", e), "error")
         return render_template("files.html", form=form)
+    for result in results:
+        if result.error:
+            flash(
+                UPLOAD_ERROR.format(f"{result.filename}: {result.error}"),
+                "error",
+            )
     try:
         file_links = [
             dict(
-                name=file.filename,
-                full_short_url=URLMap.create(
-                    original=url, short=None
-                ).get_short_url(),
+                name=result.filename,
+                full_short_url=shorten_upload(result).get_short_url(),
             )
-            for file, url in zip(files, yadisk_urls)
+            for result in results
+            if not result.error
         ]
         return render_template("files.html", form=form, file_links=file_links)
     except (ValueError, RuntimeError) as e:
@@ -75,7 +88,34 @@ def files_upload():
 @main_bp.route("/<short>")
 def redirect_to_url(short):
     """Редирект по короткой ссылке."""
-    url_map = URLMap.get(short)
-    if not url_map:
+    original = (
+        redirect_snapshot.get(short)
+        if redirect_snapshot.enabled
+        else URLMap.get_original(short)
+    )
+    if not original:
+        abort(HTTPStatus.NOT_FOUND)
+    if storage.is_file_path(original):
+        return redirect(storage.resolve(original))
+    return redirect(original)
+
+
+@main_bp.route("/download/<name>")
+def download_file(name):
+    """Отдача файла из локального хранилища.
+
+    Тело отправляет wsgi.file_wrapper сервера (sendfile, если он его
+    поддерживает). Range и If-None-Match обрабатываются по строгому
+    ETag, которым служит хеш содержимого.
+    """
+    if not LOCAL_FILE_NAME.fullmatch(name):
         abort(HTTPStatus.NOT_FOUND)
-    return redirect(url_map.original)
+    response = send_from_directory(
+        storage.local.root,
+        name,
+        etag=name.split(".")[0],
+        max_age=current_app.config["STORAGE_LOCAL_MAX_AGE"],
+    )
+    # Содержимое по этому адресу никогда не меняется.
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,120 @@
+import queue
+import threading
+import time
+from collections import Counter
+
+
+class PendingCreate:
+    """Ожидающая записи ссылка из очереди."""
+
+    def __init__(self, original, short):
+        self.original = original
+        self.short = short
+        self.error = None
+        self.done = threading.Event()
+
+
+class WriteBatcher:
+    """Групповая запись ссылок из параллельных запросов.
+
+    Создания копятся в очереди и сохраняются одной транзакцией, как
+    только набирается max_size строк или проходит max_latency секунд с
+    первой из них. Каждый вызывающий ждет только коммита своей пачки.
+    """
+
+    def __init__(self, max_size=0, max_latency=0.005):
+        self.max_size = max_size
+        self.max_latency = max_latency
+        self.app = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self.histogram = Counter()
+
+    def init_app(self, app):
+        self.app = app
+        self.max_size = app.config["WRITE_BATCH_MAX_SIZE"]
+        self.max_latency = app.config["WRITE_BATCH_MAX_LATENCY"] / 1000
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def submit(self, original, short=None):
+        """Постановка ссылки в очередь и ожидание коммита ее пачки.
+
+        Возвращает пару (short, None) или (None, текст ошибки).
+        """
+        self._start()
+        pending = PendingCreate(original, short)
+        self._queue.put(pending)
+        pending.done.wait()
+        if isinstance(pending.error, Exception):
+            raise pending.error
+        return pending.short, pending.error
+
+    def stats(self):
+        """Счетчики достигнутых размеров пачек."""
+        return dict(
+            batches=self.batches,
+            items=self.items,
+            max_batch_size=self.max_batch_size,
+            average_batch_size=self.items / max(self.batches, 1),
+            histogram={
+                f"<={size}": count
+                for size, count in sorted(self.histogram.items())
+            },
+        )
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        from .models import URLMap
+
+        try:
+            with self.app.app_context():
+                results = URLMap.bulk_create(
+                    [(pending.original, pending.short) for pending in batch]
+                )
+            for pending, (short, error) in zip(batch, results):
+                pending.short, pending.error = short, error
+        except Exception as error:
+            for pending in batch:
+                pending.error = error
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        self.histogram[1 << (len(batch) - 1).bit_length()] += 1
+        for pending in batch:
+            pending.done.set()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="write-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._flush(self._collect())
+
+
+write_batcher = WriteBatcher()
@@ -1,48 +1,458 @@
 import asyncio
+import atexit
 import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
 from http import HTTPStatus
+from urllib.parse import parse_qs, urlparse
 
 import aiohttp
 from flask import current_app
 
+from .cache import MISSING, LRUCache
+from .constants import DISK_PATH_PREFIX
 from .error_handlers import YandexDiskError
 
 URL_ERROR = "Ошибка получения URL: {}"
 UPLOAD_ERROR = "Ошибка загрузки: {}"
 DOWNLOAD_ERROR = "Ошибка получения download URL: {}"
+MOVE_ERROR = "Ошибка перемещения файла: {}"
+DELETE_ERROR = "Ошибка удаления файла: {}"
+OPERATION_POLL_INTERVAL = 0.5
+TIMEOUT_ERROR = "Превышено время ожидания API Диска"
+CONNECTION_ERROR = "Ошибка соединения с API Диска: {}"
+BREAKER_OPEN_ERROR = "API Диска временно недоступно, попробуйте позже"
+RETRYABLE_STATUSES = {
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+}
+
+
+class CircuitBreaker:
+    """Предохранитель для запросов к API Диска.
+
+    Считает ошибки и медленные ответы среди последних window вызовов.
+    Набрав failures таких исходов, размыкается: вызовы сразу падают с
+    YandexDiskError. Через reset_timeout пропускает один пробный вызов
+    (полуоткрытое состояние): успех замыкает цепь, ошибка снова ее
+    размыкает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failures=5, window=20, reset_timeout=30, slow_call=10):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.outcomes = deque(maxlen=window)
+        self.state = self.CLOSED
+        self.opened_at = 0
+        self.trips = 0
+        self.rejected = 0
+        self.last_latency = None
+        self._probing = False
+
+    def init_app(self, app):
+        self.failures = app.config["DISK_BREAKER_FAILURES"]
+        self.outcomes = deque(maxlen=app.config["DISK_BREAKER_WINDOW"])
+        self.reset_timeout = app.config["DISK_BREAKER_RESET_TIMEOUT"]
+        self.slow_call = app.config["DISK_BREAKER_SLOW_CALL"]
+        self.reset()
+
+    def reset(self):
+        self.outcomes.clear()
+        self.state = self.CLOSED
+        self.trips = self.rejected = 0
+        self._probing = False
+
+    def _allow(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def _record(self, failed):
+        self.outcomes.append(failed)
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+            if failed:
+                self._open()
+            else:
+                self.state = self.CLOSED
+                self.outcomes.clear()
+        elif failed and sum(self.outcomes) >= self.failures:
+            self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+
+    async def call(self, coroutine, timed=True):
+        """Выполнение корутины под защитой предохранителя.
+
+        timed=False для вызовов, длительность которых зависит от объема
+        данных: медленными они не считаются.
+        """
+        if not self._allow():
+            coroutine.close()
+            self.rejected += 1
+            raise YandexDiskError(BREAKER_OPEN_ERROR)
+        started = time.monotonic()
+        try:
+            result = await coroutine
+        except YandexDiskError as error:
+            self._record(error.status is None or error.status >= 500)
+            raise
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            self._record(True)
+            raise
+        except BaseException:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+            raise
+        latency = time.monotonic() - started
+        if timed:
+            self.last_latency = latency
+        self._record(timed and latency > self.slow_call)
+        return result
+
+    def stats(self):
+        """Состояние предохранителя для мониторинга."""
+        return dict(
+            state=self.state,
+            trips=self.trips,
+            rejected=self.rejected,
+            recent_failures=sum(self.outcomes),
+            recent_calls=len(self.outcomes),
+            last_latency=self.last_latency,
+        )
+
+
+disk_breaker = CircuitBreaker()
 
 HEADERS = {"Authorization": f"OAuth {os.getenv('DISK_TOKEN')}"}
 
 
-async def upload_files(files):
-    """Асинхронная загрузка нескольких файлов."""
-    async with aiohttp.ClientSession() as session:
-        tasks = [upload_single_file(session, file) for file in files]
-        return await asyncio.gather(*tasks)
+class DiskClient:
+    """Долгоживущий цикл событий в отдельном потоке воркера.
+
+    Все загрузки идут через одну сессию aiohttp с пулом соединений,
+    поэтому TCP и TLS соединения с API Диска переиспользуются между
+    запросами. Flask-представления передают в цикл корутины через run.
+    """
+
+    def __init__(self):
+        self.config = {}
+        self.loop = None
+        self.thread = None
+        self.session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.config = dict(
+            limit=app.config["DISK_CONNECTOR_LIMIT"],
+            limit_per_host=app.config["DISK_CONNECTOR_LIMIT_PER_HOST"],
+            ttl_dns_cache=app.config["DISK_DNS_CACHE_TTL"],
+            keepalive_timeout=app.config["DISK_KEEPALIVE_TIMEOUT"],
+        )
+
+    def start(self):
+        with self._lock:
+            if self.loop is not None and self._pid == os.getpid():
+                return
+            # После fork поток цикла не наследуется: запускаем свой.
+            self.loop = asyncio.new_event_loop()
+            self.session = None
+            self._pid = os.getpid()
+            self.thread = threading.Thread(
+                target=self.loop.run_forever, name="disk-client", daemon=True
+            )
+            self.thread.start()
+        atexit.register(self.stop)
+
+    def submit(self, coroutine):
+        """Запуск корутины в цикле клиента без ожидания результата."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine):
+        """Выполнение корутины в цикле клиента с ожиданием результата."""
+        return self.submit(coroutine).result()
+
+    async def get_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**self.config)
+            )
+        return self.session
+
+    async def _close_session(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def stop(self):
+        """Закрытие сессии и остановка цикла."""
+        with self._lock:
+            if self.loop is None or self._pid != os.getpid():
+                return
+            asyncio.run_coroutine_threadsafe(
+                self._close_session(), self.loop
+            ).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = self.thread = None
+        atexit.unregister(self.stop)
+
+
+disk_client = DiskClient()
+
+
+class DownloadLinks:
+    """Временные ссылки на скачивание файлов с Диска.
+
+    Короткая ссылка на файл хранит его путь на Диске, а ссылка на
+    скачивание получается при переходе и кэшируется до момента чуть
+    раньше ее истечения (параметр expires) или до DISK_HREF_CACHE_TTL.
+    Параллельные запросы одного пути ждут общего обращения к API.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.cache = LRUCache()
+        self.expiry_margin = 60
+        self.refreshes = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.cache.init_app(app, "DISK_HREF_CACHE")
+        self.expiry_margin = app.config["DISK_HREF_EXPIRY_MARGIN"]
+
+    def remember(self, path, href):
+        """Сохранение полученной ссылки с учетом ее срока действия."""
+        ttl = self.cache.ttl
+        expires = parse_qs(urlparse(href).query).get("expires")
+        if expires and expires[0].isdigit():
+            ttl = min(ttl, int(expires[0]) - time.time() - self.expiry_margin)
+        self.cache.set(path, href, ttl)
+
+    def resolve(self, path):
+        """Действующая ссылка на скачивание файла по пути на Диске."""
+        return self.resolve_many([path])[path]
+
+    def resolve_many(self, paths):
+        """Ссылки на скачивание для нескольких путей, запрошенные разом."""
+        links = {}
+        futures = {}
+        for path in dict.fromkeys(paths):
+            href = self.cache.get(path)
+            if href is MISSING:
+                futures[path] = self._refresh(path)
+            else:
+                links[path] = href
+        for path, future in futures.items():
+            links[path] = future.result()
+        return links
+
+    def _refresh(self, path):
+        with self._lock:
+            href = self.cache.get(path)
+            if href is not MISSING:
+                future = Future()
+                future.set_result(href)
+                return future
+            future = self._pending.get(path)
+            if future is not None:
+                return future
+            future = self._pending[path] = disk_client.submit(
+                in_app_context(self.app, self._fetch(path))
+            )
+        # Вне блокировки: завершенный future вызывает колбэк сразу.
+        future.add_done_callback(lambda done: self._forget(path, done))
+        return future
+
+    def _forget(self, path, future):
+        with self._lock:
+            if self._pending.get(path) is future:
+                del self._pending[path]
+
+    async def _fetch(self, path):
+        session = await disk_client.get_session()
+        href = await fetch_download_url(session, path)
+        self.refreshes += 1
+        self.remember(path, href)
+        return href
+
+    def stats(self):
+        """Счетчики кэша ссылок и обращений к API за новыми."""
+        return dict(self.cache.stats(), refreshes=self.refreshes)
+
+
+download_links = DownloadLinks()
+
+
+class YandexDiskStorage:
+    """Хранилище файлов на Яндекс Диске.
+
+    Путь хранится с префиксом DISK_PATH_PREFIX, а при переходе по
+    короткой ссылке он превращается во временную ссылку на скачивание.
+    """
+
+    name = "yandex"
+    prefix = DISK_PATH_PREFIX
+
+    def init_app(self, app):
+        pass
+
+    def path(self, name):
+        return f"{self.prefix}/yacut/{name}"
+
+    async def upload(self, file, path):
+        """Загрузка файла; возвращает ссылку на скачивание."""
+        session = await disk_client.get_session()
+        _, url = await upload_single_file(session, file, path)
+        return url
+
+    async def upload_stream(self, chunks, path, size):
+        """Загрузка кусков по мере их поступления.
+
+        Поток нельзя прочитать заново, поэтому повторяется только
+        получение ссылки на загрузку, а не сама отправка.
+        """
+        session = await disk_client.get_session()
+        upload_url = await with_retries(
+            lambda: disk_breaker.call(
+                asyncio.wait_for(
+                    get_upload_url(
+                        session, {"path": path, "overwrite": "true"}
+                    ),
+                    current_app.config["DISK_HREF_TIMEOUT"],
+                )
+            )
+        )
+        await disk_breaker.call(
+            put_chunks(session, upload_url, chunks, size), timed=False
+        )
 
+    async def move(self, source, path):
+        session = await disk_client.get_session()
+        await with_retries(
+            lambda: disk_breaker.call(
+                asyncio.wait_for(
+                    move_resource(session, source, path),
+                    current_app.config["DISK_HREF_TIMEOUT"],
+                )
+            )
+        )
 
-def upload_files_async(files):
-    """Асинхронная загрузка файлов на Яндекс Диск."""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    results = loop.run_until_complete(upload_files(files))
-    loop.close()
-    return results
+    async def remove(self, path):
+        session = await disk_client.get_session()
+        await with_retries(
+            lambda: disk_breaker.call(
+                asyncio.wait_for(
+                    delete_resource(session, path),
+                    current_app.config["DISK_HREF_TIMEOUT"],
+                )
+            )
+        )
 
+    def resolve_many(self, paths):
+        return download_links.resolve_many(paths)
 
-async def upload_single_file(session, file):
+
+async def in_app_context(app, coroutine):
+    """Выполнение корутины в контексте приложения."""
+    with app.app_context():
+        return await coroutine
+
+
+async def with_retries(step):
+    """Повтор шага с экспоненциальной задержкой со случайным разбросом.
+
+    Повторяются таймауты, ошибки соединения и ответы со статусами из
+    RETRYABLE_STATUSES.
+    """
+    config = current_app.config
+    retries = config["DISK_RETRIES"]
+    for attempt in range(retries + 1):
+        try:
+            return await step()
+        except asyncio.TimeoutError:
+            error = YandexDiskError(TIMEOUT_ERROR)
+        except aiohttp.ClientError as client_error:
+            error = YandexDiskError(CONNECTION_ERROR.format(client_error))
+        except YandexDiskError as disk_error:
+            if disk_error.status not in RETRYABLE_STATUSES:
+                raise
+            error = disk_error
+        if attempt == retries:
+            raise error
+        await asyncio.sleep(
+            random.uniform(
+                0,
+                min(
+                    config["DISK_BACKOFF_MAX"],
+                    config["DISK_BACKOFF_BASE"] * 2**attempt,
+                ),
+            )
+        )
+
+
+async def upload_single_file(session, file, path):
     """Загрузка одного файла на Яндекс Диск."""
-    await upload_file_content(
-        session,
-        await get_upload_url(
-            session, {"path": f"/yacut/{file.filename}", "overwrite": "true"}
-        ),
-        file,
-    )
-    download_url = await get_download_url(session, file.filename)
+    config = current_app.config
+    start = file.stream.tell()
+
+    async def upload():
+        # Ссылка на загрузку одноразовая, поэтому повторяется вся пара.
+        upload_url = await disk_breaker.call(
+            asyncio.wait_for(
+                get_upload_url(session, {"path": path, "overwrite": "true"}),
+                config["DISK_HREF_TIMEOUT"],
+            )
+        )
+        file.stream.seek(start)
+        await disk_breaker.call(
+            upload_file_content(session, upload_url, file), timed=False
+        )
+
+    await with_retries(upload)
+    # Первая ссылка на скачивание сразу попадает в кэш для редиректа.
+    download_url = await fetch_download_url(session, path)
+    download_links.remember(path, download_url)
     return file.filename, download_url
 
 
+async def fetch_download_url(session, path):
+    """Ссылка на скачивание с таймаутом, повторами и предохранителем."""
+    return await with_retries(
+        lambda: disk_breaker.call(
+            asyncio.wait_for(
+                get_download_url(session, path),
+                current_app.config["DISK_HREF_TIMEOUT"],
+            )
+        )
+    )
+
+
 async def get_upload_url(session, params):
     """Получение URL для загрузки файла."""
     base_url = current_app.config["YANDEX_API_BASE"]
@@ -53,21 +463,197 @@ async def get_upload_url(session, params):
         upload_url, headers=HEADERS, params=params
     ) as response:
         if response.status != HTTPStatus.OK:
-            raise YandexDiskError(UPLOAD_ERROR.format(response.status))
+            raise YandexDiskError(
+                UPLOAD_ERROR.format(response.status), response.status
+            )
         return (await response.json())["href"]
 
 
+def get_stream_size(stream):
+    """Размер непрочитанной части потока или None, если он неизвестен."""
+    try:
+        position = stream.tell()
+        size = stream.seek(0, os.SEEK_END) - position
+        stream.seek(position)
+    except (AttributeError, OSError):
+        return None
+    return size
+
+
+async def read_chunks(stream, chunk_size, read_ahead):
+    """Чтение потока кусками с ограниченным упреждением.
+
+    Чтение идет в пуле потоков и опережает отправку не больше чем на
+    read_ahead кусков, так что в памяти не бывает больше
+    (read_ahead + 1) * chunk_size байт файла.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue(maxsize=read_ahead)
+
+    async def produce():
+        try:
+            while True:
+                chunk = await loop.run_in_executor(
+                    None, stream.read, chunk_size
+                )
+                await chunks.put(chunk)
+                if not chunk:
+                    return
+        except Exception as error:
+            await chunks.put(error)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            chunk = await chunks.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        producer.cancel()
+
+
+class IdleTimeout:
+    """Таймаут простоя: отсчет начинается заново при каждом touch().
+
+    По истечении отменяет задачу, в которой открыт, и на выходе
+    заменяет отмену на asyncio.TimeoutError.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.expired = False
+        self._task = None
+        self._handle = None
+
+    def touch(self):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = asyncio.get_running_loop().call_later(
+            self.timeout, self._expire
+        )
+
+    def _expire(self):
+        self.expired = True
+        self._task.cancel()
+
+    async def __aenter__(self):
+        self._task = asyncio.current_task()
+        self.touch()
+        return self
+
+    async def __aexit__(self, kind, error, traceback):
+        self._handle.cancel()
+        if self.expired and kind is asyncio.CancelledError:
+            if hasattr(self._task, "uncancel"):
+                self._task.uncancel()
+            raise asyncio.TimeoutError from error
+        return False
+
+
 async def upload_file_content(session, upload_url, file):
-    """Загрузка содержимого файла."""
-    file_content = file.read()
-    async with session.put(
-        upload_url, headers=HEADERS, data=file_content
+    """Потоковая загрузка содержимого файла."""
+    config = current_app.config
+    await put_chunks(
+        session,
+        upload_url,
+        read_chunks(
+            file.stream,
+            config["DISK_UPLOAD_CHUNK_SIZE"],
+            config["DISK_UPLOAD_READ_AHEAD"],
+        ),
+        get_stream_size(file.stream),
+    )
+
+
+async def put_chunks(session, upload_url, chunks, size=None):
+    """Отправка кусков из асинхронного итератора одним PUT-запросом.
+
+    DISK_PUT_TIMEOUT ограничивает простой, а не всю загрузку: отсчет
+    начинается заново с каждым отправленным куском. Большой файл
+    грузится сколько нужно, пока данные идут, а зависшая отправка или
+    ожидание ответа после тела прерываются.
+    """
+    headers = dict(HEADERS)
+    if size is not None:
+        headers["Content-Length"] = str(size)
+    async with IdleTimeout(current_app.config["DISK_PUT_TIMEOUT"]) as idle:
+
+        async def body():
+            # aiohttp берет следующий кусок, отправив предыдущий.
+            async for chunk in chunks:
+                idle.touch()
+                yield chunk
+            idle.touch()
+
+        async with session.put(
+            upload_url, headers=headers, data=body()
+        ) as response:
+            if response.status not in (
+                HTTPStatus.CREATED,
+                HTTPStatus.ACCEPTED,
+            ):
+                raise YandexDiskError(
+                    UPLOAD_ERROR.format(response.status), response.status
+                )
+
+
+async def move_resource(session, source, path):
+    """Перемещение файла на Диске с перезаписью.
+
+    Большие файлы Диск перемещает асинхронно (202): тогда ожидается
+    завершение операции.
+    """
+    base_url = current_app.config["YANDEX_API_BASE"]
+    api_version = current_app.config["API_VERSION"]
+    async with session.post(
+        f"{base_url}/{api_version}/disk/resources/move",
+        headers=HEADERS,
+        params={"from": source, "path": path, "overwrite": "true"},
+    ) as response:
+        if response.status == HTTPStatus.CREATED:
+            return
+        if response.status != HTTPStatus.ACCEPTED:
+            raise YandexDiskError(
+                MOVE_ERROR.format(response.status), response.status
+            )
+        operation_url = (await response.json())["href"]
+    while True:
+        async with session.get(operation_url, headers=HEADERS) as response:
+            if response.status != HTTPStatus.OK:
+                raise YandexDiskError(
+                    MOVE_ERROR.format(response.status), response.status
+                )
+            status = (await response.json())["status"]
+        if status == "success":
+            return
+        if status != "in-progress":
+            raise YandexDiskError(MOVE_ERROR.format(status))
+        await asyncio.sleep(OPERATION_POLL_INTERVAL)
+
+
+async def delete_resource(session, path):
+    """Удаление файла с Диска мимо корзины; отсутствие файла не ошибка."""
+    base_url = current_app.config["YANDEX_API_BASE"]
+    api_version = current_app.config["API_VERSION"]
+    async with session.delete(
+        f"{base_url}/{api_version}/disk/resources",
+        headers=HEADERS,
+        params={"path": path, "permanently": "true"},
     ) as response:
-        if response.status not in (HTTPStatus.CREATED, HTTPStatus.ACCEPTED):
-            raise YandexDiskError(UPLOAD_ERROR.format(response.status))
+        if response.status not in (
+            HTTPStatus.NO_CONTENT,
+            HTTPStatus.ACCEPTED,
+            HTTPStatus.NOT_FOUND,
+        ):
+            raise YandexDiskError(
+                DELETE_ERROR.format(response.status), response.status
+            )
 
 
-async def get_download_url(session, filename):
+async def get_download_url(session, path):
     """Получение ссылки для скачивания файла."""
     base_url = current_app.config["YANDEX_API_BASE"]
     api_version = current_app.config["API_VERSION"]
@@ -76,8 +662,10 @@ async def get_download_url(session, filename):
     async with session.get(
         download_url,
         headers=HEADERS,
-        params={"path": f"/yacut/{filename}"},
+        params={"path": path},
     ) as response:
         if response.status != HTTPStatus.OK:
-            raise YandexDiskError(DOWNLOAD_ERROR.format(response.status))
+            raise YandexDiskError(
+                DOWNLOAD_ERROR.format(response.status), response.status
+            )
         return (await response.json())["href"]